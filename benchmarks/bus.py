@@ -0,0 +1,258 @@
+#! python
+
+"""
+this benchmark suite measures the hot path of the bus end to end.
+
+a real manager is started with a number of synthetic subscriber modules and an echo module,
+each in their own process. the benchmark process sends frames and measures:
+ - one way latency: from Comm.send in the benchmark to Comm.get_data in every subscriber
+ - round trip: from Comm.request in the benchmark to the answer of the echo module
+ - saturation throughput: frames every subscriber receives while the benchmark sends as fast as it can
+
+every measurement is repeated for a range of frame sizes and subscriber counts.
+the results are written as json, so two runs can be compared.
+
+usage: python benchmarks/bus.py [--subscribers 1 4] [--output result.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import sys
+import time
+
+from benchmarks.harness import Bus, summarize
+from client.comm import Comm, BaseComm
+from common.base_module import BaseModule
+from common import frames
+
+# From the smallest to the largest frame
+FRAMES = [
+    frames.FrameButtonState,
+    frames.FrameDistance,
+    frames.FrameDisplayRectangle,
+    frames.FrameDisplay8x8Character,
+]
+
+# Number of leading data bytes that carry the sequence number
+SEQUENCE_BYTES = 4
+
+
+def encode(frame_class, sequence):
+    """creates a frame of the given class that carries the sequence number in its data"""
+    frame = frame_class()
+    width = min(SEQUENCE_BYTES, frame.length)
+    sequence %= 256 ** width
+    frame.data = sequence.to_bytes(width, "little") + bytes(frame.length - width)
+    return frame
+
+
+def decode(frame):
+    """returns the sequence number of a frame created by encode, modulo its width"""
+    return int.from_bytes(frame.data[:SEQUENCE_BYTES], "little")
+
+
+class Subscriber(BaseModule):
+    """reports the arrival of every frame of the benchmarked types"""
+    def __init__(self, comm: BaseComm, subscriber_id, frame_types, results):
+        super(Subscriber, self).__init__(comm)
+        self.comm.listen_for(frame_types)
+        self.subscriber_id = subscriber_id
+        self.results = results
+
+    def process(self):
+        while self.comm.has_data():
+            frame = self.comm.get_data()
+            arrival = time.time()
+            if frame.request:
+                continue
+            self.results.put((self.subscriber_id, frame.type.name, decode(frame), arrival))
+
+
+class Echo(BaseModule):
+    """answers every request for the benchmarked types"""
+    def __init__(self, comm: BaseComm, frame_classes):
+        super(Echo, self).__init__(comm)
+        self.frame_classes = {frame_class().type: frame_class for frame_class in frame_classes}
+        self.comm.listen_for(list(self.frame_classes))
+
+    def process(self):
+        while self.comm.has_data():
+            frame = self.comm.get_data()
+            if frame.request:
+                self.comm.send(encode(self.frame_classes[frame.type], 0))
+
+
+def _drain(results, expected, timeout):
+    """collects arrivals until `expected` arrived or nothing arrived for `timeout` seconds"""
+    arrivals = []
+    while len(arrivals) < expected:
+        try:
+            arrivals.append(results.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return arrivals
+
+
+def _await_subscribers(comm, results, subscribers, timeout=10.0):
+    """sends a frame until every subscriber has seen one, so all are up and running"""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while len(seen) < subscribers and time.monotonic() < deadline:
+        comm.send(encode(FRAMES[0], 0))
+        seen.update(arrival[0] for arrival in _drain(results, subscribers, 0.1))
+    if len(seen) < subscribers:
+        raise RuntimeError("only {} of {} subscribers started".format(len(seen), subscribers))
+    # Forget the frames of the warm up
+    _drain(results, sys.maxsize, 0.5)
+
+
+def one_way(comm, results, frame_class, subscribers, count, pace):
+    """sends paced frames and measures when every subscriber receives them"""
+    width = min(SEQUENCE_BYTES, frame_class().length)
+    sent = []
+    for sequence in range(count):
+        sent.append(time.time())
+        comm.send(encode(frame_class, sequence))
+        time.sleep(pace)
+
+    samples = []
+    received = 0
+    for _, type_name, sequence, arrival in _drain(results, count * subscribers, 1.0):
+        if type_name != frame_class().type.name:
+            continue
+        received += 1
+        # Sequence numbers wrap for small frames; sends are paced,
+        # so the latest send with a matching number is the right one
+        candidates = [
+            number for number in range(sequence, count, 256 ** width)
+            if sent[number] <= arrival]
+        if candidates:
+            samples.append(arrival - sent[candidates[-1]])
+    return dict(summarize(samples), lost=count * subscribers - received)
+
+
+def round_trip(comm, frame_class, count):
+    """requests a frame from the echo module and measures the time to the answer"""
+    samples = []
+    lost = 0
+    frame_type = frame_class().type
+    for _ in range(count):
+        # Forget the late answers to requests that were lost
+        comm.get_many()
+        start = time.time()
+        comm.request(frame_type)
+        if comm.wait_for(frame_type, lambda frame: not frame.request, timeout=1.0) is None:
+            lost += 1
+            continue
+        samples.append(time.time() - start)
+    return dict(summarize(samples), lost=lost)
+
+
+def saturation(comm, results, frame_class, subscribers, duration):
+    """sends frames as fast as possible and counts what the subscribers receive"""
+    sent = 0
+    start = time.time()
+    while time.time() - start < duration:
+        comm.send(encode(frame_class, sent))
+        sent += 1
+    elapsed = time.time() - start
+
+    per_subscriber = {}
+    for subscriber_id, _, _, _ in _drain(results, sent * subscribers, 1.0):
+        per_subscriber[subscriber_id] = per_subscriber.get(subscriber_id, 0) + 1
+    delivered = [per_subscriber.get(subscriber, 0) for subscriber in range(subscribers)]
+    return {
+        "sent": sent,
+        "seconds": elapsed,
+        "sent_per_second": sent / elapsed,
+        "delivered_per_second": min(delivered) / elapsed,
+        "lost": sent * subscribers - sum(delivered),
+    }
+
+
+def _describe(frame_class, subscribers):
+    """the fields that identify a measurement"""
+    return {
+        "frame": frame_class.__name__,
+        "size": frame_class().length,
+        "subscribers": subscribers,
+    }
+
+
+def run(subscriber_counts, interval, count, pace, duration, socket_path=None):
+    """runs the whole suite and returns the results as a list of dicts"""
+    frame_types = [frame_class().type for frame_class in FRAMES]
+    records = []
+    for subscribers in subscriber_counts:
+        results = multiprocessing.Queue()
+        modules = [("benchmarks.bus:Echo", (FRAMES,))] + [
+            ("benchmarks.bus:Subscriber", (subscriber, frame_types, results))
+            for subscriber in range(subscribers)]
+        with Bus(socket_path, modules, interval):
+            comm = Comm()
+            try:
+                _await_subscribers(comm, results, subscribers)
+                comm.listen_for(frame_types)
+                # Latency first, a saturated bus needs time to recover
+                for frame_class in FRAMES:
+                    # Forget the answers of the echo module
+                    _drain(results, sys.maxsize, 0.5)
+                    records.append(dict(
+                        _describe(frame_class, subscribers), benchmark="one_way",
+                        **one_way(comm, results, frame_class, subscribers, count, pace)))
+                    records.append(dict(
+                        _describe(frame_class, subscribers), benchmark="round_trip",
+                        **round_trip(comm, frame_class, count)))
+                for frame_class in FRAMES:
+                    _drain(results, sys.maxsize, 0.5)
+                    records.append(dict(
+                        _describe(frame_class, subscribers), benchmark="saturation",
+                        **saturation(comm, results, frame_class, subscribers, duration)))
+            finally:
+                comm.stop()
+    return records
+
+
+def main():
+    """runs the suite and writes the results"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--interval", type=float, default=0.001,
+                        help="seconds between two tick() calls in the modules")
+    parser.add_argument("--count", type=int, default=200,
+                        help="frames per latency measurement")
+    parser.add_argument("--pace", type=float, default=0.005,
+                        help="seconds between two frames of the one way measurement")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="seconds of sending per saturation measurement")
+    parser.add_argument("--socket", help="use the unix domain socket at this path")
+    parser.add_argument("--output", help="write the results as json to this file")
+    args = parser.parse_args()
+
+    records = run(args.subscribers, args.interval, args.count, args.pace,
+                  args.duration, args.socket)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "config": vars(args),
+        "results": records,
+    }
+    for record in records:
+        value = (
+            "{:9.1f} frames/s".format(record["delivered_per_second"])
+            if record["benchmark"] == "saturation"
+            else "p50 {:7.2f} ms".format(record.get("p50", float("nan")) * 1000))
+        print("{benchmark:11} {frame:26} {subscribers:2} subscribers  ".format(**record)
+              + value + "  lost {}".format(record["lost"]))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#! python
+
+"""
+this benchmark measures the cost of encoding and decoding every frame class in common/frames.py.
+
+run: times set_data, get_data, __getitem__, __setitem__, __str__, pickling and unpickling
+     of every frame class and writes the results (nanoseconds per call) as json.
+compare: compares two results and lists every operation of every frame class
+     of which the cost grew by more than the threshold. exits with 1 if there are any.
+
+usage:
+    python benchmarks/codec.py run --output new.json [--iterations 1000000]
+    python benchmarks/codec.py compare old.json new.json [--threshold 0.1]
+"""
+
+import argparse
+import inspect
+import json
+import pickle
+import platform
+import random
+import struct
+import sys
+import timeit
+
+from common import frames
+from common.common import Frame
+
+OPERATIONS = {
+    "set_data": "encode",
+    "__setitem__": "encode",
+    "pickle": "encode",
+    "get_data": "decode",
+    "__getitem__": "decode",
+    "__str__": "decode",
+    "unpickle": "decode",
+}
+
+
+def discover_frames():
+    """returns every frame class defined in common/frames.py, sorted by name"""
+    return [
+        cls for _, cls in inspect.getmembers(frames, inspect.isclass)
+        if issubclass(cls, Frame) and cls is not Frame]
+
+
+def _random_value(specifier, rng):
+    """returns a random value that struct.pack accepts for the format specifier"""
+    code = specifier[-1]
+    if code == "s":
+        return bytes(rng.randrange(32, 127) for _ in range(int(specifier[:-1] or 1)))
+    if code == "c":
+        return bytes([rng.randrange(32, 127)])
+    if code == "?":
+        return rng.random() < 0.5
+    if code in "fd":
+        return rng.uniform(-1000, 1000)
+    if code == "P":
+        return 0
+    bits = struct.calcsize(code) * 8
+    if code.islower():
+        return rng.randrange(-2 ** (bits - 1), 2 ** (bits - 1))
+    return rng.randrange(0, 2 ** bits)
+
+
+def random_data(frame_class, rng):
+    """returns random arguments for set_data of the frame class"""
+    return tuple(_random_value(specifier, rng) for specifier in frame_class().format.split(" "))
+
+
+def operations(frame_class, rng):
+    """returns a callable per benchmarked operation, all working on the same frame"""
+    data = random_data(frame_class, rng)
+    frame = frame_class()
+    frame.set_data(*data)
+    first = frame_class.MEMBERS[0]
+    value = data[0]
+    pickled = pickle.dumps(frame)
+    return {
+        "set_data": lambda: frame.set_data(*data),
+        "__setitem__": lambda: frame.__setitem__(first, value),
+        "pickle": lambda: pickle.dumps(frame),
+        "get_data": frame.get_data,
+        "__getitem__": lambda: frame[first],
+        "__str__": frame.__str__,
+        "unpickle": lambda: pickle.loads(pickled),
+    }
+
+
+def run(iterations, repeat, warmup, seed):
+    """times every operation of every frame class, returns ns per call"""
+    rng = random.Random(seed)
+    results = {}
+    for frame_class in discover_frames():
+        timings = {}
+        for name, operation in operations(frame_class, rng).items():
+            timer = timeit.Timer(operation)
+            timer.timeit(warmup)
+            best = min(timer.repeat(repeat=repeat, number=iterations))
+            timings[name] = best / iterations * 1e9
+        results[frame_class.__name__] = timings
+        print("{:40} ".format(frame_class.__name__) + " ".join(
+            "{}={:.0f}".format(name, value) for name, value in timings.items()))
+    return results
+
+
+def compare(old, new, threshold):
+    """
+    returns a line for every operation of every frame class of which the cost
+    grew by more than threshold (0.1 is 10 percent).
+    every operation is compared by itself, a fast operation that became slower
+    is not hidden by a slow one of the same kind.
+    """
+    regressions = []
+    for name, timings in sorted(new["results"].items()):
+        if name not in old["results"]:
+            continue
+        for operation, after in timings.items():
+            before = old["results"][name].get(operation)
+            if before and (after - before) / before > threshold:
+                regressions.append("{:40} {:12} {} {:.0f} ns -> {:.0f} ns (+{:.0%})".format(
+                    name, operation, OPERATIONS.get(operation, ""), before, after,
+                    (after - before) / before))
+    return regressions
+
+
+def main():
+    """entry point, see the module documentation"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark every frame class")
+    run_parser.add_argument("--iterations", type=int, default=1000000,
+                            help="calls per timing")
+    run_parser.add_argument("--repeat", type=int, default=3,
+                            help="timings per operation, the fastest is kept")
+    run_parser.add_argument("--warmup", type=int, default=10000)
+    run_parser.add_argument("--seed", type=int, default=2019)
+    run_parser.add_argument("--output", required=True)
+
+    compare_parser = commands.add_parser("compare", help="compare two results")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key != "command"},
+            "results": run(args.iterations, args.repeat, args.warmup, args.seed),
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        return
+
+    with open(args.old) as old, open(args.new) as new:
+        regressions = compare(json.load(old), json.load(new), args.threshold)
+    for line in regressions:
+        print(line)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
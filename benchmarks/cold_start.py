@@ -0,0 +1,131 @@
+#! python
+
+"""
+this benchmark measures a cold start of the robot stack.
+
+the manager, the button module and the controller module are launched at the same moment,
+like they are at boot. the benchmark takes the place of the led module and
+reports the time from launching the processes to the first led state it receives,
+and the memory the processes use together at that moment.
+
+the stack is started in two ways: by hand, every script in its own python interpreter,
+and with client/launcher.py, that forks the processes from one warm interpreter.
+
+usage: python benchmarks/cold_start.py [--runs 5] [--manager-delay 0] [--output result.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.harness import summarize
+from client.comm import Comm
+from common.frame_enum import FrameType
+from common.memory import process_memory
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = [
+    "modules/button_module/main.py",
+    "modules/controller_module/main.py",
+]
+# The same modules, for client/launcher.py
+SPECS = [
+    "modules.button_module.main:create_module",
+    "modules.controller_module.module.mod",
+]
+# Seconds a start may take before the run fails
+START_TIMEOUT = 30.0
+
+
+def _launch(script, *args):
+    """starts one of the python build scripts as a separate interpreter"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.Popen(
+        [sys.executable, str(ROOT / script), *args],
+        cwd=str(ROOT), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _children(pid):
+    """the pids of the child processes of a process"""
+    try:
+        with open("/proc/{0}/task/{0}/children".format(pid)) as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def _memory(processes):
+    """the rss and pss in bytes of the processes and their children together"""
+    pids = [process.pid for process in processes]
+    pids += [child for pid in pids for child in _children(pid)]
+    usage = [process_memory(pid) for pid in pids]
+    return {
+        key: None if any(process[key] is None for process in usage) else
+        sum(process[key] for process in usage)
+        for key in ("rss", "pss")}
+
+
+def cold_start(manager_delay, launcher=False):
+    """
+    launches the stack and returns the seconds until the first delivered frame,
+    and the memory the stack uses then
+
+    :param manager_delay: seconds the manager is launched after the modules, by hand only
+    :param launcher: start the stack with client/launcher.py instead of by hand
+    """
+    start = time.perf_counter()
+    if launcher:
+        processes = [_launch("client/launcher.py", *SPECS)]
+    else:
+        processes = [_launch(script) for script in SCRIPTS]
+    comm = None
+    try:
+        if not launcher:
+            time.sleep(manager_delay)
+            processes.append(_launch("manager/manager.py"))
+        comm = Comm()
+        comm.listen_for([FrameType.ACTIVITY_LED_STATE])
+        if comm.wait_for(FrameType.ACTIVITY_LED_STATE, timeout=START_TIMEOUT) is None:
+            raise RuntimeError("no led state arrived within {} s".format(START_TIMEOUT))
+        return time.perf_counter() - start, _memory(processes)
+    finally:
+        if comm is not None:
+            comm.stop()
+        # Stop the modules before the manager they are connected to
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+def main():
+    """runs the cold start a number of times and reports the results"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--manager-delay", type=float, default=0.0,
+                        help="seconds between launching the modules and the manager")
+    parser.add_argument("--output", help="write the results as json to this file")
+    args = parser.parse_args()
+
+    result = {"manager_delay": args.manager_delay}
+    for name, launcher in (("by hand", False), ("launcher", True)):
+        runs = [cold_start(args.manager_delay, launcher) for _ in range(args.runs)]
+        memory = runs[-1][1]
+        result[name] = dict(summarize([seconds for seconds, _ in runs]), **memory)
+        print("{:8} cold start to first delivered frame: p50 {:.3f} s  max {:.3f} s  "
+              "rss {} MB  pss {} MB".format(
+                  name, result[name]["p50"], result[name]["max"],
+                  *["-" if memory[key] is None else "{:.1f}".format(memory[key] / 1024 / 1024)
+                    for key in ("rss", "pss")]))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#! python
+
+"""
+this file contains helpers to run a real bus for benchmarking.
+
+the manager and every module run in their own process, just like on the robot.
+the benchmark itself is one more process on the bus.
+"""
+
+import importlib
+import multiprocessing
+import statistics
+import time
+from multiprocessing.managers import BaseManager
+
+from common.common import bus_config
+
+
+class _Probe(BaseManager):
+    """manager client that is only used to see if the bus is up"""
+
+
+def use_socket(socket_path):
+    """makes this process use the unix domain socket at socket_path, or tcp if it is None"""
+    bus_config().SOCKET_PATH = socket_path
+
+
+def _run_manager(socket_path):
+    """entry point of the manager process"""
+    # pylint: disable=import-outside-toplevel
+    from common.signals import register_signal_callback
+    from manager.manager import BusManager
+
+    use_socket(socket_path)
+    with BusManager() as bus_manager:
+        register_signal_callback(bus_manager.stop)
+        bus_manager.process()
+
+
+def _run_module(module_path, args, socket_path, interval):
+    """
+    entry point of a module process, mirrors modules/*/main.py
+
+    :param module_path: import path of the python module that defines the Module class,
+        'path:Class' to use another class
+    """
+    # pylint: disable=import-outside-toplevel
+    from client.comm import Comm
+
+    use_socket(socket_path)
+    module_path, _, class_name = module_path.partition(":")
+    module_class = getattr(importlib.import_module(module_path), class_name or "Module")
+    module = module_class(Comm(), *args)
+    with module:
+        module.run(tick=interval)
+
+
+def wait_for_bus(timeout=10.0):
+    """blocks until the manager accepts connections"""
+    config = bus_config()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _Probe(address=config.address(), authkey=config.AUTH_KEY).connect()
+            return
+        except (ConnectionRefusedError, FileNotFoundError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+class Bus:
+    """
+    context manager that starts a manager and a set of modules in separate processes
+    and stops them again on exit.
+    """
+    def __init__(self, socket_path=None, modules=(), interval=0.05):
+        """
+        :param socket_path: unix domain socket of the bus, None to use tcp
+        :param modules: list of (module path, constructor arguments) tuples,
+            see _run_module
+        :param interval: the seconds between two tick() calls in the modules,
+            they process frames as soon as they arrive
+        """
+        self.socket_path = socket_path
+        self.modules = modules
+        self.interval = interval
+        self.processes = []
+
+    def __enter__(self):
+        use_socket(self.socket_path)
+        manager = multiprocessing.Process(target=_run_manager, args=(self.socket_path,))
+        manager.start()
+        self.processes.append(manager)
+        wait_for_bus()
+
+        for module_path, args in self.modules:
+            module = multiprocessing.Process(
+                target=_run_module,
+                args=(module_path, args, self.socket_path, self.interval))
+            module.start()
+            self.processes.append(module)
+        return self
+
+    def __exit__(self, *args):
+        # Stop the modules before the manager they are connected to
+        for process in reversed(self.processes):
+            process.terminate()
+            process.join()
+        self.processes.clear()
+
+
+def summarize(samples):
+    """returns the usual statistics of a list of latency samples in seconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": statistics.mean(ordered),
+        "min": ordered[0],
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "max": ordered[-1],
+    }
@@ -0,0 +1,169 @@
+#! python
+
+"""
+this program floods the bus with a configurable mix of frames.
+
+every simulated module is a separate process with its own Comm, that sends the whole mix.
+a stream is given as TYPE:RATE[:PRIORITY], for instance DISTANCE:500:DATA_STREAM sends
+500 FrameDistance frames per second with the DATA_STREAM priority, from every simulated module.
+with --burst N, frames are sent N at a time, at the same average rate.
+DATA_STREAM frames are sent one by one, --batch-bytes 4096 sends them in batches, see common/batch.py.
+
+the load generator listens for the frames it sends itself, and reports
+the requested rate, the achieved sending rate and the loss per frame type.
+
+usage: python benchmarks/load_generator.py DISTANCE:500 BUTTON_STATE:50:HIGH --modules 4 [--start-manager]
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from collections import namedtuple
+
+from benchmarks.harness import Bus, use_socket, wait_for_bus
+from client.comm import Comm
+from common.batch import BATCH_MAX_BYTES
+from common.common import Frame, Priority
+from common.frame_enum import FrameType
+from common.recording import FRAME_CLASSES
+
+Stream = namedtuple("Stream", ["frame_type", "rate", "priority"])
+
+
+def parse_stream(text: str) -> Stream:
+    """parses a TYPE:RATE[:PRIORITY] stream specification"""
+    parts = text.split(":")
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError("expected TYPE:RATE[:PRIORITY], got " + text)
+    priority = Priority[parts[2].upper()] if len(parts) == 3 else Priority.NORMAL
+    return Stream(FrameType[parts[0].upper()], float(parts[1]), priority)
+
+
+def make_frame(frame_type: FrameType) -> Frame:
+    """returns a frame of the type, filled with zeroes"""
+    frame_class = FRAME_CLASSES.get(frame_type)
+    if frame_class is None:
+        frame = Frame()
+        frame.type = frame_type
+        return frame
+    frame = frame_class()
+    frame.data = bytes(frame.length)
+    return frame
+
+
+def generate(streams, duration, burst, socket_path, results, batch_bytes=0):
+    """
+    entry point of a simulated module, sends the streams for duration seconds
+    and puts the number of frames sent per type on results
+    """
+    use_socket(socket_path)
+    comm = Comm(batch_bytes=batch_bytes)
+    sent = {stream.frame_type.name: 0 for stream in streams}
+    start = time.monotonic()
+    due = [start] * len(streams)
+    try:
+        while True:
+            index = min(range(len(streams)), key=due.__getitem__)
+            if due[index] - start >= duration:
+                break
+            # Behind schedule means saturated, then no time is spent sleeping
+            wait = due[index] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            stream = streams[index]
+            for _ in range(burst):
+                comm.send(make_frame(stream.frame_type), stream.priority)
+            sent[stream.frame_type.name] += burst
+            due[index] += burst / stream.rate
+    finally:
+        comm.stop()
+        results.put(sent)
+
+
+def run(streams, modules, duration, burst, socket_path=None, drain=1.0,
+        batch_bytes=0):
+    """
+    runs the simulated modules against a running bus
+
+    :return: dict per frame type name with the requested, sent and received rates and loss
+    """
+    use_socket(socket_path)
+    wait_for_bus()
+    comm = Comm()
+    comm.listen_for(list({stream.frame_type for stream in streams}))
+    results = multiprocessing.Queue()
+    generators = [
+        multiprocessing.Process(
+            target=generate,
+            args=(streams, duration, burst, socket_path, results, batch_bytes))
+        for _ in range(modules)]
+
+    received = {stream.frame_type.name: 0 for stream in streams}
+    try:
+        for generator in generators:
+            generator.start()
+        deadline = time.monotonic() + duration + drain
+        while time.monotonic() < deadline:
+            for frame in comm.get_many(timeout=max(0.0, deadline - time.monotonic())):
+                received[frame.type.name] += 1
+        sent = {name: 0 for name in received}
+        for _ in generators:
+            for name, count in results.get().items():
+                sent[name] += count
+    finally:
+        comm.stop()
+        for generator in generators:
+            generator.join()
+
+    report = {}
+    for stream in streams:
+        name = stream.frame_type.name
+        requested = sum(
+            other.rate for other in streams if other.frame_type == stream.frame_type) * modules
+        report[name] = {
+            "requested_per_second": requested,
+            "sent_per_second": sent[name] / duration,
+            "received_per_second": received[name] / duration,
+            "loss": 1 - received[name] / sent[name] if sent[name] else 0.0,
+        }
+    return report
+
+
+def main():
+    """runs the load generator and reports the results"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("streams", type=parse_stream, nargs="+", help="TYPE:RATE[:PRIORITY]")
+    parser.add_argument("--modules", type=int, default=1, help="number of simulated modules")
+    parser.add_argument("--burst", type=int, default=1, help="frames sent at once")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-bytes", type=int, default=0,
+                        help="bytes of DATA_STREAM frames sent in one batch, for instance {}, "
+                             "0 to not batch".format(BATCH_MAX_BYTES))
+    parser.add_argument("--socket", help="use the unix domain socket at this path")
+    parser.add_argument("--start-manager", action="store_true",
+                        help="start a manager instead of using a running one")
+    parser.add_argument("--output", help="write the results as json to this file")
+    args = parser.parse_args()
+
+    if args.start_manager:
+        with Bus(args.socket):
+            report = run(args.streams, args.modules, args.duration, args.burst, args.socket,
+                         batch_bytes=args.batch_bytes)
+    else:
+        report = run(args.streams, args.modules, args.duration, args.burst, args.socket,
+                     batch_bytes=args.batch_bytes)
+
+    print("{:26} {:>12} {:>12} {:>12} {:>7}".format(
+        "FRAME TYPE", "REQUESTED/S", "SENT/S", "RECEIVED/S", "LOSS"))
+    for name, result in report.items():
+        print("{:26} {requested_per_second:12.1f} {sent_per_second:12.1f} "
+              "{received_per_second:12.1f} {loss:7.1%}".format(name, **result))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#! python
+
+"""
+this benchmark compares the tcp and the unix domain socket transport of the bus
+on the controller/button/led chain.
+
+round trip: the benchmark requests the button state and waits for the button module to answer.
+throughput: the button and controller modules run freely,
+the benchmark takes the place of the led module and counts the led states it receives.
+
+usage: python benchmarks/transport.py [--interval 0.05] [--output result.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import Bus, summarize
+from client.comm import Comm
+from common.frame_enum import FrameType
+from modules.button_module.main import TestButton
+
+BUTTON = ("modules.button_module.module.mod", (TestButton(),))
+CONTROLLER = "modules.controller_module.module.mod"
+
+
+def _wait_for_answer(comm, frame_type, timeout):
+    """returns the first answer of the type in comm, or None when it does not arrive in time"""
+    return comm.wait_for(frame_type, lambda frame: not frame.request, timeout)
+
+
+def _warm_up(comm, frame_type):
+    """waits for the first answer of the type, which also waits for the modules to start"""
+    if _wait_for_answer(comm, frame_type, 10.0) is None:
+        raise RuntimeError("no {} arrived within 10 s, the modules did not start".format(frame_type.name))
+
+
+def _format_ms(summary, key):
+    """formats a latency of the summary in milliseconds, n/a when it has no samples"""
+    if not summary["count"]:
+        return "{:>7}".format("n/a")
+    return "{:7.2f}".format(summary[key] * 1000)
+
+
+def round_trip(socket_path, interval, count):
+    """measures request to answer latency between the benchmark and the button module"""
+    samples = []
+    lost = 0
+    with Bus(socket_path, [BUTTON], interval):
+        comm = Comm()
+        comm.listen_for([FrameType.BUTTON_STATE])
+        try:
+            # The first answer also waits for the button module to start
+            comm.request(FrameType.BUTTON_STATE)
+            _warm_up(comm, FrameType.BUTTON_STATE)
+            for _ in range(count):
+                # A late answer to an earlier request would end this round trip early
+                comm.get_many()
+                start = time.perf_counter()
+                comm.request(FrameType.BUTTON_STATE)
+                if _wait_for_answer(comm, FrameType.BUTTON_STATE, 1.0) is None:
+                    lost += 1
+                    continue
+                samples.append(time.perf_counter() - start)
+        finally:
+            comm.stop()
+    return dict(summarize(samples), lost=lost)
+
+
+def throughput(socket_path, interval, duration):
+    """counts the led states the controller module produces while it runs freely"""
+    # The controller requests every interval, and forwards every answer
+    with Bus(socket_path, [BUTTON, (CONTROLLER, (interval, 0))], interval):
+        comm = Comm()
+        comm.listen_for([FrameType.ACTIVITY_LED_STATE])
+        try:
+            # Wait for the chain to produce its first frame
+            _warm_up(comm, FrameType.ACTIVITY_LED_STATE)
+            received = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                received += len(comm.get_many(
+                    timeout=max(0.0, start + duration - time.perf_counter())))
+            elapsed = time.perf_counter() - start
+        finally:
+            comm.stop()
+    return {"frames": received, "seconds": elapsed, "frames_per_second": received / elapsed}
+
+
+def main():
+    """runs the benchmark for both transports and reports the results"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="seconds between two tick() calls in the modules")
+    parser.add_argument("--count", type=int, default=200, help="number of round trips")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of throughput")
+    parser.add_argument("--output", help="write the results as json to this file")
+    args = parser.parse_args()
+
+    transports = {"tcp": None}
+    if sys.platform != "win32":
+        transports["unix"] = os.path.join(tempfile.mkdtemp(), "python_bus.sock")
+
+    results = {"interval": args.interval, "transports": {}}
+    for name, socket_path in transports.items():
+        results["transports"][name] = {
+            "round_trip": round_trip(socket_path, args.interval, args.count),
+            "throughput": throughput(socket_path, args.interval, args.duration),
+        }
+        rtt = results["transports"][name]["round_trip"]
+        tput = results["transports"][name]["throughput"]
+        print("{:5} round trip p50 {} ms  p99 {} ms  lost {:3}  "
+              "chain {:8.1f} frames/s".format(
+                  name, _format_ms(rtt, "p50"), _format_ms(rtt, "p99"), rtt["lost"],
+                  tput["frames_per_second"]))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+this module provides the change detection of send(frame, on_change=True).
+
+a comm remembers the data it last sent per FrameType. a frame sent with on_change
+is not put on the bus when its data equals that of the last frame of its type,
+unless the last one was sent keep_alive seconds ago or longer, so receivers still
+see the state now and then and know the sender is alive.
+"""
+
+import threading
+from collections import defaultdict
+
+from common import clock
+from common.common import Frame
+
+
+class ChangeFilter:
+    """the last data sent per FrameType, and the frames that were suppressed"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last = {}
+        """The data and the monotonic time of the last frame sent per FrameType"""
+
+        self.suppressed = defaultdict(int)
+        """The number of frames that were not sent per FrameType"""
+
+    def changed(self, frame: Frame, on_change: bool = False, keep_alive: float = None) -> bool:
+        """
+        Whether a frame has to be sent, every frame that has to be sent is remembered.
+
+        :param frame:
+        :param on_change: only send the frame when its data differs from the last one of its type
+        :param keep_alive: seconds after which an unchanged frame is sent anyway, None to never send it
+        :return: False when the frame is suppressed
+        """
+        now = clock.monotonic()
+        with self.lock:
+            last = self.last.get(frame.type)
+            if (on_change and last is not None and last[0] == frame.data
+                    and (keep_alive is None or now - last[1] < keep_alive)):
+                self.suppressed[frame.type] += 1
+                return False
+            self.last[frame.type] = (frame.data, now)
+            return True
@@ -2,34 +2,96 @@
 this module provides the API to the python bus
 """
 
-from queue import Queue
-from time import time, sleep
+from collections import deque
+import random
 import threading
 import os
-from multiprocessing.managers import BaseManager
+from multiprocessing.managers import BaseManager, RemoteError
 import logging
 from abc import abstractmethod, ABC
 
-import common.config
-from common.common import Frame, Priority, BUSCONFIG, FrameWrapper
+from common.config import configure_logging
+from common.common import Frame, Priority, bus_config, FrameWrapper
 from common.frame_enum import FrameType
+from common import clock, tracing
+from common.memory import MemoryAccount
+from common.batch import Batcher, unpack, BATCH_MAX_DELAY
+from common.subscription import Subscription
+from client.frame_queue import FrameQueue
+from client.change_filter import ChangeFilter
 
 
-FORMAT = '%(asctime)s %(levelname)s: %(message)s'
-logging.basicConfig(format=FORMAT, level=logging.INFO)
 COMM_LOGGER = logging.getLogger("python_build.comm")
 
+# Seconds to wait after the first failed connection attempt,
+# the wait doubles after every failed attempt up to the maximum
+CONNECT_BACKOFF_INITIAL = 0.01
+CONNECT_BACKOFF_MAX = 2.0
+
+# Number of frames that are kept while the bus is unreachable
+UNSENT_BUFFER_LENGTH = 256
+
+# Seconds between two checks for data when waiting for data is polled
+POLL_INTERVAL = 0.05
+
+# Seconds the manager holds a receive call of the worker when there are no new frames
+RECEIVE_WAIT = 0.05
+
+# Errors raised by the manager proxies when the manager is not reachable.
+# A proxy of a manager that was restarted raises RemoteError instead, the new manager
+# does not know its object, that is handled where the subscriber and tx_queue proxies are used
+CONNECTION_ERRORS = (ConnectionError, EOFError, FileNotFoundError)
+
 class BaseComm(ABC):
     """
     Interface for communication classes.
+    What a comm listens for is kept in its subscription attribute, see common/subscription.py.
     """
-    @abstractmethod
-    def listen_for(self, comm_listen_for: list) -> None:
+    @property
+    def comm_listen_for(self) -> list:
+        """the frame types this module receives"""
+        return self.subscription.frame_types
+
+    @property
+    def accepts_all(self) -> bool:
+        """whether this module receives every frame type"""
+        return self.subscription.accepts_all
+
+    def listen_for(self, comm_listen_for: list, max_rate: dict = None,
+                   decimate: dict = None) -> None:
         """
         Specify what frame types this modules
         should receive from the bus.
+        The last value of retained frame types is
+        received immediately.
 
         :param comm_listen_for:
+        :param max_rate: maps a frame type on the frames per second this module gets at most,
+            the latest frame wins
+        :param decimate: maps a frame type on N, to get every Nth frame of that type
+        :return:
+        """
+        self.subscribe(comm_listen_for, max_rate, decimate)
+        self._receive_retained()
+
+    def subscribe(self, comm_listen_for: list, max_rate: dict = None,
+                  decimate: dict = None) -> None:
+        """
+        Like listen_for, without receiving the retained frames again.
+
+        :param comm_listen_for:
+        :param max_rate:
+        :param decimate:
+        :return:
+        """
+        self.subscription = Subscription(comm_listen_for, max_rate, decimate)
+
+    @abstractmethod
+    def _receive_retained(self) -> None:
+        """
+        Puts the last values of the retained frame types
+        this module listens for in the received queue.
+
         :return:
         """
 
@@ -54,13 +116,18 @@ class BaseComm(ABC):
         """
 
     @abstractmethod
-    def send(self, frame, prio: Priority = Priority.NORMAL) -> None:
+    def send(self, frame, prio: Priority = Priority.NORMAL,
+             on_change: bool = False, keep_alive: float = None) -> bool:
         """
         Put a frame on the bus.
+        With on_change, a frame with the same data as the last frame of its type
+        that was sent is suppressed, see client/change_filter.py.
 
-        :param type:
-        :param data:
+        :param frame:
         :param prio:
+        :param on_change: only send the frame when its data changed
+        :param keep_alive: seconds after which an unchanged frame is sent anyway
+        :return: False when the frame was suppressed
         """
 
     @abstractmethod
@@ -73,16 +140,71 @@ class BaseComm(ABC):
         """
 
     @abstractmethod
-    def get_data(self) -> Frame:
+    def get_data(self, timeout: float = 0) -> Frame:
         """
-        Non-blocking, will throw the Empty
+        Non-blocking by default, will throw the Empty
         exception if no data is available.
+        Before the timeout was added, Comm.get_data blocked until
+        data arrived, a module that relies on that passes timeout=None.
 
         Check if there is data available for processing
-        first with has_data.
+        first with has_data, or give a timeout.
+        :param timeout: seconds to wait for data, None to wait until there is data
         :return: common.Frame
         """
 
+    def get_many(self, max_n: int = None, timeout: float = 0) -> list:
+        """
+        Takes the frames that are available for processing at once.
+
+        :param max_n: the number of frames to take at most, None for all of them
+        :param timeout: seconds to wait for the first frame, None to wait until there is one
+        :return: list of common.Frame, empty when no data arrived in time
+        """
+        if not self.has_data() and timeout != 0:
+            self.wait_for_data(timeout)
+        frames = []
+        while self.has_data() and (max_n is None or len(frames) < max_n):
+            frames.append(self.get_data())
+        return frames
+
+    @abstractmethod
+    def wait_for(self, frame_type: FrameType, predicate=None, timeout: float = None):
+        """
+        Takes the first frame of the type that the predicate accepts,
+        waiting for it if it has not arrived yet.
+        Other frames stay available for processing, in order.
+
+        :param frame_type:
+        :param predicate: function that takes a frame and returns a bool, None accepts any
+        :param timeout: seconds to wait at most, None to wait until the frame arrives
+        :return: common.Frame, None when it did not arrive in time, wake was called or the comm stopped
+        """
+
+    def wait_for_data(self, timeout: float = None) -> bool:
+        """
+        Blocks until there is data available for processing,
+        the timeout has passed or wake is called.
+        This polls has_data, communication classes that
+        know when data arrives override it.
+
+        :param timeout: seconds to wait at most, None to wait for data
+        :return: whether there is data available
+        """
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        while not self.has_data():
+            remaining = POLL_INTERVAL if deadline is None else deadline - clock.monotonic()
+            if remaining <= 0:
+                return False
+            clock.sleep(min(POLL_INTERVAL, remaining))
+        return True
+
+    def wake(self) -> None:
+        """
+        Makes a wait_for_data call in another thread return.
+        Polling communication classes return within their timeout.
+        """
+
     @abstractmethod
     def stop(self) -> None:
         pass
@@ -92,51 +214,177 @@ class QueueManager(BaseManager):
     pass
 
 
-QueueManager.register('rx_queue')
+QueueManager.register('subscribe')
 QueueManager.register('tx_queue')
+QueueManager.register('retained')
+
+
+# _drop_connection and _forget_proxy use the private _tls and _close attributes of
+# multiprocessing.managers.BaseProxy, checked against CPython 3.11.7,
+# tests/test_comm.py fails when a python version no longer has them
+def _drop_connection(proxy):
+    """
+    Forget the connection of the calling thread to the manager
+    of the proxy. A proxy keeps reusing a broken connection,
+    dropping it makes the next call open a new one.
+
+    :param proxy:
+    :return:
+    """
+    # pylint: disable=protected-access
+    try:
+        proxy._tls.connection.close()
+    except (AttributeError, OSError):
+        pass
+    try:
+        del proxy._tls.connection
+    except AttributeError:
+        pass
+
+
+def _forget_proxy(proxy):
+    """
+    Keeps a proxy of a manager that went away from releasing its object
+    when it is garbage collected. The release would reach the manager
+    that replaced it, which may have created an object with the same id.
+
+    :param proxy: the proxy, None does nothing
+    :return:
+    """
+    # pylint: disable=protected-access
+    finalizer = getattr(proxy, "_close", None)
+    if finalizer is not None:
+        finalizer.cancel()
 
 
 class Comm(BaseComm):
-    def __init__(self):
-        self.manager = QueueManager(address=BUSCONFIG.ADDRESS.tuple(), authkey=BUSCONFIG.AUTH_KEY)
+    def __init__(self, batch_bytes: int = 0, batch_delay: float = BATCH_MAX_DELAY,
+                 receive_batches: bool = False):
+        """
+        DATA_STREAM frames can be sent in batches, see common/batch.py.
+        A batched frame waits up to batch_delay seconds for the batch to fill.
+
+        :param batch_bytes: bytes of frame data a batch holds at most, for instance BATCH_MAX_BYTES,
+            0 to send every frame by itself
+        :param batch_delay: seconds a DATA_STREAM frame waits at most for the batch to fill
+        :param receive_batches: hand received batches to the module as FrameBatch,
+            instead of as the frames they carry
+        """
+        configure_logging()
+        self.pid = os.getpid()
+
+        self.received = FrameQueue()
+        self.subscription = Subscription()
+        # The last data sent per frame type, for send(on_change=True)
+        self.changes = ChangeFilter()
+
+        # The DATA_STREAM frames that wait to be sent in a batch,
+        # the lock keeps them in order with the frames sent around them
+        self.batcher = Batcher(batch_bytes, batch_delay)
+        self.batch_lock = threading.Lock()
+        self.receive_batches = receive_batches
+
+        # The memory held by the received and unsent frames, see common/memory.py
+        self.memory = MemoryAccount("comm {}".format(self.pid))
+
+        # Frames that could not be sent because the bus was unreachable,
+        # these are sent as soon as the connection is back
+        self.unsent = deque(maxlen=UNSENT_BUFFER_LENGTH)
+        self.connection_lock = threading.Lock()
+        self.connected = False
+
+        self.should_stop = False
+        self._stop_event = threading.Event()
+
+        # Whether frames are traced, see common/tracing.py
+        self.tracing = tracing.enabled()
+
+        self.manager = None
+        # The queue and the subscriber that refer to the bus process
+        self.subscriber = None
+        self.tx_queue = None
+        self._connect()
 
+        # Start the worker thread for the
+        # connection.
+        self.channel_worker = threading.Thread(target=self._work_channel)
+        self.channel_worker.start()
+
+    def _connect(self) -> bool:
+        """
+        Connect to the bus process.
+        Failed attempts are retried with an exponential backoff
+        and random jitter, so a module that starts before the manager
+        connects shortly after the manager is up, without all modules
+        retrying at the same moment.
+
+        :return: False if the comm was stopped before it could connect
+        """
+        delay = CONNECT_BACKOFF_INITIAL
         connection_tries = 0
+        config = bus_config()
 
-        while True:
+        while not self.should_stop:
+            manager = QueueManager(address=config.address(), authkey=config.AUTH_KEY)
             try:
                 connection_tries += 1
-                self.manager.connect()
-            except ConnectionRefusedError:
-                COMM_LOGGER.warning("Could not connect to Python bus. Trying to reconnect in 10 sec")    
+                manager.connect()
+                subscriber = manager.subscribe(self.pid)
+                tx_queue = manager.tx_queue()
+            except CONNECTION_ERRORS:
                 if connection_tries == 1:
+                    COMM_LOGGER.warning("Could not connect to Python bus. Retrying...")
                     COMM_LOGGER.warning("Did you start manager/manager.py?")
-                sleep(10)
+                self._stop_event.wait(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, CONNECT_BACKOFF_MAX)
             else:
+                with self.connection_lock:
+                    _forget_proxy(self.subscriber)
+                    _forget_proxy(self.tx_queue)
+                    self.manager = manager
+                    self.subscriber = subscriber
+                    self.tx_queue = tx_queue
+                    self.connected = True
+                # A new subscriber has to know what this comm listens for
+                self._update_subscriber()
                 COMM_LOGGER.info("Connected to Python bus succesfully.")
-                break
+                return True
 
-        # Queues that refer to the bus process
-        self.rx_queue = self.manager.rx_queue()
-        self.tx_queue = self.manager.tx_queue()
-        self.last_timestamp = 0
+        return False
 
-        self.comm_listen_for = []
-        self.accepts_all = False
-        self.received = Queue()
+    def _disconnected(self, proxy):
+        """
+        Called by the thread that noticed the bus went away.
+        The worker thread reconnects.
 
-        # Start the worker thread for the
-        # connection.
-        self.should_stop = False
-        self.channel_worker = threading.Thread(target=self._work_channel)
-        self.channel_worker.start()
+        :param proxy: the proxy that failed
+        :return:
+        """
+        _drop_connection(proxy)
+        if self.connected:
+            COMM_LOGGER.warning("Lost connection to Python bus. Reconnecting...")
+        self.connected = False
 
-        self.pid = os.getpid()
+    def _stale_proxy(self, proxy):
+        """
+        Called when a proxy raised RemoteError. That happens when the manager
+        was restarted and does not know the object of the proxy, the worker
+        thread reconnects. The traceback is logged, as the manager also
+        raises RemoteError when a call fails in the manager itself.
+
+        :param proxy: the proxy that failed
+        :return:
+        """
+        COMM_LOGGER.warning("Python bus rejected a call, reconnecting", exc_info=True)
+        self._disconnected(proxy)
 
     def _work_channel(self):
         """
         This method is called as a worker thread.
         Create and work the communication channel to
         the bus.
+        When the bus goes away the worker reconnects
+        and sends the frames that were kept in the meantime.
 
         :return:
         """
@@ -144,46 +392,161 @@ class Comm(BaseComm):
         COMM_LOGGER.info("Starting connection worker...")
 
         while not self.should_stop:
-            for frame in self.rx_queue._getvalue():
-                # If the PID equals this pid, we have sent this message
-                # If the timestamp is older than our last timestamp, we have already
-                # processed this message
-                if self.pid == frame.pid or frame.timestamp <= self.last_timestamp:
-                    continue
-
-                self.last_timestamp = frame.timestamp
-
+            if not self.connected:
+                if not self._connect():
+                    break
+                self._flush_unsent()
+                continue
+
+            # The manager hands out the new frames of other modules
+            # this comm listens for, see Subscriber in manager/manager.py
+            wait = self.batcher.time_to_due()
+            try:
+                wrappers = self.subscriber.receive(
+                    RECEIVE_WAIT if wait is None else min(wait, RECEIVE_WAIT))
+            except CONNECTION_ERRORS:
+                self._disconnected(self.subscriber)
+                continue
+            except RemoteError:
+                self._stale_proxy(self.subscriber)
+                continue
+
+            received = []
+            for wrapper in wrappers:
                 # Frame is of the type "FrameWrapper" which has the
                 # actual "Frame" instance in the member frame.
-                frame = frame.frame
+                frame = wrapper.frame
 
+                # The subscription may have changed while the manager handed them out
                 if self.accepts_frame(frame.type):
-                    self.received.put(frame)
+                    frames = [frame] if self.receive_batches else unpack(frame)
+                    if self.tracing and wrapper.trace is not None:
+                        # The trace of a batch ends with its last frame
+                        tracing.stamp(wrapper.trace, tracing.RECEIVE)
+                        frames[-1].trace = (wrapper.pid, wrapper.trace)
+                    received.extend(frames)
+
+            if received:
+                self.memory.add("received", *received)
+                self.received.extend(received)
+
+            if self.batcher.due():
+                self._send_batched()
+
+    def _flush_unsent(self):
+        """
+        Send the frames that were kept while the bus was unreachable.
+        They get a new timestamp, receivers would otherwise consider
+        them already processed.
+
+        :return:
+        """
+        with self.connection_lock:
+            while self.unsent and self.connected:
+                frame = self.unsent.popleft()
+                self.memory.remove("unsent", frame)
+                try:
+                    self.tx_queue.append(self._wrap(frame))
+                except CONNECTION_ERRORS:
+                    self.unsent.appendleft(frame)
+                    self.memory.add("unsent", frame)
+                    self._disconnected(self.tx_queue)
+                except RemoteError:
+                    self.unsent.appendleft(frame)
+                    self.memory.add("unsent", frame)
+                    self._stale_proxy(self.tx_queue)
+
+    def _wrap(self, frame: Frame) -> FrameWrapper:
+        """
+        Adds the meta data to a frame that is about to be sent.
+
+        :param frame:
+        :return:
+        """
+        return FrameWrapper(
+            frame, self.pid, clock.time(), tracing.start() if self.tracing else None)
 
     def _push_frame(self, frame: Frame):
         """
         Push the frame on to the queue, if there is
         no space available on the queue this call will
         block until space is available again.
+        If the bus is unreachable, the frame is kept
+        and sent once the connection is back.
 
         :param frame:
         :return:
         """
 
-        self.tx_queue.append(
-            FrameWrapper(frame, self.pid, time())
-        )
+        with self.connection_lock:
+            # Frames that are kept have to go first
+            if self.connected and not self.unsent:
+                try:
+                    self.tx_queue.append(self._wrap(frame))
+                    return
+                except CONNECTION_ERRORS:
+                    self._disconnected(self.tx_queue)
+                except RemoteError:
+                    self._stale_proxy(self.tx_queue)
+
+            if len(self.unsent) == self.unsent.maxlen:
+                COMM_LOGGER.warning("Python bus unreachable, dropping oldest unsent frame")
+                self.memory.remove("unsent", self.unsent[0])
+            self.unsent.append(frame)
+            self.memory.add("unsent", frame)
+
+    def subscribe(self, comm_listen_for: list, max_rate: dict = None,
+                  decimate: dict = None) -> None:
+        super().subscribe(comm_listen_for, max_rate, decimate)
+        self._update_subscriber()
+
+    def _update_subscriber(self):
+        """
+        Hands the subscription to the subscriber in the manager,
+        so the frames this comm does not listen for do not cross the socket.
+        A comm that is not connected does this once it is.
+
+        :return:
+        """
+        subscription = self.subscription
+        subscriber = self.subscriber
+        if subscriber is None:
+            return
+        try:
+            subscriber.update(
+                subscription.frame_types, subscription.max_rate, subscription.decimate)
+        except CONNECTION_ERRORS:
+            self._disconnected(subscriber)
+        except RemoteError:
+            self._stale_proxy(subscriber)
+
+    def retained(self) -> list:
+        """
+        The last values the manager retained, of every retained frame type.
+
+        :return: list of FrameWrapper, empty when the bus is unreachable
+        """
+        try:
+            return list(self.manager.retained()._getvalue().values())
+        except CONNECTION_ERRORS:
+            return []
 
-    def listen_for(self, comm_listen_for: list) -> None:
-        self.comm_listen_for = comm_listen_for
+    def _receive_retained(self):
+        """
+        Puts the last values the manager retained for the
+        frame types this module listens for in the received queue,
+        so a module that starts late does not have to wait for
+        the next time the state is sent.
 
-        if FrameType.ALL in comm_listen_for:
-            self.accepts_all = True
+        :return:
+        """
+        for wrapper in self.retained():
+            if self.pid != wrapper.pid and self.accepts_frame(wrapper.frame.type):
+                self.memory.add("received", wrapper.frame)
+                self.received.append(wrapper.frame)
 
     def accepts_frame(self, type: FrameType) -> bool:
-        if self.accepts_all:
-            return True
-        return type in self.comm_listen_for
+        return self.subscription.accepts(type)
 
     def request(self, type, prio: Priority = Priority.NORMAL) -> None:
         frame = Frame()
@@ -191,27 +554,80 @@ class Comm(BaseComm):
         frame.request = True
         frame.priority = prio
 
-        self._push_frame(frame)
+        self._send_batched(frame)
 
-    def send(self, frame, prio: Priority = Priority.NORMAL) -> None:
+    def send(self, frame, prio: Priority = Priority.NORMAL,
+             on_change: bool = False, keep_alive: float = None) -> bool:
         frame.request = False
         frame.priority = prio
+        if not self.changes.changed(frame, on_change, keep_alive):
+            return False
 
-        self._push_frame(frame)
+        self._send_batched(frame)
+        return True
 
-    def has_data(self) -> bool:
-        return not self.received.empty()
+    def _send_batched(self, frame: Frame = None):
+        """
+        Sends a frame after the pending batch, a DATA_STREAM frame joins the batch instead.
+        Called without a frame, sends the pending batch.
+
+        :param frame:
+        :return:
+        """
+        with self.batch_lock:
+            if frame is None:
+                ready = self.batcher.flush()
+            elif frame.priority is Priority.DATA_STREAM and self.batcher.max_bytes:
+                ready = self.batcher.add(frame)
+            else:
+                ready = self.batcher.flush() + [frame]
+            for item in ready:
+                self._push_frame(item)
 
-    def get_data(self) -> Frame:
-        item = self.received.get()
-        self.received.task_done()
+    def has_data(self) -> bool:
+        return bool(self.received)
+
+    def wait_for_data(self, timeout: float = None) -> bool:
+        if self.should_stop:
+            return self.has_data()
+        return self.received.wait(timeout)
+
+    def wake(self) -> None:
+        self.received.wake()
+
+    def _taken(self, frames: list):
+        """bookkeeping of frames the module took"""
+        self.memory.remove("received", *frames)
+        if self.tracing:
+            for frame in frames:
+                tracing.finish(frame)
+
+    def get_data(self, timeout: float = 0) -> Frame:
+        item = self.received.get(timeout)
+        self._taken([item])
         return item
 
+    def get_many(self, max_n: int = None, timeout: float = 0) -> list:
+        frames = self.received.get_many(max_n, timeout)
+        self._taken(frames)
+        return frames
+
+    def wait_for(self, frame_type: FrameType, predicate=None, timeout: float = None):
+        frame = self.received.find(
+            lambda frame: frame.type == frame_type and (predicate is None or predicate(frame)),
+            timeout)
+        if frame is not None:
+            self._taken([frame])
+        return frame
+
     def stop(self) -> None:
         """
         Stop the worker thread.
         :return:
 
         """
+        self._send_batched()
         self.should_stop = True
+        self._stop_event.set()
+        self.received.stop()
         self.channel_worker.join()
@@ -0,0 +1,122 @@
+"""
+this module provides the queue a comm keeps its received frames in.
+
+every operation takes the lock of the queue once, so taking a burst of frames
+with get_many costs one lock acquisition instead of one per frame.
+waiting is done on the lock, so it uses the system clock and not common/clock.py.
+"""
+
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+from common.common import Frame
+
+
+class FrameQueue:
+    """the received frames of a comm, that the module waits for and takes"""
+
+    def __init__(self):
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self._woken = False
+        self._stopped = False
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __bool__(self) -> bool:
+        return bool(self.frames)
+
+    def append(self, frame: Frame):
+        """adds a frame and wakes the waiting threads"""
+        with self.condition:
+            self.frames.append(frame)
+            self.condition.notify_all()
+
+    def extend(self, frames):
+        """adds frames and wakes the waiting threads once"""
+        with self.condition:
+            self.frames.extend(frames)
+            self.condition.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until there are frames, the timeout has passed, wake is called or the queue is stopped.
+
+        :param timeout: seconds to wait at most, None to wait for frames
+        :return: whether there are frames
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self._woken or self._stopped or self.frames, timeout)
+            self._woken = False
+            return bool(self.frames)
+
+    def wake(self):
+        """makes a wait or find in another thread return"""
+        with self.condition:
+            self._woken = True
+            self.condition.notify_all()
+
+    def stop(self):
+        """makes every wait and find return without waiting, now and from then on"""
+        with self.condition:
+            self._stopped = True
+            self.condition.notify_all()
+
+    def get(self, timeout: float = 0) -> Frame:
+        """
+        Takes the oldest frame.
+
+        :param timeout: seconds to wait for a frame, None to wait until there is one
+        :return: the frame
+        :raises Empty: when there is no frame in time
+        """
+        with self.condition:
+            if not self.frames and timeout != 0:
+                self.condition.wait_for(lambda: self.frames, timeout)
+            if not self.frames:
+                raise Empty
+            return self.frames.popleft()
+
+    def get_many(self, max_n: int = None, timeout: float = 0) -> list:
+        """
+        Takes the oldest frames at once.
+
+        :param max_n: the number of frames to take at most, None for all of them
+        :param timeout: seconds to wait for the first frame, None to wait until there is one
+        :return: list of frames, empty when there is no frame in time
+        """
+        with self.condition:
+            if not self.frames and timeout != 0:
+                self.condition.wait_for(lambda: self.frames, timeout)
+            if max_n is None or max_n >= len(self.frames):
+                frames = list(self.frames)
+                self.frames.clear()
+                return frames
+            return [self.frames.popleft() for _ in range(max_n)]
+
+    def find(self, predicate, timeout: float = None):
+        """
+        Takes the oldest frame the predicate accepts, the other frames stay in order.
+
+        :param predicate: function that takes a frame and returns a bool
+        :param timeout: seconds to wait for such a frame, None to wait until there is one
+        :return: the frame, None when there is none in time or the queue was woken or stopped
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for index, frame in enumerate(self.frames):
+                    if predicate(frame):
+                        del self.frames[index]
+                        return frame
+
+                if self._woken or self._stopped:
+                    self._woken = False
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
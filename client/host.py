@@ -0,0 +1,327 @@
+"""
+this module runs several modules in one process, on one connection to the bus.
+
+usage: python client/host.py <module> [<module> ...]
+
+a module is given as path[:name][@tick]: the python module that defines it,
+the name of the Module class or of a function that creates the module from a comm
+(Module by default) and the tick of its run loop in seconds, for instance:
+
+    python client/host.py modules.led_module.module.mod \\
+        modules.controller_module.module.mod modules.button_module.main:create_module
+
+every module runs its run loop in its own thread and gets its own HostedComm,
+with its own subscriptions. the host listens on the shared Comm for all of them.
+frames a hosted module sends go directly to the other hosted modules that listen for them,
+and over the shared connection to the modules in other processes.
+"""
+
+import copy
+import importlib
+import logging
+import sys
+import threading
+
+from client.comm import BaseComm, Comm
+from client.frame_queue import FrameQueue
+from client.change_filter import ChangeFilter
+from common import clock
+from common.common import Frame, Priority
+from common.subscription import Subscription
+from common.frame_enum import FrameType
+
+# Seconds the dispatcher waits for frames before it checks whether it should stop
+DISPATCH_WAIT = 0.5
+
+_LOGGER = logging.getLogger("python_build.host")
+
+
+def parse_spec(spec: str):
+    """
+    Imports the module of a path[:name][@tick] specification.
+
+    :param spec: see the description of this file
+    :return: the function that creates the module from a comm, and the tick (None when not given)
+    """
+    spec, _, tick = spec.partition("@")
+    path, _, name = spec.partition(":")
+    factory = getattr(importlib.import_module(path), name or "Module")
+    return factory, float(tick) if tick else None
+
+
+class HostedComm(BaseComm):
+    """the comm of a module in a ModuleHost"""
+
+    def __init__(self, host: "ModuleHost"):
+        self.host = host
+        self.subscription = Subscription()
+        # Frames are delivered by the dispatcher and by the threads of the other hosted modules
+        self.delivery_lock = threading.Lock()
+        self.received = FrameQueue()
+        self.changes = ChangeFilter()
+
+    def subscribe(self, comm_listen_for: list, max_rate: dict = None,
+                  decimate: dict = None) -> None:
+        """
+        The limits of the subscription are applied by the host,
+        the frames cross the socket once for all hosted modules.
+        """
+        with self.delivery_lock:
+            super().subscribe(comm_listen_for, max_rate, decimate)
+        self.host.subscribe()
+
+    def _receive_retained(self) -> None:
+        for wrapper in self.host.comm.retained():
+            if not self.host.sent_by(self, wrapper) and self.accepts_frame(wrapper.frame.type):
+                self.received.append(wrapper.frame)
+
+    def accepts_frame(self, frame_type: FrameType) -> bool:
+        return self.subscription.accepts(frame_type)
+
+    def request(self, frame_type: FrameType, prio: Priority = Priority.NORMAL) -> None:
+        frame = Frame()
+        frame.type = frame_type
+        frame.request = True
+        frame.priority = prio
+        self.host.send(self, frame)
+
+    def send(self, frame, prio: Priority = Priority.NORMAL,
+             on_change: bool = False, keep_alive: float = None) -> bool:
+        frame.request = False
+        frame.priority = prio
+        if not self.changes.changed(frame, on_change, keep_alive):
+            return False
+        self.host.send(self, frame)
+        return True
+
+    def deliver(self, frame: Frame):
+        """puts a frame in the received queue as far as the subscription allows, and wakes the module"""
+        with self.delivery_lock:
+            frames = self.subscription.offer(frame, frame.type, clock.monotonic())
+            if frames:
+                self.received.extend(frames)
+
+    def release(self):
+        """puts the frames the subscription held back and may be delivered now in the received queue"""
+        with self.delivery_lock:
+            frames = self.subscription.release(clock.monotonic())
+            if frames:
+                self.received.extend(frames)
+
+    def time_to_release(self):
+        """seconds until a held back frame may be delivered, None when none is held"""
+        with self.delivery_lock:
+            return self.subscription.time_to_next(clock.monotonic())
+
+    def has_data(self) -> bool:
+        return bool(self.received)
+
+    def get_data(self, timeout: float = 0) -> Frame:
+        return self.received.get(timeout)
+
+    def get_many(self, max_n: int = None, timeout: float = 0) -> list:
+        return self.received.get_many(max_n, timeout)
+
+    def wait_for(self, frame_type: FrameType, predicate=None, timeout: float = None):
+        return self.received.find(
+            lambda frame: frame.type == frame_type and (predicate is None or predicate(frame)),
+            timeout)
+
+    def wait_for_data(self, timeout: float = None) -> bool:
+        return self.received.wait(timeout)
+
+    def wake(self) -> None:
+        self.received.wake()
+
+    def stop(self) -> None:
+        """unsubscribes the module, the shared connection stays"""
+        self.host.disconnect(self)
+        self.received.stop()
+
+
+class ModuleHost:
+    """
+    Runs modules in threads of this process, on one Comm.
+    Frames from the bus are routed to the HostedComms that listen for their type.
+    """
+
+    def __init__(self, comm: BaseComm = None):
+        """
+        :param comm: the shared connection to the bus, a new Comm by default
+        """
+        self.comm = comm if comm is not None else Comm()
+        self.lock = threading.Lock()
+        self.comms = []
+        self.senders = {}
+        """The hosted comm that sent the last frame per FrameType, see sent_by"""
+        self.modules = []
+        self.threads = []
+        self.should_stop = False
+        self.dispatcher = threading.Thread(target=self._dispatch, name="host dispatcher")
+
+    def connect(self) -> HostedComm:
+        """returns a new comm for a module in this host"""
+        comm = HostedComm(self)
+        with self.lock:
+            self.comms = self.comms + [comm]
+        return comm
+
+    def disconnect(self, comm: HostedComm):
+        """removes a comm from the host, its subscriptions are dropped"""
+        with self.lock:
+            self.comms = [other for other in self.comms if other is not comm]
+        self.subscribe()
+
+    def subscribe(self):
+        """
+        Makes the shared comm listen for every frame type a hosted comm listens for,
+        without limits, the hosted comms apply their own.
+        listen_for would hand out the retained frames again.
+        """
+        comms = self.comms
+        self.comm.subscribe(list({
+            frame_type for comm in comms for frame_type in comm.comm_listen_for}))
+
+    def send(self, sender: HostedComm, frame: Frame):
+        """
+        Puts a frame of a hosted module on the bus,
+        and in the hosted comms that listen for it.
+
+        :param sender: the comm of the module that sends the frame
+        :param frame:
+        :return:
+        """
+        if frame.request:
+            self.comm.request(frame.type, frame.priority)
+        else:
+            self.senders[frame.type] = sender
+            self.comm.send(frame, frame.priority)
+        self.route(frame, sender)
+
+    def sent_by(self, comm: HostedComm, wrapper) -> bool:
+        """
+        Whether a retained frame was sent by the hosted comm, like routing
+        a retained frame is not handed back to the module that sent it.
+        The bus only knows the process that sent it, the host the last hosted sender per type.
+
+        :param comm:
+        :param wrapper: the FrameWrapper of a retained frame
+        :return:
+        """
+        return wrapper.pid == self.comm.pid and self.senders.get(wrapper.frame.type) is comm
+
+    def route(self, frame: Frame, sender: HostedComm = None):
+        """
+        Puts the frame in every hosted comm but the sender that listens for it.
+        Every receiver gets its own copy, as it would from the bus,
+        only a frame from the bus is handed to its last receiver itself.
+
+        :param frame:
+        :param sender: the hosted comm that sent the frame, None for frames from the bus
+        :return:
+        """
+        receivers = [
+            comm for comm in self.comms
+            if comm is not sender and comm.accepts_frame(frame.type)]
+        for index, comm in enumerate(receivers):
+            last = sender is None and index == len(receivers) - 1
+            comm.deliver(frame if last else copy.copy(frame))
+
+    def _dispatch(self):
+        """routes the frames the shared comm receives, runs in its own thread"""
+        while not self.should_stop:
+            waits = [wait for wait in (comm.time_to_release() for comm in self.comms)
+                     if wait is not None]
+            self.comm.wait_for_data(min(waits + [DISPATCH_WAIT]))
+            self.dispatch()
+
+    def dispatch(self):
+        """
+        Routes every frame the shared comm has received,
+        and delivers the frames the subscriptions held back that may be delivered now.
+        """
+        for frame in self.comm.get_many():
+            self.route(frame)
+        for comm in self.comms:
+            comm.release()
+
+    def add(self, module, tick: float = None):
+        """
+        Adds a module, it starts running with start.
+
+        :param module: a BaseModule on a comm of this host
+        :param tick: the tick of the run loop of the module, see BaseModule.run
+        :return: the module
+        """
+        self.modules.append((module, tick))
+        return module
+
+    def load(self, spec: str):
+        """
+        Creates and adds a module from a path[:name][@tick] specification.
+
+        :param spec: see the description of this file
+        :return: the module
+        """
+        factory, tick = parse_spec(spec)
+        return self.add(factory(self.connect()), tick)
+
+    def _run_module(self, module, tick):
+        """runs a module, a module that fails does not stop the others"""
+        try:
+            module.run(tick=tick)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("%s failed", type(module).__module__)
+
+    def start(self):
+        """starts the dispatcher and the run loops of the modules"""
+        self.dispatcher.start()
+        for module, tick in self.modules:
+            thread = threading.Thread(
+                target=self._run_module, args=(module, tick), name=type(module).__module__)
+            thread.start()
+            self.threads.append(thread)
+
+    def join(self):
+        """blocks until every module has stopped"""
+        for thread in self.threads:
+            # A timeout keeps the main thread responsive to signals
+            while thread.is_alive():
+                thread.join(DISPATCH_WAIT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        for module, _ in self.modules:
+            module.stop()
+        self.join()
+        try:
+            for module, _ in self.modules:
+                # Shuts down the handlers, sends the last results and disconnects the hosted comm,
+                # a module that fails to exit does not keep the others from exiting
+                try:
+                    module.__exit__(*args)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("%s failed to exit", type(module).__module__)
+        finally:
+            self.should_stop = True
+            self.comm.wake()
+            if self.dispatcher.is_alive():
+                self.dispatcher.join()
+            self.comm.stop()
+
+
+def main():
+    """runs the modules given on the command line"""
+    print("Starting host...\n")
+    with ModuleHost() as host:
+        for spec in sys.argv[1:]:
+            host.load(spec)
+        print("Modules created...")
+        host.start()
+        host.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#! python
+"""
+this program starts the robot stack: the manager and the modules, each in a process forked from this one.
+
+usage: python client/launcher.py <module> [<module> ...]
+
+a module is given as path[:name][@tick], like for client/host.py:
+
+    python client/launcher.py modules.button_module.main:create_module \\
+        modules.controller_module.module.mod modules.led_module.module.mod
+
+the launcher imports the modules, and with them the shared packages, before it forks,
+so the processes start with a warm interpreter instead of importing everything again.
+the manager is started first, the modules are forked once the manager accepts connections.
+a process that fails, it exits with a nonzero code or by a signal, is restarted after a delay,
+that doubles with every restart and is reset when the process ran for RESTART_RESET seconds.
+a process that exits with 0 finished and is not restarted.
+the time until every process is ready and the memory of the processes are logged.
+fork is not available on windows.
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from client.comm import Comm
+from client.host import parse_spec
+from common import config
+from common.common import bus_config
+from common.memory import process_memory
+from common.signals import register_signal_callback
+from manager.manager import BusManager
+
+# Seconds before a process that exited is started again, doubled on every restart
+RESTART_BACKOFF_INITIAL = 0.5
+RESTART_BACKOFF_MAX = 30.0
+# Seconds a process has to run before its backoff is reset
+RESTART_RESET = 60.0
+# Seconds between two checks of the processes
+SUPERVISE_INTERVAL = 0.1
+# Seconds the stack gets to become ready
+READY_TIMEOUT = 30.0
+# Seconds a process gets to stop before it is killed
+STOP_TIMEOUT = 5.0
+
+_LOGGER = logging.getLogger("python_build.launcher")
+
+
+def _run_manager(ready):
+    """entry point of the forked manager process"""
+    config.start_listener()
+    try:
+        with BusManager() as bus_manager:
+            register_signal_callback(bus_manager.stop)
+            ready.set()
+            bus_manager.process()
+    finally:
+        config.stop_listener()
+
+
+def _run_module(factory, tick, ready):
+    """entry point of a forked module process, like modules/*/main.py"""
+    config.start_listener()
+    try:
+        # Comm returns once it is connected to the bus
+        module = factory(Comm())
+        ready.set()
+        with module:
+            module.run(tick=tick)
+    finally:
+        config.stop_listener()
+
+
+class Supervised:
+    """a process of the stack, started again when it exits"""
+
+    def __init__(self, name: str, target, args=()):
+        """
+        :param name: the name of the process in the log
+        :param target: the entry point, called with args and an Event to set when ready
+        :param args:
+        """
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.ready = None
+        self.started = None
+        self.ready_at = None
+        """The monotonic time the process was seen ready, None until then"""
+
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.restart_at = None
+        """The monotonic time the process that failed is started again"""
+
+        self.finished = False
+        """Set when the process exited with 0, it is not restarted"""
+
+    def start(self):
+        """forks the process"""
+        context = multiprocessing.get_context("fork")
+        self.ready = context.Event()
+        self.process = context.Process(
+            target=self.target, args=self.args + (self.ready,), name=self.name)
+        self.started = time.monotonic()
+        self.ready_at = None
+        self.finished = False
+        self.process.start()
+
+    def check(self, now: float):
+        """notes when the process is ready, and restarts it when it failed and its backoff passed"""
+        if self.ready_at is None and self.ready.is_set():
+            self.ready_at = now
+        if self.finished or self.process.is_alive():
+            return
+
+        if self.process.exitcode == 0:
+            _LOGGER.info("%s finished after %.1f s", self.name, now - self.started)
+            self.finished = True
+        elif self.restart_at is None:
+            if now - self.started >= RESTART_RESET:
+                self.backoff = RESTART_BACKOFF_INITIAL
+            _LOGGER.warning(
+                "%s exited with %s after %.1f s, restarting in %.1f s",
+                self.name, self.process.exitcode, now - self.started, self.backoff)
+            self.restart_at = now + self.backoff
+            self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        elif now >= self.restart_at:
+            self.restart_at = None
+            self.restarts += 1
+            self.start()
+
+    def stop(self):
+        """terminates the process, it is killed when it does not stop in time"""
+        if self.process is None or not self.process.is_alive():
+            return
+        self.process.terminate()
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            _LOGGER.warning("%s did not stop, killing it", self.name)
+            self.process.kill()
+            self.process.join()
+
+
+class Launcher:
+    """starts the manager and the modules, and keeps them running"""
+
+    def __init__(self, specs):
+        """
+        :param specs: the modules as path[:name][@tick], see the description of this file.
+            they are imported here, so every forked process has them imported already
+        """
+        self.manager = Supervised("manager", _run_manager)
+        self.modules = []
+        for spec in specs:
+            factory, tick = parse_spec(spec)
+            self.modules.append(Supervised(spec, _run_module, (factory, tick)))
+        self.started = None
+        self.should_stop = False
+
+    @property
+    def processes(self) -> list:
+        """the manager and the modules"""
+        return [self.manager] + self.modules
+
+    def start(self, timeout: float = READY_TIMEOUT):
+        """starts the manager, and the modules once the manager is ready"""
+        self.started = time.monotonic()
+        # Resolved once here, instead of in every forked process
+        bus_config()
+        self.manager.start()
+        if not self.manager.ready.wait(timeout):
+            raise TimeoutError("the manager did not start in {} s".format(timeout))
+        for module in self.modules:
+            module.start()
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> float:
+        """
+        Blocks until every process is ready.
+
+        :param timeout: seconds since start
+        :return: the seconds from start until every process was ready
+        """
+        for process in self.processes:
+            remaining = self.started + timeout - time.monotonic()
+            if not process.ready.wait(max(0, remaining)):
+                raise TimeoutError("{} was not ready in {} s".format(process.name, timeout))
+            process.check(time.monotonic())
+        return max(process.ready_at for process in self.processes) - self.started
+
+    def memory(self) -> dict:
+        """the memory of the launcher and of every process, see common.memory.process_memory"""
+        usage = {"launcher": process_memory(os.getpid())}
+        for process in self.processes:
+            if process.process is not None and process.process.is_alive():
+                usage[process.name] = process_memory(process.process.pid)
+        return usage
+
+    def report(self, ready: float):
+        """logs the time until the stack was ready and the memory it uses"""
+        usage = self.memory().values()
+        _LOGGER.info(
+            "%d processes ready in %.3f s, rss %s MB, pss %s MB", len(self.processes), ready,
+            *[
+                "-" if any(process[key] is None for process in usage) else
+                "{:.1f}".format(sum(process[key] for process in usage) / 1024 / 1024)
+                for key in ("rss", "pss")
+            ])
+
+    def supervise(self):
+        """restarts the processes that exit until stop is called"""
+        while not self.should_stop:
+            now = time.monotonic()
+            for process in self.processes:
+                process.check(now)
+            time.sleep(SUPERVISE_INTERVAL)
+
+    def stop(self):
+        """makes supervise return"""
+        self.should_stop = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.should_stop = True
+        # Stop the modules before the manager they are connected to
+        for process in reversed(self.processes):
+            process.stop()
+
+
+def main():
+    """launches the modules given on the command line"""
+    config.configure_logging()
+    print("Starting launcher...\n")
+    with Launcher(sys.argv[1:]) as launcher:
+        register_signal_callback(launcher.stop)
+        launcher.start()
+        launcher.report(launcher.wait_ready())
+        launcher.supervise()
+
+
+if __name__ == "__main__":
+    main()
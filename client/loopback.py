@@ -0,0 +1,237 @@
+"""
+this module provides an in-process bus, for testing modules without a manager.
+
+every LoopbackComm connected to a LoopbackBus receives the frames the other comms send,
+just like a Comm connected to the manager, but synchronously and without sockets or threads.
+frames are delivered in the order they are sent, so a test always sees the same order.
+
+    bus = LoopbackBus()
+    modules = [ButtonModule(bus.connect(), button), ControllerModule(bus.connect())]
+    bus.run(modules)
+"""
+
+import copy
+import itertools
+
+from client.comm import BaseComm
+from client.frame_queue import FrameQueue
+from client.change_filter import ChangeFilter
+from common import clock
+from common.common import Frame, FrameWrapper, Priority
+from common.subscription import Subscription
+from common.frame_enum import FrameType
+
+
+class LoopbackBus:
+    """delivers the frames sent by its comms to the other comms"""
+
+    def __init__(self, retain=()):
+        """
+        :param retain: the frame types of which the last value is kept for comms
+            that start listening later, like the RETAINED_FRAME_TYPES of the manager
+        """
+        self.comms = []
+        self.retain = set(retain)
+        self.retained = {}
+        self.sent = 0
+        # Every comm gets a number, like the pid of a Comm
+        self._ids = itertools.count(1)
+
+    def connect(self) -> "LoopbackComm":
+        """returns a new comm on this bus"""
+        return LoopbackComm(self)
+
+    def distribute(self, sender: "LoopbackComm", frame: Frame):
+        """
+        Puts the frame in the received queue of every comm except the sender
+        that listens for its type. Every receiver gets its own copy,
+        as it would get its own unpickled frame from the manager.
+
+        :param sender:
+        :param frame:
+        :return:
+        """
+        self.sent += 1
+        if frame.type in self.retain and not frame.request:
+            self.retained[frame.type] = (sender.pid, frame)
+
+        for comm in self.comms:
+            if comm is not sender and comm.accepts_frame(frame.type):
+                comm.deliver(copy.copy(frame))
+
+    def pending(self) -> int:
+        """the number of frames that are waiting to be taken by a module"""
+        return sum(len(comm.received) for comm in self.comms)
+
+    def step(self, modules) -> int:
+        """
+        Calls tick(), the due scheduled tasks and process() of every module once, in the given order.
+        First the frames that subscriptions held back and may be delivered now are delivered.
+
+        :param modules: BaseModules with a LoopbackComm on this bus
+        :return: the number of frames sent during the step
+        """
+        sent = self.sent
+        for comm in self.comms:
+            comm.release()
+        for module in modules:
+            module.tick()
+            module.run_scheduled()
+            module.process()
+        return self.sent - sent
+
+    def run(self, modules, max_steps=1000) -> int:
+        """
+        Steps the modules until no frames are sent and none are waiting.
+        Modules that send on every process() call, like requesting modules,
+        never settle and run for max_steps.
+
+        :param modules: BaseModules with a LoopbackComm on this bus
+        :param max_steps:
+        :return: the number of steps that were run
+        """
+        for steps in range(1, max_steps + 1):
+            if not self.step(modules) and not self.pending():
+                return steps
+        return max_steps
+
+    def run_for(self, modules, seconds: float, period: float = 0.05) -> int:
+        """
+        Steps the modules every period for seconds, like their main.py loops do.
+        On a VirtualClock the sleeping takes no time,
+        so this only takes as long as the work of the modules.
+
+        :param modules: BaseModules with a LoopbackComm on this bus
+        :param seconds: the time to run for, on the clock in use
+        :param period: the time between two steps
+        :return: the number of steps that were run
+        """
+        end = clock.monotonic() + seconds
+        steps = 0
+        while clock.monotonic() < end and not all(module.stopped for module in modules):
+            self.step(modules)
+            steps += 1
+            clock.sleep(period)
+        return steps
+
+
+class LoopbackComm(BaseComm):
+    """a comm connected to a LoopbackBus"""
+
+    def __init__(self, bus: LoopbackBus):
+        self.bus = bus
+        self.pid = next(bus._ids)  # pylint: disable=protected-access
+        self.subscription = Subscription()
+        self.received = FrameQueue()
+        self.changes = ChangeFilter()
+        self.stopped = False
+        bus.comms.append(self)
+
+    def _receive_retained(self) -> None:
+        for wrapper in self.retained():
+            if wrapper.pid != self.pid and self.accepts_frame(wrapper.frame.type):
+                self.received.append(copy.copy(wrapper.frame))
+
+    def retained(self) -> list:
+        """
+        The last values the bus retained.
+
+        :return: list of FrameWrapper
+        """
+        return [FrameWrapper(frame, pid, 0) for pid, frame in self.bus.retained.values()]
+
+    def accepts_frame(self, frame_type: FrameType) -> bool:
+        return self.subscription.accepts(frame_type)
+
+    def deliver(self, frame: Frame):
+        """puts a frame from the bus in the received queue, as far as the subscription allows"""
+        self.received.extend(self.subscription.offer(frame, frame.type, clock.monotonic()))
+
+    def release(self):
+        """puts the frames the subscription held back and may be delivered now in the received queue"""
+        released = self.subscription.release(clock.monotonic())
+        if released:
+            self.received.extend(released)
+
+    def request(self, frame_type: FrameType, prio: Priority = Priority.NORMAL) -> None:
+        frame = Frame()
+        frame.type = frame_type
+        frame.request = True
+        frame.priority = prio
+        self._push_frame(frame)
+
+    def send(self, frame, prio: Priority = Priority.NORMAL,
+             on_change: bool = False, keep_alive: float = None) -> bool:
+        frame.request = False
+        frame.priority = prio
+        if not self.changes.changed(frame, on_change, keep_alive):
+            return False
+        self._push_frame(frame)
+        return True
+
+    def _push_frame(self, frame: Frame):
+        """puts the frame on the bus"""
+        self.bus.distribute(self, frame)
+
+    def has_data(self) -> bool:
+        return bool(self.received)
+
+    def wait_for_data(self, timeout: float = None) -> bool:
+        """
+        Nothing arrives while a single threaded test waits,
+        so this sleeps for the timeout on the clock in use.
+        Waiting without a timeout for frames that are not there would never end.
+
+        :param timeout: seconds to wait, None to wait for data
+        :return: whether there is data available
+        :raises RuntimeError: when there is no data and timeout is None
+        """
+        if not self.received:
+            if timeout is None:
+                raise RuntimeError(
+                    "waiting without a timeout for frames that can not arrive, "
+                    "frames arrive on a LoopbackBus when another comm sends")
+            if timeout:
+                clock.sleep(timeout)
+        return self.has_data()
+
+    def get_data(self, timeout: float = 0) -> Frame:
+        """
+        Like wait_for_data, a timeout is slept on the clock in use.
+
+        :param timeout: seconds to wait for data, None to wait until there is data
+        :return: common.Frame
+        """
+        self.wait_for_data(timeout)
+        return self.received.get()
+
+    def get_many(self, max_n: int = None, timeout: float = 0) -> list:
+        self.wait_for_data(timeout)
+        return self.received.get_many(max_n)
+
+    def wait_for(self, frame_type: FrameType, predicate=None, timeout: float = None):
+        """
+        Like wait_for_data, a timeout is slept on the clock in use.
+
+        :param frame_type:
+        :param predicate: function that takes a frame and returns a bool, None accepts any
+        :param timeout: seconds to wait, None to wait until the frame arrives
+        :return: common.Frame, None when it has not arrived
+        :raises RuntimeError: when the frame is not there and timeout is None
+        """
+        def accepted(frame):
+            return frame.type == frame_type and (predicate is None or predicate(frame))
+        frame = self.received.find(accepted, 0)
+        if frame is None:
+            if timeout is None:
+                raise RuntimeError("waiting without a timeout for a {} frame that can not arrive"
+                                   .format(frame_type.name))
+            if timeout:
+                clock.sleep(timeout)
+        return frame
+
+    def stop(self) -> None:
+        """disconnects from the bus"""
+        if not self.stopped:
+            self.stopped = True
+            self.bus.comms.remove(self)
@@ -3,9 +3,15 @@
 """this file declares the base module"""
 
 import datetime
-from abc import ABC, abstractmethod
+from abc import ABC
+from collections import deque
 from client.comm import BaseComm
+from common.common import Frame
+from common.frame_enum import FrameType
+from common.handlers import find_handlers
+from common.scheduler import Scheduler, find_tasks
 from common.signals import register_signal_callback
+from common import profiling
 
 __author__ = "Isha Geurtsen"
 __date__ = datetime.datetime(2019, 6, 3, 18, 47)
@@ -18,24 +24,130 @@ class BaseModule(ABC):
         self.stopped = False
         register_signal_callback(self.stop)
 
-    @abstractmethod
+        # Frames returned by handlers, sent by process()
+        self._results = deque()
+        # The @on handlers per (FrameType, request), see common/handlers.py
+        self._handlers = find_handlers(self, self._handled)
+        if self._handlers:
+            types = {frame_type for frame_type, _ in self._handlers}
+            self.comm.listen_for([FrameType.ALL] if FrameType.ALL in types else list(types))
+
+        # The periodic tasks, the @every methods and the ones added with schedule
+        self._scheduler = Scheduler()
+        for method, period, deadline in find_tasks(self):
+            self._scheduler.add(method, period, deadline)
+
+        # Times every process() call, see common/profiling.py
+        self._profiler = profiling.profile_loop(self) if profiling.enabled() else None
+
     def process(self):
         """the process function processes all outstanding work.
         Just like the C++ internal communication module,
 
         Please note: if you don't process data often enough, you might miss some frames.
         It is dependent on the module if this is a problem or not.
+
+        By default every frame is handed to the @on handlers of the module,
+        and the frames they return are sent.
+        """
+        self.send_results()
+        for frame in self.comm.get_many():
+            self.dispatch(frame)
+        self.send_results()
+
+    def dispatch(self, frame: Frame):
+        """hands a frame to the handlers of its type"""
+        for frame_type in (frame.type, FrameType.ALL):
+            for handler in self._handlers.get((frame_type, frame.request), ()):
+                handler(frame)
+
+    def _handled(self, result):
+        """keeps the frames a handler returned, handlers on a pool call this from another thread"""
+        if result is None:
+            return
+        self._results.extend([result] if isinstance(result, Frame) else result)
+        self.comm.wake()
+
+    def send_results(self):
+        """sends the frames the handlers returned"""
+        while self._results:
+            frame = self._results.popleft()
+            self.comm.send(frame, frame.priority)
+
+    def tick(self):
+        """the tick function does the periodic work of the module, like requesting data.
+        run(tick) calls it every tick seconds, before process().
+        """
+
+    def schedule(self, function, period: float, deadline: float = None, name: str = None):
+        """runs function every period seconds from the run loop, see common/scheduler.py
+
+        :param function: called without arguments
+        :param period: seconds between two runs
+        :param deadline: seconds a run may start late, the period by default
+        :param name: the name of the task in the statistics, the name of the function by default
+        :return: the common.scheduler.Task, give it to scheduler.remove to stop it
+        """
+        return self._scheduler.add(function, period, deadline, name)
+
+    def task_stats(self) -> list:
+        """the statistics of the scheduled tasks, see Scheduler.snapshot"""
+        return self._scheduler.snapshot()
+
+    def run_scheduled(self) -> int:
+        """runs the scheduled tasks that are due, returns the number of runs"""
+        return self._scheduler.run_due()
+
+    def time_to_next(self):
+        """seconds until process() has to be called, even if no frames arrive.
+        None when the module only reacts to frames.
         """
-        assert not self.stopped
-        raise NotImplementedError
+        return None
+
+    def run(self, tick: float = None):
+        """runs the module until it is stopped.
+        process() is called as soon as frames arrive, when time_to_next() has passed,
+        and after the scheduled tasks that were due ran. In between the module waits
+        for its comm without using the cpu.
+
+        :param tick: seconds between two tick() calls, None to never call tick().
+            tick() is a scheduled task, ticks that were missed because process() took long are skipped
+        """
+        task = None if tick is None else self.schedule(self.tick, tick)
+        try:
+            while not self.stopped:
+                timeouts = [self.time_to_next(), self._scheduler.time_to_next()]
+                if self._profiler is not None:
+                    # A running cProfile is stopped by process(), also when no frames arrive
+                    timeouts.append(self._profiler.time_to_stop())
+                timeouts = [timeout for timeout in timeouts if timeout is not None]
+                timeout = max(0, min(timeouts)) if timeouts else None
+                if timeout != 0:
+                    self.comm.wait_for_data(timeout)
+                if self.stopped:
+                    break
+
+                self.run_scheduled()
+                if not self.stopped:
+                    self.process()
+        finally:
+            if task is not None:
+                self._scheduler.remove(task)
 
     def __enter__(self):
         return self
 
     def __exit__(self, *args):
         self.stopped = True
-        self.comm.stop()
+        try:
+            for handler in {handler for handlers in self._handlers.values() for handler in handlers}:
+                handler.shutdown()
+            self.send_results()
+        finally:
+            # The worker thread of the comm has to stop, even when sending failed
+            self.comm.stop()
 
     def stop(self):
         """signals the application that it should shut down"""
         self.stopped = True
+        self.comm.wake()
@@ -0,0 +1,210 @@
+#! python
+
+"""
+this module provides the batch envelope of DATA_STREAM frames.
+
+a Comm created with batch_bytes coalesces consecutive DATA_STREAM frames of the same type it sends
+into one FrameBatch, so a stream of tiny frames pays the cost of sending, wrapping and distributing
+a frame once per batch. a batch is sent when it holds batch_bytes of frame data, when its first frame
+waited batch_delay seconds, or when a frame of another type or priority is sent, so frames stay in order.
+
+batching trades latency for throughput: a frame may reach the bus up to BATCH_MAX_DELAY seconds later
+than it would by itself. a Comm does not batch unless it is asked to, BATCH_MAX_BYTES and BATCH_MAX_DELAY
+are the suggested limits.
+
+the frames of a type have a fixed size, so a batch keeps their data back to back in one bytes object.
+receivers iterate it without copying: views() yields a memoryview per frame,
+values() unpacks the frames with struct.iter_unpack.
+"""
+
+import copy
+import struct
+
+from common import clock
+from common.common import Frame, Priority
+
+# Bytes of frame data a batch holds at most, a frame that does not fit starts the next batch
+BATCH_MAX_BYTES = 4096
+
+# Seconds the first frame of a batch waits at most before the batch is sent
+BATCH_MAX_DELAY = 0.01
+
+
+class FrameBatch(Frame):
+    """
+    Consecutive DATA_STREAM frames of one type and size, sent as one frame.
+    The batch has the type, members, format and length of its frames,
+    its data is the data of its frames back to back.
+    Reading a member, like batch["mm"], reads it from the last frame.
+    """
+
+    def __init__(self, frames: list):
+        """
+        :param frames: the frames, of the same class, type and data size
+        """
+        super().__init__()
+        first = frames[0]
+        self.MEMBERS = first.MEMBERS
+        self.type = first.type
+        self.format = first.format
+        self.length = first.length
+        self.priority = Priority.DATA_STREAM
+
+        self.frame_class = type(first)
+        """The class of the frames, frames() creates them"""
+
+        self.size = len(first.data)
+        """The bytes of data of every frame"""
+
+        self.count = len(frames)
+        """The number of frames in the batch"""
+
+        self.data = b"".join(frame.data for frame in frames)
+
+    def get_data(self):
+        """the values of the last frame, the latest state of the stream"""
+        return struct.unpack_from(self.format, self.data, self.size * (self.count - 1))
+
+    def view(self) -> memoryview:
+        """the data of all frames, without copying it"""
+        return memoryview(self.data)
+
+    def views(self):
+        """
+        Iterates the data of the frames without copying it.
+
+        :return: iterator of a read only memoryview per frame
+        """
+        view = self.view()
+        for offset in range(0, len(view), self.size):
+            yield view[offset:offset + self.size]
+
+    def values(self):
+        """
+        Iterates the unpacked values of the frames, without copying their data.
+
+        :return: iterator of a tuple per frame, like Frame.get_data
+        """
+        return struct.iter_unpack(self.format, self.data)
+
+    def frames(self) -> list:
+        """
+        The frames of the batch, as they were sent.
+        Every frame gets a copy of its data.
+
+        :return: list of frames of frame_class
+        """
+        frames = []
+        for data in self.views():
+            frame = self.frame_class()
+            frame.type = self.type
+            frame.format = self.format
+            frame.length = self.length
+            frame.priority = self.priority
+            frame.data = bytes(data)
+            frames.append(frame)
+        return frames
+
+    def __str__(self):
+        return "{} of {} {}".format(self.__class__.__name__, self.count, self.type.name)
+
+
+def unpack(frame: Frame) -> list:
+    """
+    The frames a received frame carries.
+
+    :param frame:
+    :return: the frames of a FrameBatch, a list with the frame itself otherwise
+    """
+    if isinstance(frame, FrameBatch):
+        return frame.frames()
+    return [frame]
+
+
+def frame_count(frame: Frame) -> int:
+    """the number of frames a frame carries, the count of a FrameBatch, 1 otherwise"""
+    return frame.count if isinstance(frame, FrameBatch) else 1
+
+
+class Batcher:
+    """
+    Collects the DATA_STREAM frames a comm sends into FrameBatches.
+    Not thread safe, the comm adds and flushes under its own lock.
+    """
+
+    def __init__(self, max_bytes: int = BATCH_MAX_BYTES, max_delay: float = BATCH_MAX_DELAY):
+        """
+        :param max_bytes: bytes of frame data a batch holds at most, 0 to not batch
+        :param max_delay: seconds the first frame of a batch waits at most
+        """
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+
+        self.pending = []
+        """The frames of the batch that is being collected"""
+
+        self.pending_bytes = 0
+        self.started = None
+        """The monotonic time the first pending frame was added"""
+
+        self.batches = 0
+        self.batched = 0
+        """The number of batches sent, and the number of frames sent in them"""
+
+    def _fits(self, frame: Frame) -> bool:
+        """whether the frame can join the pending frames"""
+        first = self.pending[0]
+        return (type(frame) is type(first) and frame.type == first.type
+                and len(frame.data) == len(first.data)
+                and self.pending_bytes + len(frame.data) <= self.max_bytes)
+
+    def add(self, frame: Frame) -> list:
+        """
+        Adds a DATA_STREAM frame to the pending batch.
+
+        :param frame:
+        :return: the frames and batches that have to be sent now, in order
+        """
+        if not frame.data or len(frame.data) > self.max_bytes:
+            return self.flush() + [frame]
+
+        ready = []
+        if self.pending and not self._fits(frame):
+            ready = self.flush()
+        if not self.pending:
+            self.started = clock.monotonic()
+        # A copy, the sender may set new data on the frame and send it again
+        self.pending.append(copy.copy(frame))
+        self.pending_bytes += len(frame.data)
+        if self.pending_bytes + len(frame.data) > self.max_bytes:
+            ready += self.flush()
+        return ready
+
+    def due(self, now: float = None) -> bool:
+        """whether the first pending frame waited max_delay seconds"""
+        return self.time_to_due(now) == 0
+
+    def time_to_due(self, now: float = None):
+        """seconds until the pending batch is due, None when no frame is pending"""
+        if not self.pending:
+            return None
+        now = clock.monotonic() if now is None else now
+        return max(0.0, self.started + self.max_delay - now)
+
+    def flush(self) -> list:
+        """
+        Ends the pending batch.
+
+        :return: the batch, the frame itself when only one frame is pending, or nothing
+        """
+        pending = self.pending
+        if not pending:
+            return []
+        self.pending = []
+        self.pending_bytes = 0
+        self.started = None
+        if len(pending) == 1:
+            return pending
+        self.batches += 1
+        self.batched += len(pending)
+        return [FrameBatch(pending)]
@@ -0,0 +1,114 @@
+#! python
+
+"""
+this module provides the clock the bus and the modules use for timestamps and for pacing.
+
+by default it is the system clock. a simulation can install a VirtualClock with set_clock,
+on a virtual clock sleeping takes no time, so idle periods are skipped and
+a run of many minutes finishes as soon as the work in it is done.
+
+use the functions of this module instead of the time module:
+
+    from common import clock
+    clock.sleep(0.05)
+"""
+
+import threading
+import time as _time
+from abc import ABC, abstractmethod
+
+
+class Clock(ABC):
+    """source of time"""
+
+    @abstractmethod
+    def time(self) -> float:
+        """seconds since the epoch, like time.time"""
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        """seconds that never go back, like time.monotonic"""
+
+    @abstractmethod
+    def sleep(self, seconds: float) -> None:
+        """waits for seconds, like time.sleep"""
+
+
+class SystemClock(Clock):
+    """the clock of the operating system"""
+
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        _time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Clock that only moves when it is slept on or advanced.
+    Meant for single threaded simulations, like modules on a LoopbackBus,
+    every thread that sleeps moves the clock for all of them.
+    """
+
+    def __init__(self, start: float = 0.0):
+        """
+        :param start: the time() of the clock, monotonic() starts at 0
+        """
+        self.lock = threading.Lock()
+        self.epoch = start
+        self.elapsed = 0.0
+
+    def time(self) -> float:
+        return self.epoch + self.elapsed
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        """moves the clock forward"""
+        if seconds < 0:
+            raise ValueError("sleep length must be non-negative")
+        with self.lock:
+            self.elapsed += seconds
+
+
+_CLOCK = SystemClock()
+
+
+def get_clock() -> Clock:
+    """returns the clock in use"""
+    return _CLOCK
+
+
+def set_clock(clock: Clock) -> Clock:
+    """
+    Makes the bus and the modules in this process use the clock.
+
+    :param clock:
+    :return: the clock that was in use
+    """
+    global _CLOCK  # pylint: disable=global-statement
+    previous, _CLOCK = _CLOCK, clock
+    return previous
+
+
+def time() -> float:
+    """seconds since the epoch on the clock in use"""
+    return _CLOCK.time()
+
+
+def monotonic() -> float:
+    """monotonic seconds on the clock in use"""
+    return _CLOCK.monotonic()
+
+
+def sleep(seconds: float) -> None:
+    """sleeps on the clock in use"""
+    _CLOCK.sleep(seconds)
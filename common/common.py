@@ -7,7 +7,6 @@ import socket
 from dataclasses import dataclass
 import logging
 from enum import Enum
-import common.config
 
 @dataclass
 class Address():
@@ -23,14 +22,33 @@ class Address():
 
 @dataclass
 class BusConfig:
-    """this class contains all the configuration to connect with the python bus"""
+    """this class contains all the configuration to connect with the python bus
+    when SOCKET_PATH is set, the bus uses a unix domain socket at that path instead of ADDRESS
+    """
     AUTH_KEY: bytes
     ADDRESS: Address
+    SOCKET_PATH: str = None
+
+    def address(self):
+        """returns the address modules connect to, as expected by multiprocessing.managers"""
+        if self.SOCKET_PATH:
+            return self.SOCKET_PATH
+        return self.ADDRESS.tuple()
+
+    def listen_address(self):
+        """returns the address the manager listens on, as expected by multiprocessing.managers"""
+        if self.SOCKET_PATH:
+            return self.SOCKET_PATH
+        return ('', self.ADDRESS.port)
 
-def get_bus_config(inside_docker_container):
+def get_bus_config(inside_docker_container, socket_path=None):
     """get_bus_config returns the correct """
     logger = logging.getLogger("common.busconfig")
     default = BusConfig(AUTH_KEY=b'r2d2', ADDRESS=Address('127.0.0.1', 5000))
+    if socket_path:
+        logger.info("using unix domain socket %s", socket_path)
+        default.SOCKET_PATH = socket_path
+        return default
     if inside_docker_container is False:
         logger.info("using default bus config")
         return default
@@ -205,10 +223,38 @@ class Frame:
 
 @dataclass
 class FrameWrapper:
-    """this class adds meta data to a Frame"""
+    """this class adds meta data to a Frame
+    trace is None, unless the sender traces the frame, see common/tracing.py
+    """
     frame: Frame
     pid: int
     timestamp: int
+    trace: list = None
 
-# global settings
-BUSCONFIG = get_bus_config(os.environ.get('AM_I_IN_A_DOCKER_CONTAINER', False))
+# global settings, read on first use, see bus_config
+_BUSCONFIG = None
+
+
+def bus_config() -> BusConfig:
+    """
+    Returns the configuration of the bus of this process.
+    It is created from the environment the first time it is needed,
+    so importing this module does not resolve the manager inside docker.
+    Changes to it, like setting SOCKET_PATH, last for the process.
+
+    :return: BusConfig
+    """
+    global _BUSCONFIG  # pylint: disable=global-statement
+    if _BUSCONFIG is None:
+        _BUSCONFIG = get_bus_config(
+            os.environ.get('AM_I_IN_A_DOCKER_CONTAINER', False),
+            os.environ.get('PYTHON_BUS_SOCKET'),
+        )
+    return _BUSCONFIG
+
+
+def __getattr__(name):
+    """BUSCONFIG is still available as an attribute, it is created when it is first read"""
+    if name == "BUSCONFIG":
+        return bus_config()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
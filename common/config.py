@@ -2,13 +2,25 @@
 
 """this file contains all configuration options for python build"""
 
+import atexit
 import datetime
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 
 __author__ = "Isha Geurtsen"
 __date__ = datetime.date(2019, 6, 17)
 __version__ = "Development"
 
+# Number of records that can wait for the background writer,
+# records logged while it is full are dropped
+LOG_QUEUE_LENGTH = 1024
+
+# The same message is logged at most REPEAT_LIMIT times per REPEAT_INTERVAL seconds
+REPEAT_LIMIT = 5
+REPEAT_INTERVAL = 10.0
 
 # configure the logging module
 
@@ -17,13 +29,151 @@ class PrintHandler(logging.Handler):
     def emit(self, record):
         print(self.format(record))
 
-HANDLERS = [
-    logging.FileHandler("python_build.log", "a", "UTF-8", False),
-    PrintHandler(),
-]
 
-logging.basicConfig(
-    format="%(asctime)s:%(levelname)s:%(name)s:%(message)s",
-    level=logging.INFO,
-    handlers=HANDLERS,
-)
+class RepeatFilter(logging.Filter):
+    """
+    Limits how often the same message is logged.
+    Messages are the same when they have the same logger, level and
+    format string, the arguments are not compared so nothing is formatted.
+    The first record after a suppression is preceded by a summary record
+    that tells how many were suppressed, the record itself is not changed.
+    """
+    def __init__(self, limit=REPEAT_LIMIT, interval=REPEAT_INTERVAL, report=None):
+        """
+        :param limit: the number of times the same message is logged per interval
+        :param interval: seconds
+        :param report: function that takes a summary record, None to not report suppressions
+        """
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.report = report
+        self.lock = threading.Lock()
+        self.seen = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            start, count, suppressed = self.seen.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            count += 1
+            if count > self.limit:
+                self.seen[key] = (start, count, suppressed + 1)
+                return False
+            self.seen[key] = (start, count, 0)
+
+        if suppressed and self.report is not None:
+            summary = logging.makeLogRecord(record.__dict__)
+            summary.msg = "%s (%d repeated messages suppressed)"
+            summary.args = (record.msg, suppressed)
+            summary.exc_info = summary.exc_text = summary.stack_info = None
+            self.report(summary)
+        return True
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background thread that formats and writes them,
+    so a slow terminal or disk does not slow down the bus.
+    Records are not formatted before they are handed over.
+    When the queue is full, records are dropped instead of blocking,
+    the first record that fits again is preceded by a warning with the number dropped.
+    """
+    def __init__(self, length=LOG_QUEUE_LENGTH):
+        super().__init__(queue.Queue(length))
+        self.dropped = 0
+        """The number of records dropped since the handler was created"""
+
+        self.unreported = 0
+        """The number of records dropped since the last warning"""
+
+    def prepare(self, record):
+        # The listener runs in this process, so the record needs no pickling
+        return record
+
+    def enqueue(self, record):
+        # Called holding the lock of the handler
+        try:
+            if self.unreported:
+                self.queue.put_nowait(logging.LogRecord(
+                    "python_build.logging", logging.WARNING, __file__, 0,
+                    "%d log records dropped, the log queue was full", (self.unreported,), None))
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.unreported += 1
+
+    def put(self, record):
+        """hands over a record without filtering it, the summaries of RepeatFilter are put this way"""
+        with self.lock:
+            self.enqueue(self.prepare(record))
+
+
+FORMATTER = logging.Formatter("%(asctime)s:%(levelname)s:%(name)s:%(message)s")
+
+# Created by configure_logging
+BACKGROUND_HANDLER = None
+LISTENER = None
+
+
+def configure_logging():
+    """
+    Logs to python_build.log and the screen, through the background handler.
+    Nothing is configured on import, the first Comm or BusManager of a process calls this,
+    programs that log before they create one call it first.
+    Does nothing when it was called before, or when logging was configured elsewhere.
+
+    :return:
+    """
+    global BACKGROUND_HANDLER, LISTENER  # pylint: disable=global-statement
+    if BACKGROUND_HANDLER is not None:
+        return
+
+    handlers = [
+        # The file is created when the first record is written
+        logging.FileHandler("python_build.log", "a", "UTF-8", True),
+        PrintHandler(),
+    ]
+    for handler in handlers:
+        handler.setFormatter(FORMATTER)
+
+    BACKGROUND_HANDLER = BackgroundHandler()
+    BACKGROUND_HANDLER.addFilter(RepeatFilter(report=BACKGROUND_HANDLER.put))
+    LISTENER = logging.handlers.QueueListener(
+        BACKGROUND_HANDLER.queue, *handlers, respect_handler_level=True)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        handlers=[BACKGROUND_HANDLER],
+    )
+
+    # basicConfig does nothing when logging was configured before
+    if BACKGROUND_HANDLER in logging.getLogger().handlers:
+        start_listener()
+        # Write what is still queued when the application exits
+        atexit.register(stop_listener)
+
+
+def start_listener():
+    """
+    Starts the thread that writes the records, when configure_logging installed the background handler.
+    A process forked from this one has no listener thread, and may have a queue
+    that was locked by the thread at the fork, so it calls this again to start over.
+
+    :return:
+    """
+    if BACKGROUND_HANDLER not in logging.getLogger().handlers:
+        return
+    BACKGROUND_HANDLER.queue = queue.Queue(LOG_QUEUE_LENGTH)
+    LISTENER.queue = BACKGROUND_HANDLER.queue
+    LISTENER._thread = None  # pylint: disable=protected-access
+    LISTENER.start()
+
+
+def stop_listener():
+    """writes what is still queued and stops the listener thread"""
+    if LISTENER is not None and LISTENER._thread is not None:  # pylint: disable=protected-access
+        LISTENER.stop()
@@ -339,17 +339,17 @@ class FramePathStep(Frame):
 
 
 class FrameMicrophone(Frame):
-    MEMBERS = ['length', 'microphone_data[64]']
+    MEMBERS = ['length', 'microphone_data']
     DESCRIPTION = ""
 
     def __init__(self):
         super(FrameMicrophone, self).__init__()
         self.type = FrameType.MICROPHONE
-        self.format = 'B h'
-        self.length = 3
+        self.format = 'B 128s'
+        self.length = 129
 
-    def set_data(self, length: int, microphone_data[64]: int):
-        self.data = struct.pack(self.format, length, microphone_data[64])
+    def set_data(self, length: int, microphone_data: bytes):
+        self.data = struct.pack(self.format, length, microphone_data)
 
 
 class FrameCommandLog(Frame):
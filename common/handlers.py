@@ -0,0 +1,186 @@
+#! python
+
+"""
+this module lets a module handle frames with decorated methods, instead of a hand written process().
+
+    class Module(BaseModule):
+        @on(FrameType.BUTTON_STATE, requests=True)
+        def answer(self, frame):
+            state = FrameButtonState()
+            state.set_data(self.button.read())
+            return state
+
+a handler is called with every frame of its frame types, requests when requests is True,
+other frames when it is False. a frame, or a list of frames, returned by a handler is sent.
+the module listens for the frame types of its handlers.
+
+a handler that blocks, on hardware for instance, can run on a pool so other frames are not held up:
+pool="thread" runs it on a thread pool, pool="process" on a process pool.
+a process pool handler gets no self, it is a staticmethod under the decorator.
+concurrency is the number of calls of a handler that can run at the same time.
+with ordered (the default) the frames of one frame type are handled one after the other,
+in the order they arrived, with ordered=False they are handled as soon as there is room.
+"""
+
+import inspect
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from common.common import Frame
+from common.frame_enum import FrameType
+
+THREAD = "thread"
+PROCESS = "process"
+
+_POOLS = {
+    THREAD: ThreadPoolExecutor,
+    PROCESS: ProcessPoolExecutor,
+}
+
+_LOGGER = logging.getLogger("python_build.handlers")
+
+
+def on(*frame_types: FrameType, requests: bool = False, pool: str = None,
+       concurrency: int = 1, ordered: bool = True):
+    """
+    Marks a method of a BaseModule as the handler of frames.
+
+    :param frame_types: the frame types to handle, FrameType.ALL for every type
+    :param requests: handle requests instead of the other frames
+    :param pool: None to handle frames in process(), THREAD or PROCESS to handle them on a pool
+    :param concurrency: the number of calls that run at the same time on the pool
+    :param ordered: handle the frames of a frame type one after the other
+    :return: the decorator
+    """
+    if pool is not None and pool not in _POOLS:
+        raise ValueError("unknown pool {}, use {}".format(pool, " or ".join(_POOLS)))
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    def decorator(method):
+        function = method.__func__ if isinstance(method, staticmethod) else method
+        if pool == PROCESS and not isinstance(method, staticmethod):
+            raise TypeError("{} runs in another process, make it a staticmethod".format(
+                function.__qualname__))
+        function.__dict__.setdefault("handles", []).append(
+            (frame_types, requests, pool, concurrency, ordered))
+        return method
+    return decorator
+
+
+class Handler:
+    """calls a handler function for frames, inline or on a pool"""
+
+    def __init__(self, function, pool: str, concurrency: int, ordered: bool, done):
+        """
+        :param function: the handler, bound to the module unless it runs in another process
+        :param pool: None, THREAD or PROCESS
+        :param concurrency:
+        :param ordered:
+        :param done: called with the result of every call, from any thread
+        """
+        self.function = function
+        self.pool = pool
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.done = done
+        self.executor = None
+        self.lock = threading.Lock()
+        self.busy = set()
+        """Frame types of which a frame is being handled, when ordered"""
+
+        self.waiting = defaultdict(deque)
+        """Frames per frame type that wait for the frame before them, when ordered"""
+
+        self.closed = False
+        """Set by shutdown, no frames are handed to the pool after it"""
+
+    def __call__(self, frame: Frame):
+        """handles a frame, or hands it to the pool"""
+        if self.pool is None:
+            self.done(self._call(frame))
+            return
+
+        if self.ordered:
+            with self.lock:
+                if frame.type in self.busy:
+                    self.waiting[frame.type].append(frame)
+                    return
+                self.busy.add(frame.type)
+        self._submit(frame)
+
+    def _call(self, frame: Frame):
+        """calls the handler, a failing handler is logged"""
+        try:
+            return self.function(frame)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("%s failed on %s", self.function.__qualname__, frame.type)
+            return None
+
+    def _submit(self, frame: Frame):
+        """runs the handler for the frame on the pool, unless the handler was shut down"""
+        function = self._call if self.pool == THREAD else self.function
+        with self.lock:
+            if self.closed:
+                return
+            if self.executor is None:
+                self.executor = _POOLS[self.pool](max_workers=self.concurrency)
+            future = self.executor.submit(function, frame)
+        # Outside the lock, the callback runs right away when the call already finished
+        future.add_done_callback(lambda future: self._finished(frame.type, future))
+
+    def _finished(self, frame_type: FrameType, future):
+        """hands the result on and starts the next frame of the type"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            _LOGGER.error("%s failed on %s: %r", self.function.__qualname__, frame_type, error)
+        else:
+            self.done(future.result())
+
+        if not self.ordered:
+            return
+        with self.lock:
+            if self.closed or not self.waiting[frame_type]:
+                self.busy.discard(frame_type)
+                return
+            frame = self.waiting[frame_type].popleft()
+        self._submit(frame)
+
+    def shutdown(self):
+        """waits for the running calls, frames that still wait are not handled"""
+        with self.lock:
+            self.closed = True
+            self.waiting.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+def find_handlers(module, done) -> dict:
+    """
+    Creates a Handler for every decorated method of the module.
+
+    :param module: a BaseModule
+    :param done: called with the result of every call
+    :return: dict of (FrameType, request) on a list of Handler
+    """
+    handlers = defaultdict(list)
+    seen = set()
+    for cls in type(module).__mro__:
+        for name, attribute in vars(cls).items():
+            # A method overridden in a subclass is only a handler when the override is
+            if name in seen:
+                continue
+            seen.add(name)
+            function = attribute.__func__ if isinstance(attribute, staticmethod) else attribute
+            if not inspect.isfunction(function) or "handles" not in vars(function):
+                continue
+            for frame_types, requests, pool, concurrency, ordered in function.handles:
+                bound = getattr(module, name)
+                handler = Handler(bound, pool, concurrency, ordered, done)
+                for frame_type in frame_types:
+                    handlers[(frame_type, requests)].append(handler)
+    return handlers
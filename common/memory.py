@@ -0,0 +1,199 @@
+#! python
+
+"""
+this module keeps track of the memory the frames in the queues of the bus hold.
+
+the manager accounts its rx queue, tx queue, the copies it distributes and the retained frames,
+a Comm accounts its received queue and the frames it keeps while the bus is unreachable.
+per queue and per FrameType the frames, the bytes and the high-water marks are kept.
+
+set the PYTHON_BUS_MEMORY_BUDGET environment variable to a number of megabytes
+to log a warning when the frames in the queues of a process hold more than that.
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import defaultdict
+
+from common.common import Frame
+
+MEMORY_BUDGET = os.environ.get("PYTHON_BUS_MEMORY_BUDGET")
+
+_LOGGER = logging.getLogger("python_build.memory")
+
+
+def _frame_overhead() -> int:
+    """the bytes an empty frame takes, the object, its attributes and empty data"""
+    frame = Frame()
+    frame.data = b""
+    return sys.getsizeof(frame) + sys.getsizeof(frame.__dict__) + sys.getsizeof(b"")
+
+
+FRAME_OVERHEAD = _frame_overhead()
+"""Estimate of the bytes a frame takes on top of its data"""
+
+
+def held_size(frame) -> int:
+    """estimates the bytes of memory a frame in a queue holds"""
+    return FRAME_OVERHEAD + (len(frame.data) if frame.data else 0)
+
+
+def default_budget():
+    """the budget in bytes from PYTHON_BUS_MEMORY_BUDGET, None when it is not set"""
+    return int(float(MEMORY_BUDGET) * 1024 * 1024) if MEMORY_BUDGET else None
+
+
+def process_memory(pid: int = None) -> dict:
+    """
+    The memory a process uses, read from /proc so only on Linux.
+    rss counts the pages the process shares with others, like a forked parent, in full,
+    pss (proportional set size) counts a shared page divided by the processes that share it,
+    so the pss of a set of processes adds up to the memory they use together.
+
+    :param pid: the process, this process by default
+    :return: dict with the rss and pss in bytes, None for what could not be read
+    """
+    pid = os.getpid() if pid is None else pid
+    usage = {"rss": None, "pss": None}
+    for key, path, field in (
+            ("rss", "status", "VmRSS:"),
+            ("pss", "smaps_rollup", "Pss:")):
+        try:
+            with open("/proc/{}/{}".format(pid, path)) as lines:
+                for line in lines:
+                    if line.startswith(field):
+                        usage[key] = int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return usage
+
+
+def _usage():
+    """the usage kept per queue and per FrameType"""
+    return {"frames": 0, "bytes": 0, "max_frames": 0, "max_bytes": 0}
+
+
+def _grow(usage: dict, frames: int, size: int):
+    """changes the usage and raises its high-water marks"""
+    usage["frames"] += frames
+    usage["bytes"] += size
+    usage["max_frames"] = max(usage["max_frames"], usage["frames"])
+    usage["max_bytes"] = max(usage["max_bytes"], usage["bytes"])
+
+
+class MemoryAccount:
+    """
+    The memory held by the frames in the queues of one process.
+    Queues are changed by one thread and read by another, so all access goes through a lock.
+    """
+
+    def __init__(self, name: str, budget: int = None):
+        """
+        :param name: the name of the process, used in the warning
+        :param budget: bytes the queues may hold before a warning is logged,
+            defaults to PYTHON_BUS_MEMORY_BUDGET
+        """
+        self.name = name
+        self.budget = default_budget() if budget is None else budget
+        self.lock = threading.Lock()
+        self.queues = defaultdict(_usage)
+        """Usage per queue name"""
+
+        self.types = defaultdict(lambda: defaultdict(_usage))
+        """Usage per queue name, per FrameType name"""
+
+        self.total = _usage()
+        self.over_budget = False
+
+    def add(self, queue: str, *frames):
+        """
+        Accounts frames put in a queue.
+
+        :param queue: the name of the queue
+        :param frames:
+        :return:
+        """
+        self._change(queue, frames, 1)
+
+    def remove(self, queue: str, *frames):
+        """
+        Accounts frames taken from a queue.
+
+        :param queue: the name of the queue
+        :param frames:
+        :return:
+        """
+        self._change(queue, frames, -1)
+
+    def set(self, queue: str, frames):
+        """
+        Accounts the frames a queue holds now, instead of what it held before.
+        For queues that are replaced or emptied at once.
+
+        :param queue: the name of the queue
+        :param frames: every frame in the queue
+        :return:
+        """
+        with self.lock:
+            for type_name, usage in self.types[queue].items():
+                self._apply(queue, type_name, -usage["frames"], -usage["bytes"])
+            for frame in frames:
+                self._apply(queue, frame.type.name, 1, held_size(frame))
+        self._check()
+
+    def _change(self, queue: str, frames, sign: int):
+        """adds (sign 1) or removes (sign -1) the frames from the queue"""
+        with self.lock:
+            for frame in frames:
+                self._apply(queue, frame.type.name, sign, sign * held_size(frame))
+        self._check()
+
+    def _apply(self, queue: str, type_name: str, frames: int, size: int):
+        """changes the usage of a queue, a type and the total, the lock must be held"""
+        _grow(self.types[queue][type_name], frames, size)
+        _grow(self.queues[queue], frames, size)
+        _grow(self.total, frames, size)
+
+    def _check(self):
+        """warns once when the total crosses the budget, again after it got back under"""
+        if self.budget is None:
+            return
+        held = self.total["bytes"]
+        if held > self.budget and not self.over_budget:
+            self.over_budget = True
+            _LOGGER.warning(
+                "%s: queues hold %.1f MB, budget is %.1f MB: %s", self.name,
+                held / 1024 / 1024, self.budget / 1024 / 1024, self._largest())
+        elif held <= self.budget and self.over_budget:
+            self.over_budget = False
+            _LOGGER.info("%s: queues are back under the memory budget", self.name)
+
+    def _largest(self) -> str:
+        """describes the queues that hold the most"""
+        with self.lock:
+            queues = sorted(self.queues.items(), key=lambda item: item[1]["bytes"], reverse=True)
+            return ", ".join(
+                "{} {} frames {} bytes".format(name, usage["frames"], usage["bytes"])
+                for name, usage in queues[:3])
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of the usage, made of plain types only,
+        so it can be sent to another process.
+
+        :return: dict
+        """
+        with self.lock:
+            return {
+                "budget": self.budget,
+                "total": dict(self.total),
+                "queues": {
+                    name: dict(usage, types={
+                        type_name: dict(type_usage)
+                        for type_name, type_usage in self.types[name].items()
+                        if type_usage["max_frames"]})
+                    for name, usage in self.queues.items()},
+            }
@@ -0,0 +1,167 @@
+#! python
+"""
+this module keeps the statistics of the python bus.
+
+the manager records every frame it distributes, a batch counts as the frames it carries,
+see manager/stats.py for a live view of the statistics.
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+
+from common import clock
+from common.batch import frame_count
+
+# Upper bounds in seconds of the dispatch latency histogram buckets,
+# the last bucket counts everything slower
+LATENCY_BUCKETS = [
+    0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005,
+    0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5,
+    1.0, 2.0, 5.0,
+]
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+def _counter():
+    """the counters kept per FrameType and per sender"""
+    return {"frames": 0, "bytes": 0, "dropped": 0}
+
+
+def frame_size(frame) -> int:
+    """the number of bytes of frame data a frame carries"""
+    return len(frame.data) if frame.data else 0
+
+
+class BusMetrics:
+    """
+    Counters and histograms of the traffic on the bus.
+    Recorded by the manager thread, read by the server threads
+    that answer stats requests, so all access goes through a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = clock.time()
+        self.types = defaultdict(_counter)
+        """Counters per FrameType name"""
+
+        self.senders = defaultdict(_counter)
+        """Counters per sender pid"""
+
+        self.dispatch_latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        """Histogram of the time between sending a frame and the manager distributing it,
+        the time until a receiving module takes it is not included"""
+
+        self.coalesced = 0
+        self.answered_from_store = 0
+        self.queues = {}
+        """The last depth and the maximum depth per queue name"""
+
+    def record(self, wrapper, now: float):
+        """
+        Records a frame that is distributed on the bus.
+
+        :param wrapper: the FrameWrapper of the frame
+        :param now: the time the frame is distributed
+        :return:
+        """
+        size = frame_size(wrapper.frame)
+        count = frame_count(wrapper.frame)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, now - wrapper.timestamp)
+        with self.lock:
+            for counter in (self.types[wrapper.frame.type.name], self.senders[wrapper.pid]):
+                counter["frames"] += count
+                counter["bytes"] += size
+            self.dispatch_latency[bucket] += 1
+
+    def record_drop(self, wrapper):
+        """
+        Records a frame that was pushed out of the full rx queue,
+        modules that did not read the queue in time miss it.
+
+        :param wrapper: the FrameWrapper of the frame
+        :return:
+        """
+        count = frame_count(wrapper.frame)
+        with self.lock:
+            self.types[wrapper.frame.type.name]["dropped"] += count
+            self.senders[wrapper.pid]["dropped"] += count
+
+    def record_coalesced(self):
+        """Records a request that was swallowed by request coalescing"""
+        with self.lock:
+            self.coalesced += 1
+
+    def record_answered_from_store(self):
+        """Records a request that was answered with a retained frame"""
+        with self.lock:
+            self.answered_from_store += 1
+
+    def record_queue(self, name: str, depth: int):
+        """
+        Records the current depth of a queue.
+
+        :param name: the name of the queue
+        :param depth: the number of frames in the queue
+        :return:
+        """
+        with self.lock:
+            _, maximum = self.queues.get(name, (0, 0))
+            self.queues[name] = (depth, max(depth, maximum))
+
+    def percentiles(self) -> dict:
+        """
+        Estimates the dispatch latency percentiles from the histogram.
+        A percentile is reported as the upper bound of the bucket it falls in,
+        None if it falls in the last bucket.
+
+        :return: dict of percentile on seconds
+        """
+        with self.lock:
+            histogram = list(self.dispatch_latency)
+        total = sum(histogram)
+        result = {}
+        for percentile in LATENCY_PERCENTILES:
+            if not total:
+                result[percentile] = None
+                continue
+            needed = total * percentile / 100
+            seen = 0
+            for bucket, count in enumerate(histogram):
+                seen += count
+                if seen >= needed:
+                    break
+            result[percentile] = (
+                LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else None)
+        return result
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of all statistics, made of plain types only,
+        so it can be sent to another process.
+        Counters are totals since the start of the manager,
+        rates are calculated by comparing two snapshots.
+
+        :return: dict
+        """
+        percentiles = self.percentiles()
+        with self.lock:
+            return {
+                "time": clock.time(),
+                "uptime": clock.time() - self.started,
+                "types": {name: dict(counter) for name, counter in self.types.items()},
+                "senders": {pid: dict(counter) for pid, counter in self.senders.items()},
+                "queues": {
+                    name: {"depth": depth, "max": maximum}
+                    for name, (depth, maximum) in self.queues.items()},
+                "coalesced": self.coalesced,
+                "answered_from_store": self.answered_from_store,
+                "dispatch_latency": {
+                    "buckets": list(LATENCY_BUCKETS),
+                    "histogram": list(self.dispatch_latency),
+                    "percentiles": percentiles,
+                },
+            }
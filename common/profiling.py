@@ -0,0 +1,249 @@
+#! python
+
+"""
+this module profiles the process() loop of a module.
+
+set the PYTHON_BUS_PROFILE environment variable to a budget in milliseconds to enable it.
+every call to process() is timed, together with the number of frames it took from the comm
+and the idle time since the previous call. calls that take longer than the budget are logged,
+and the rolling percentiles are logged every REPORT_INTERVAL seconds.
+
+send SIGUSR1 to a profiled module to run cProfile for PROFILE_SECONDS,
+every profiled module in the process starts with its next process() call.
+the run loop of a module wakes up when the time is up, see BaseModule.run,
+and the result is dumped to profile-<pid>-<time>.prof in the working directory.
+read it with `python -m pstats` or snakeviz.
+"""
+
+import cProfile
+import functools
+import logging
+import os
+import signal
+import threading
+import time
+import weakref
+from collections import deque
+
+from common.signals import handle_signal, register_signal_handler
+
+PROFILE_BUDGET = os.environ.get("PYTHON_BUS_PROFILE")
+
+# Number of process() calls the percentiles are calculated over
+ROLLING_WINDOW = 1000
+PERCENTILES = [50, 90, 99]
+REPORT_INTERVAL = 60.0
+PROFILE_SECONDS = 10.0
+
+_LOGGER = logging.getLogger("python_build.profiling")
+
+# The profilers of the modules in this process, SIGUSR1 requests a cProfile run from each of them
+_PROFILERS = weakref.WeakSet()
+_SIGNAL_REGISTERED = False
+_HANDLER_REGISTERED = False
+
+
+def enabled() -> bool:
+    """whether the process() loop of modules in this process is profiled"""
+    return bool(PROFILE_BUDGET)
+
+
+def percentiles(samples) -> dict:
+    """returns the PERCENTILES of the samples, None when there are none"""
+    ordered = sorted(samples)
+    return {
+        percentile: (
+            ordered[min(len(ordered) - 1, len(ordered) * percentile // 100)]
+            if ordered else None)
+        for percentile in PERCENTILES}
+
+
+class LoopProfiler:
+    """times every call of a process() function"""
+
+    def __init__(self, name: str, comm, budget: float, scheduler=None):
+        """
+        :param name: the name of the module, used in the log
+        :param comm: the comm of the module, the frames get_data and get_many return are counted
+        :param budget: seconds a process() call may take before it is logged
+        :param scheduler: the common.scheduler.Scheduler of the module, its tasks are reported too
+        """
+        self.name = name
+        self.budget = budget
+        self.scheduler = scheduler
+        self.durations = deque(maxlen=ROLLING_WINDOW)
+        self.idle = deque(maxlen=ROLLING_WINDOW)
+        self.drained = deque(maxlen=ROLLING_WINDOW)
+        self.frames = 0
+        self.last_end = None
+        self.last_report = time.monotonic()
+
+        self.profile_requested = False
+        self.profile = None
+        self.profile_until = 0
+
+        # BaseComm.get_many takes its frames with get_data, they are counted by get_many alone
+        self.in_get_many = False
+        get_data = comm.get_data
+
+        @functools.wraps(get_data)
+        def counted_get_data(*args, **kwargs):
+            frame = get_data(*args, **kwargs)
+            if not self.in_get_many:
+                self.frames += 1
+            return frame
+        comm.get_data = counted_get_data
+
+        get_many = getattr(comm, "get_many", None)
+        if get_many is not None:
+            @functools.wraps(get_many)
+            def counted_get_many(*args, **kwargs):
+                self.in_get_many = True
+                try:
+                    frames = get_many(*args, **kwargs)
+                finally:
+                    self.in_get_many = False
+                self.frames += len(frames)
+                return frames
+            comm.get_many = counted_get_many
+
+        _register(self)
+
+    def wrap(self, process):
+        """returns process, timed"""
+        @functools.wraps(process)
+        def profiled(*args, **kwargs):
+            start = time.monotonic()
+            if self.profile_requested:
+                self._start_profile(start)
+            if self.last_end is not None:
+                self.idle.append(start - self.last_end)
+            frames = self.frames
+            try:
+                return process(*args, **kwargs)
+            finally:
+                end = time.monotonic()
+                self._record(end - start, self.frames - frames)
+                self.last_end = end
+                self.check(end)
+                if end - self.last_report >= REPORT_INTERVAL:
+                    self.report()
+                    self.last_report = end
+        return profiled
+
+    def _record(self, duration: float, frames: int):
+        """records one process() call"""
+        self.durations.append(duration)
+        self.drained.append(frames)
+        if duration > self.budget:
+            _LOGGER.warning(
+                "%s: process() took %.1f ms, budget is %.1f ms, %d frames",
+                self.name, duration * 1000, self.budget * 1000, frames)
+
+    def percentiles(self) -> dict:
+        """returns the rolling percentiles of the duration, idle time and drained frames"""
+        return {
+            "duration": percentiles(self.durations),
+            "idle": percentiles(self.idle),
+            "frames": percentiles(self.drained),
+        }
+
+    def report(self):
+        """logs the rolling percentiles"""
+        stats = self.percentiles()
+        _LOGGER.info(
+            "%s: process() duration %s ms, idle %s ms, frames %s", self.name,
+            *[
+                "/".join(
+                    "-" if value is None else "{:.1f}".format(value * scale)
+                    for value in stats[key].values())
+                for key, scale in (("duration", 1000), ("idle", 1000), ("frames", 1))
+            ])
+        if self.scheduler is not None and self.scheduler.tasks:
+            _LOGGER.info("%s: %s", self.name, self.scheduler.report())
+
+    def time_to_stop(self):
+        """seconds until the running cProfile has to stop, None when it does not run"""
+        if self.profile is None:
+            return None
+        return max(0.0, self.profile_until - time.monotonic())
+
+    def check(self, now: float = None):
+        """
+        Stops cProfile once it ran PROFILE_SECONDS.
+        cProfile profiles the thread it was started in, so this is called from the loop of the module.
+
+        :param now: the current monotonic time
+        :return:
+        """
+        now = time.monotonic() if now is None else now
+        if self.profile is not None and now >= self.profile_until:
+            self._stop_profile()
+
+    def _start_profile(self, now: float):
+        """starts cProfile for PROFILE_SECONDS"""
+        self.profile_requested = False
+        if self.profile is not None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Only one profiler can run at a time since python 3.12
+            _LOGGER.warning("%s: not profiled, another profile is running", self.name)
+            return
+        _LOGGER.info("%s: profiling for %g s", self.name, PROFILE_SECONDS)
+        self.profile = profile
+        self.profile_until = now + PROFILE_SECONDS
+
+    def _stop_profile(self):
+        """stops cProfile and dumps the result"""
+        self.profile.disable()
+        path = "profile-{}-{}.prof".format(os.getpid(), int(time.time()))
+        self.profile.dump_stats(path)
+        self.profile = None
+        _LOGGER.info("%s: profile written to %s", self.name, path)
+
+
+def _register(profiler: LoopProfiler):
+    """
+    Adds a profiler to the ones SIGUSR1 is handed to.
+    The signal handler can only be installed from the main thread,
+    a profiler created in another thread leaves it to the next registration.
+
+    :param profiler:
+    :return:
+    """
+    global _SIGNAL_REGISTERED, _HANDLER_REGISTERED  # pylint: disable=global-statement
+    _PROFILERS.add(profiler)
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    if not _HANDLER_REGISTERED:
+        register_signal_handler(_handle_signal)
+        _HANDLER_REGISTERED = True
+    if not _SIGNAL_REGISTERED and threading.current_thread() is threading.main_thread():
+        handle_signal(signal.SIGUSR1)  #pylint: disable=no-member
+        _SIGNAL_REGISTERED = True
+
+
+def _handle_signal(signal_num, _stack_frame) -> bool:
+    """requests a cProfile run from every profiler on SIGUSR1, each starts with its next call"""
+    if signal_num != getattr(signal, "SIGUSR1", None):
+        return False
+    for profiler in list(_PROFILERS):
+        profiler.profile_requested = True
+    return True
+
+
+def profile_loop(module):
+    """
+    Replaces module.process with a profiled version.
+
+    :param module: a BaseModule
+    :return: the LoopProfiler
+    """
+    profiler = LoopProfiler(
+        type(module).__module__, module.comm, float(PROFILE_BUDGET) / 1000,
+        getattr(module, "_scheduler", None))
+    module.process = profiler.wrap(module.process)
+    return profiler
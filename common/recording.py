@@ -0,0 +1,109 @@
+#! python
+
+"""
+this module defines the binary log of recorded bus traffic.
+
+a log starts with MAGIC, followed by one record per frame:
+a RECORD_HEADER (timestamp, frame type, flags, data length) and the raw Frame.data.
+records are read through mmap, so a log does not have to fit in memory.
+"""
+
+import inspect
+import mmap
+import struct
+from collections import namedtuple
+
+from common import frames
+from common.common import Frame, Priority
+from common.frame_enum import FrameType
+
+MAGIC = b"R2D2BUS\x01"
+
+# timestamp (double), FrameType value, flags, length of the data
+RECORD_HEADER = struct.Struct("<dHBH")
+
+# Flags: the request bit, the priority in the bits above it
+_REQUEST_FLAG = 0x01
+_PRIORITY_SHIFT = 1
+
+Record = namedtuple("Record", ["timestamp", "type", "request", "priority", "data"])
+
+FRAME_CLASSES = {
+    cls().type: cls
+    for _, cls in inspect.getmembers(frames, inspect.isclass)
+    if issubclass(cls, Frame) and cls is not Frame
+}
+
+
+def encode_record(timestamp: float, frame: Frame) -> bytes:
+    """returns the frame as a record"""
+    data = frame.data or b""
+    flags = (
+        (_REQUEST_FLAG if frame.request else 0)
+        | frame.priority.value << _PRIORITY_SHIFT)
+    return RECORD_HEADER.pack(timestamp, frame.type.value, flags, len(data)) + data
+
+
+def to_frame(record: Record) -> Frame:
+    """recreates the frame of a record"""
+    frame_class = FRAME_CLASSES.get(record.type)
+    if frame_class is None:
+        frame = Frame()
+        frame.type = record.type
+    else:
+        frame = frame_class()
+    frame.data = record.data or None
+    frame.request = record.request
+    frame.priority = record.priority
+    return frame
+
+
+class RecordWriter:
+    """appends frames to a log"""
+    def __init__(self, path: str):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, timestamp: float, frame: Frame):
+        """
+        appends a frame to the log
+
+        :param timestamp: the time the frame was seen on the bus
+        :param frame:
+        :return:
+        """
+        self.file.write(encode_record(timestamp, frame))
+
+    def close(self):
+        """flushes and closes the log"""
+        self.file.close()
+
+
+def read_records(path: str):
+    """
+    yields every Record in the log at path, in the order they were recorded
+
+    :param path:
+    :return: generator of Record
+    """
+    with open(path, "rb") as log:
+        if not log.read(len(MAGIC)):
+            return
+        with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(MAGIC)] != MAGIC:
+                raise ValueError("{} is not a bus recording".format(path))
+            offset = len(MAGIC)
+            # A record that is cut off, by a recorder that was killed, is ignored
+            while offset + RECORD_HEADER.size <= len(view):
+                timestamp, type_value, flags, length = RECORD_HEADER.unpack_from(view, offset)
+                offset += RECORD_HEADER.size
+                if offset + length > len(view):
+                    return
+                yield Record(
+                    timestamp,
+                    FrameType(type_value),
+                    bool(flags & _REQUEST_FLAG),
+                    Priority(flags >> _PRIORITY_SHIFT),
+                    view[offset:offset + length])
+                offset += length
@@ -0,0 +1,209 @@
+#! python
+
+"""
+this module schedules the periodic work of a module, like polling a sensor or requesting data.
+
+    class Module(BaseModule):
+        @every(0.05)
+        def poll(self):
+            self.comm.request(FrameType.BUTTON_STATE)
+
+a task runs every period seconds on a fixed grid, that starts when the module first runs its tasks.
+the time a run takes does not push the next run back, so the cadence does not drift.
+the jitter of a run is the time between when it was due and when it started.
+a run that starts more than the deadline (the period by default) after it was due misses its deadline,
+runs that could not start at all before the next one was due are skipped and missed as well.
+the tasks of a module run from its run loop, see BaseModule.run.
+"""
+
+import heapq
+import inspect
+import itertools
+import logging
+from collections import deque
+
+from common import clock
+from common.profiling import ROLLING_WINDOW, percentiles
+
+_LOGGER = logging.getLogger("python_build.scheduler")
+
+
+def every(period: float, deadline: float = None):
+    """
+    Marks a method of a BaseModule as a task that runs every period seconds.
+
+    :param period: seconds between two runs
+    :param deadline: seconds a run may start late, the period by default
+    :return: the decorator
+    """
+    if period <= 0:
+        raise ValueError("period must be positive")
+
+    def decorator(method):
+        method.__dict__.setdefault("every", []).append((period, deadline))
+        return method
+    return decorator
+
+
+class Task:
+    """a function that runs every period seconds"""
+
+    def __init__(self, name: str, function, period: float, deadline: float = None):
+        """
+        :param name: the name of the task in the statistics
+        :param function: called without arguments
+        :param period: seconds between two runs
+        :param deadline: seconds a run may start late, the period by default
+        """
+        if period <= 0:
+            raise ValueError("period must be positive")
+        self.name = name
+        self.function = function
+        self.period = period
+        self.deadline = period if deadline is None else deadline
+        self.due = None
+        """The monotonic time of the next run, None until the scheduler started"""
+
+        self.cancelled = False
+        self.runs = 0
+        self.missed = 0
+        self.jitter = deque(maxlen=ROLLING_WINDOW)
+        """Seconds between when the last runs were due and when they started"""
+
+    def run(self, now: float):
+        """runs the task, it was due at self.due"""
+        lateness = now - self.due
+        self.jitter.append(lateness)
+        self.runs += 1
+        if lateness > self.deadline:
+            self.missed += 1
+            _LOGGER.warning(
+                "%s started %.1f ms late, deadline is %.1f ms",
+                self.name, lateness * 1000, self.deadline * 1000)
+        try:
+            self.function()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("%s failed", self.name)
+
+        self.due += self.period
+        end = clock.monotonic()
+        if self.due <= end:
+            # Runs of which the next one is already due are skipped
+            skipped = int((end - self.due) // self.period) + 1
+            self.due += skipped * self.period
+            self.missed += skipped
+
+    def snapshot(self) -> dict:
+        """the statistics of the task, the jitter percentiles in seconds"""
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "missed": self.missed,
+            "jitter": percentiles(self.jitter),
+        }
+
+
+class Scheduler:
+    """runs tasks in the order they are due, kept in a heap"""
+
+    def __init__(self):
+        self.tasks = []
+        self.heap = []
+        self.started = False
+        # Orders tasks that are due at the same time by when they were added
+        self._sequence = itertools.count()
+
+    def add(self, function, period: float, deadline: float = None, name: str = None) -> Task:
+        """
+        Adds a task, it first runs as soon as the scheduler runs its tasks.
+
+        :param function: called without arguments
+        :param period: seconds between two runs
+        :param deadline: seconds a run may start late, the period by default
+        :param name: the name of the task in the statistics, the name of the function by default
+        :return: the Task
+        """
+        task = Task(name or function.__name__, function, period, deadline)
+        self.tasks.append(task)
+        if self.started:
+            task.due = clock.monotonic()
+            self._push(task)
+        return task
+
+    def remove(self, task: Task):
+        """stops running a task"""
+        task.cancelled = True
+        self.tasks.remove(task)
+
+    def _push(self, task: Task):
+        heapq.heappush(self.heap, (task.due, next(self._sequence), task))
+
+    def start(self):
+        """starts the grid of every task now, run_due starts the scheduler when needed"""
+        if self.started:
+            return
+        self.started = True
+        now = clock.monotonic()
+        for task in self.tasks:
+            task.due = now
+            self._push(task)
+
+    def time_to_next(self):
+        """seconds until the next task is due, None without tasks"""
+        self.start()
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return self.heap[0][0] - clock.monotonic()
+
+    def run_due(self) -> int:
+        """
+        Runs every task that is due.
+
+        :return: the number of runs
+        """
+        self.start()
+        runs = 0
+        while self.heap and self.heap[0][0] <= clock.monotonic():
+            _, _, task = heapq.heappop(self.heap)
+            if task.cancelled:
+                continue
+            task.run(clock.monotonic())
+            runs += 1
+            if not task.cancelled:
+                self._push(task)
+        return runs
+
+    def snapshot(self) -> dict:
+        """the statistics per task name"""
+        return {task.name: task.snapshot() for task in self.tasks}
+
+    def report(self) -> str:
+        """the statistics as text, the jitter in milliseconds"""
+        return ", ".join(
+            "{} every {:g} ms: {} runs, {} missed, jitter {} ms".format(
+                name, stats["period"] * 1000, stats["runs"], stats["missed"],
+                "/".join(
+                    "-" if value is None else "{:.1f}".format(value * 1000)
+                    for value in stats["jitter"].values()))
+            for name, stats in self.snapshot().items())
+
+
+def find_tasks(module) -> list:
+    """
+    Returns the (bound method, period, deadline) of every @every method of the module.
+    A method overridden in a subclass is only a task when the override is.
+    """
+    tasks = []
+    seen = set()
+    for cls in type(module).__mro__:
+        for name, attribute in vars(cls).items():
+            if name in seen:
+                continue
+            seen.add(name)
+            if not inspect.isfunction(attribute) or "every" not in vars(attribute):
+                continue
+            for period, deadline in attribute.every:
+                tasks.append((getattr(module, name), period, deadline))
+    return tasks
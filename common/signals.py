@@ -1,17 +1,39 @@
 #! python
 
-"""this module handles all the signals"""
+"""
+this module handles all the signals.
+
+SIGINT, SIGTERM and SIGQUIT are routed through the registered handlers and callbacks,
+their handlers are installed when the first handler or callback is registered, not on import.
+"""
 
 import datetime
 import logging
 import signal
 import sys
+import threading
 
 __author__ = "Isha Geurtsen"
 __date__ = datetime.datetime(2019, 6, 3)
 
 _SIGNAL_HANDLERS = []
 _CALLBACKS = []
+_INSTALLED = False
+
+def _install():
+    """installs the handlers of the shutdown signals, once.
+    signal handlers can only be installed from the main thread,
+    when called from another thread the next registration tries again
+    """
+    global _INSTALLED  # pylint: disable=global-statement
+    if _INSTALLED or threading.current_thread() is not threading.main_thread():
+        return
+    _INSTALLED = True
+    signal.signal(signal.SIGINT, __handle_signal)
+    signal.signal(signal.SIGTERM, __handle_signal)
+
+    if sys.platform != "win32":
+        signal.signal(signal.SIGQUIT, __handle_signal)  #pylint: disable=no-member
 
 def register_signal_handler(handler):
     """register a function to be called on receiving a signal.
@@ -19,6 +41,7 @@ def register_signal_handler(handler):
 
     handler should be a function that takes a signal number and a stackframe
     """
+    _install()
     _SIGNAL_HANDLERS.append(handler)
 
 def register_signal_callback(callback):
@@ -26,8 +49,15 @@ def register_signal_callback(callback):
 
     callback should be a function that takes no parameters
     """
+    _install()
     _CALLBACKS.append(callback)
 
+def handle_signal(signal_num):
+    """route an additional signal through the registered signal handlers.
+    when no handler resolves it, it shuts the application down like SIGINT
+    """
+    signal.signal(signal_num, __handle_signal)
+
 def __handle_signal(signal_num, stack_frame):
     """internal method, called when a signal is received.
     when the signal remains unhandled, calls __stop"""
@@ -44,9 +74,3 @@ def __stop(signal_num):
     for callback in _CALLBACKS:
         callback()
     exit(signal_num)
-
-signal.signal(signal.SIGINT, __handle_signal)
-signal.signal(signal.SIGTERM, __handle_signal)
-
-if sys.platform != "win32":
-    signal.signal(signal.SIGQUIT, __handle_signal)  #pylint: disable=no-member
@@ -0,0 +1,135 @@
+#! python
+
+"""
+this module provides the subscriptions of comms: the frame types a module listens for,
+and per frame type how often it gets them.
+
+a module that does not need every frame of a type at the rate it is sent,
+like a display that shows the distance, limits its subscription:
+
+    comm.listen_for([FrameType.DISTANCE], max_rate={FrameType.DISTANCE: 5})
+    comm.listen_for([FrameType.MICROPHONE], decimate={FrameType.MICROPHONE: 10})
+
+with max_rate the module gets at most that many frames of the type per second. the latest wins:
+a frame that comes too soon after the last one is held back, a newer frame replaces it,
+and the held frame is delivered once the interval has passed, so the module always sees the latest value.
+with decimate N the module gets every Nth frame of the type, the first one included.
+both can be combined, the frames are decimated first.
+
+the manager applies the subscription of a Comm before frames cross the socket,
+see manager/manager.py, a ModuleHost and a LoopbackBus apply it when they deliver.
+"""
+
+from common.frame_enum import FrameType
+
+
+class _Limit:
+    """the limits on one frame type, and the state they need"""
+
+    def __init__(self, max_rate: float = None, decimate: int = None):
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be positive, got {}".format(max_rate))
+        if decimate is not None and decimate < 1:
+            raise ValueError("decimate must be at least 1, got {}".format(decimate))
+        self.interval = 1 / max_rate if max_rate else 0.0
+        self.decimate = decimate or 1
+        self.seen = 0
+        self.last = None
+        """The monotonic time a frame was last delivered"""
+
+        self.held = None
+        """The latest frame that came too soon, it is delivered once the interval has passed"""
+
+
+class Subscription:
+    """
+    The frame types a comm listens for, with the limits on how often it gets them.
+    Items are offered with their frame type, so the manager offers FrameWrappers and comms offer frames.
+    Not thread safe, a subscription is offered to by one thread.
+    """
+
+    def __init__(self, frame_types=(), max_rate: dict = None, decimate: dict = None):
+        """
+        :param frame_types: the frame types to receive, FrameType.ALL for all of them
+        :param max_rate: maps a frame type on the frames per second it is delivered at most
+        :param decimate: maps a frame type on N, to deliver every Nth frame of that type
+        """
+        self.frame_types = list(frame_types)
+        self.accepts_all = FrameType.ALL in self.frame_types
+        self._accepted = set(self.frame_types)
+        self.max_rate = dict(max_rate or {})
+        self.decimate = dict(decimate or {})
+
+        self.limits = {
+            frame_type: _Limit(self.max_rate.get(frame_type), self.decimate.get(frame_type))
+            for frame_type in set(self.max_rate) | set(self.decimate)
+        }
+        """The limits per frame type, types without limits are delivered as they come"""
+
+        self.dropped = 0
+        """The number of frames that were decimated or replaced by a newer one"""
+
+    def accepts(self, frame_type: FrameType) -> bool:
+        """whether frames of the type are delivered at all"""
+        return self.accepts_all or frame_type in self._accepted
+
+    def limited(self, frame_type: FrameType) -> bool:
+        """whether the delivery of the type is limited"""
+        return frame_type in self.limits
+
+    def offer(self, item, frame_type: FrameType, now: float) -> list:
+        """
+        Offers an item of an accepted frame type for delivery.
+
+        :param item: the frame or FrameWrapper
+        :param frame_type: the type of the frame
+        :param now: the current monotonic time
+        :return: the items to deliver now, the item itself or nothing
+        """
+        limit = self.limits.get(frame_type)
+        if limit is None:
+            return [item]
+
+        limit.seen += 1
+        if (limit.seen - 1) % limit.decimate:
+            self.dropped += 1
+            return []
+
+        if limit.last is not None and now - limit.last < limit.interval:
+            if limit.held is not None:
+                self.dropped += 1
+            limit.held = item
+            return []
+
+        if limit.held is not None:
+            self.dropped += 1
+            limit.held = None
+        limit.last = now
+        return [item]
+
+    def release(self, now: float) -> list:
+        """
+        The held frames whose interval has passed.
+
+        :param now: the current monotonic time
+        :return: the items to deliver now
+        """
+        released = []
+        for limit in self.limits.values():
+            if limit.held is not None and now - limit.last >= limit.interval:
+                released.append(limit.held)
+                limit.held = None
+                limit.last = now
+        return released
+
+    def time_to_next(self, now: float):
+        """
+        Seconds until the next held frame can be released.
+
+        :param now: the current monotonic time
+        :return: seconds, None when no frame is held
+        """
+        waits = [
+            max(0.0, limit.last + limit.interval - now)
+            for limit in self.limits.values() if limit.held is not None]
+        return min(waits) if waits else None
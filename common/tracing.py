@@ -0,0 +1,115 @@
+#! python
+
+"""
+this module traces frames on their way over the bus.
+
+set the PYTHON_BUS_TRACE environment variable to a directory to enable tracing.
+a traced frame is stamped when it is sent, when the manager puts it on its tx queue,
+when the manager dispatches it, when the receiving comm receives it and
+when the module takes it with get_data.
+the receiving process writes the hops to trace-<pid>.json in the directory,
+in the chrome trace event format. open it in chrome://tracing or https://ui.perfetto.dev
+
+the stamps use time.monotonic, which is shared by all processes on the same host.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+TRACE_DIRECTORY = os.environ.get("PYTHON_BUS_TRACE")
+
+# The hop names, in the order a frame passes them
+SEND = "send"
+ENQUEUE = "enqueue"
+DISPATCH = "dispatch"
+RECEIVE = "receive"
+GET_DATA = "get_data"
+
+
+def enabled() -> bool:
+    """whether this process traces the frames it sends and receives"""
+    return bool(TRACE_DIRECTORY)
+
+
+def start() -> list:
+    """returns a new trace, stamped with the send hop"""
+    return [(SEND, time.monotonic())]
+
+
+def stamp(trace: list, hop: str):
+    """stamps the trace with the hop, if the frame is traced"""
+    if trace is not None:
+        trace.append((hop, time.monotonic()))
+
+
+class TraceWriter:
+    """
+    Appends trace events to a file.
+    The file is a json array that is never closed, which the trace viewers accept,
+    so every event is on disk as soon as it is written and a crash loses nothing.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _open(self):
+        """opens the file and names the process in the trace"""
+        self.file = open(self.path, "w")
+        self.file.write("[\n")
+        self._write({
+            "name": "process_name", "ph": "M", "pid": os.getpid(),
+            "args": {"name": os.path.basename(sys.argv[0]) or "python"},
+        })
+
+    def _write(self, event: dict):
+        self.file.write(json.dumps(event, separators=(",", ":")) + ",\n")
+
+    def write(self, frame_type: str, sender: int, trace: list):
+        """
+        Writes a complete event for every hop of the trace.
+
+        :param frame_type: the name of the FrameType, used as thread in the viewer
+        :param sender: the pid of the sending process
+        :param trace: list of (hop, monotonic time) tuples
+        :return:
+        """
+        with self.lock:
+            if self.file is None:
+                self._open()
+            for (hop, begin), (next_hop, end) in zip(trace, trace[1:]):
+                self._write({
+                    "name": "{} -> {}".format(hop, next_hop),
+                    "ph": "X",
+                    "ts": begin * 1e6,
+                    "dur": (end - begin) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": frame_type,
+                    "args": {"sender": sender},
+                })
+            self.file.flush()
+
+
+_WRITER = None
+
+
+def finish(frame):
+    """
+    Stamps the get_data hop on a frame that was received traced
+    and writes its trace.
+
+    :param frame: the frame the module takes from its comm
+    :return:
+    """
+    global _WRITER  # pylint: disable=global-statement
+    traced = frame.__dict__.pop("trace", None)
+    if traced is None:
+        return
+    sender, trace = traced
+    stamp(trace, GET_DATA)
+    if _WRITER is None:
+        _WRITER = TraceWriter(os.path.join(TRACE_DIRECTORY, "trace-{}.json".format(os.getpid())))
+    _WRITER.write(frame.type.name, sender, trace)
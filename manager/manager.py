@@ -8,14 +8,19 @@ see client/comm.py for the interface
 import os
 import copy
 import threading
-import time
 import signal
 import logging
 from multiprocessing.managers import BaseManager
 from multiprocessing import Lock
 from common.signals import register_signal_callback
-from common.common import BUSCONFIG
-import common.config
+from common.common import bus_config, FrameWrapper
+from common.batch import FrameBatch
+from common.subscription import Subscription
+from common.frame_enum import FrameType
+from common.memory import MemoryAccount
+from common.metrics import BusMetrics
+from common import clock, tracing
+from common.config import configure_logging
 
 class QueueManager(BaseManager):
     """
@@ -25,7 +30,143 @@ class QueueManager(BaseManager):
     pass
 
 
+class TxQueue(list):
+    """
+    The queue modules put their frames in.
+    Stamps traced frames the moment they arrive at the manager.
+    """
+    def append(self, wrapper: FrameWrapper):
+        tracing.stamp(wrapper.trace, tracing.ENQUEUE)
+        super().append(wrapper)
+
+
+class RxQueue(list):
+    """
+    The queue of the frames the manager distributes.
+    Counts the frames that were ever appended, so a Subscriber knows which frames
+    are new to it after frames were dropped from the front, and wakes the
+    Subscribers that wait for new frames.
+    """
+    def __init__(self):
+        super().__init__()
+        self.condition = threading.Condition()
+        self.appended = 0
+
+    def append(self, wrapper: FrameWrapper):
+        with self.condition:
+            super().append(wrapper)
+            self.appended += 1
+            self.condition.notify_all()
+
+    def extend(self, wrappers):
+        with self.condition:
+            for wrapper in wrappers:
+                super().append(wrapper)
+                self.appended += 1
+            self.condition.notify_all()
+
+    def pop(self, index=-1) -> FrameWrapper:
+        with self.condition:
+            return super().pop(index)
+
+    def since(self, cursor: int):
+        """
+        The frames appended after cursor frames were appended, call it holding the condition.
+
+        :param cursor: the number of frames that were appended at the last call
+        :return: the frames that are still queued, the new cursor and the number of frames that were dropped
+        """
+        new = self.appended - cursor
+        frames = self[-new:] if new else []
+        return frames, self.appended, new - len(frames)
+
+
+class Subscriber:
+    """
+    Hands out the frames one Comm receives, through a proxy.
+    Only the new frames of other senders that its Subscription accepts and does not
+    hold back cross the socket, instead of the whole rx queue.
+    """
+    def __init__(self, rx_queue: RxQueue, pid: int):
+        self.rx_queue = rx_queue
+        self.pid = pid
+        self.subscription = Subscription()
+        with rx_queue.condition:
+            self.cursor = rx_queue.appended
+
+        self.missed = 0
+        """The number of frames that were dropped from the rx queue before they were received"""
+
+        self.last_seen = clock.monotonic()
+        """The monotonic time the comm last called the subscriber"""
+
+    def idle(self, now: float) -> float:
+        """seconds since the comm last called the subscriber"""
+        return now - self.last_seen
+
+    def update(self, frame_types: list, max_rate: dict = None, decimate: dict = None):
+        """
+        Replaces the subscription, see common/subscription.py.
+
+        :param frame_types: the frame types the comm listens for
+        :param max_rate: maps a frame type on the frames per second it is delivered at most
+        :param decimate: maps a frame type on N, to deliver every Nth frame of that type
+        :return:
+        """
+        self.last_seen = clock.monotonic()
+        self.subscription = Subscription(frame_types, max_rate, decimate)
+
+    def receive(self, timeout: float = 0) -> list:
+        """
+        The frames for the comm, waiting for them when there are none.
+
+        :param timeout: seconds to wait at most for new frames
+        :return: list of FrameWrapper, in the order they were distributed
+        """
+        subscription = self.subscription
+        with self.rx_queue.condition:
+            if self.rx_queue.appended == self.cursor and timeout:
+                held = subscription.time_to_next(clock.monotonic())
+                self.rx_queue.condition.wait(timeout if held is None else min(held, timeout))
+            frames, self.cursor, missed = self.rx_queue.since(self.cursor)
+            self.last_seen = clock.monotonic()
+        self.missed += missed
+
+        now = clock.monotonic()
+        received = []
+        for wrapper in frames:
+            frame = wrapper.frame
+            if wrapper.pid == self.pid or not subscription.accepts(frame.type):
+                continue
+            if not subscription.limited(frame.type):
+                received.append(wrapper)
+            elif isinstance(frame, FrameBatch):
+                # Limits count frames, not batches
+                for item in frame.frames():
+                    received += subscription.offer(
+                        FrameWrapper(item, wrapper.pid, wrapper.timestamp), frame.type, now)
+            else:
+                received += subscription.offer(wrapper, frame.type, now)
+        return received + subscription.release(now)
+
+
 PACKET_QUEUE_LENGTH = 64
+REQUEST_COALESCE_TIMEOUT = 0.5
+
+# Seconds after which the Subscriber of a comm that stopped calling it is dropped.
+# A comm calls it every RECEIVE_WAIT (see client/comm.py), a comm of a process that was killed
+# never releases its Subscriber, which would keep the frames it holds back forever
+SUBSCRIBER_TIMEOUT = 10.0
+
+# Frame types of which the manager keeps the last value,
+# mapped to the age in seconds after which a retained value is no longer
+# used to answer requests (None means it never goes stale)
+RETAINED_FRAME_TYPES = {
+    FrameType.BATTERY_LEVEL: 1.0,
+    FrameType.ACTIVITY_LED_STATE: None,
+    FrameType.MAP_INFO: None,
+    FrameType.END_EFFECTOR_TYPE: None,
+}
 _LOGGER = logging.getLogger("manager.manager")
 
 
@@ -35,14 +176,23 @@ class BusManager:
     Puts data on the bus and returns it from the bus.
     """
 
-    def __init__(self):
+    def __init__(self, request_timeout: float = REQUEST_COALESCE_TIMEOUT,
+                 retain: dict = None, subscriber_timeout: float = SUBSCRIBER_TIMEOUT):
         """
         Setup the manager
         Initializes the RX and TX queue
         Creates a place for the manager
         Creates a manager thread
+
+        :param request_timeout: seconds after which an unanswered request
+            no longer absorbs identical requests
+        :param retain: maps the frame types to retain on their maximum age,
+            defaults to RETAINED_FRAME_TYPES
+        :param subscriber_timeout: seconds after which the Subscriber of a comm
+            that stopped calling it is dropped
         :return:
         """
+        configure_logging()
 
         self.processing_lock = Lock()
         """ The lock on the queue, if locked no one can use the queue """
@@ -50,10 +200,10 @@ class BusManager:
         self.should_stop = False
         """Contains if the bus must be ended."""
 
-        self.rx_queue = []
+        self.rx_queue = RxQueue()
         """Receiving queue"""
 
-        self.tx_queue = []
+        self.tx_queue = TxQueue()
         """Transmitting queue"""
 
         self.manager = None
@@ -62,6 +212,40 @@ class BusManager:
         self.manager_thread = threading.Thread(target=self._manager)
         """The thread where the manager runs in."""
 
+        self.pending_requests = {}
+        """Maps a FrameType to the time its outstanding request was forwarded"""
+
+        self.request_timeout = request_timeout
+        """Seconds after which a pending request is considered unanswered"""
+
+        self.retain = RETAINED_FRAME_TYPES if retain is None else retain
+        """Maps the retained frame types on their maximum age"""
+
+        self.subscribers = []
+        """The Subscribers handed to the comms, see _expire_subscribers"""
+
+        self.subscriber_timeout = subscriber_timeout
+        """Seconds after which an idle Subscriber is dropped"""
+
+        self.retained = {}
+        """
+        Maps a FrameType on the last FrameWrapper sent with that type.
+        Replaced instead of modified, so a copy handed to a module
+        is never changed while it is being sent.
+        """
+
+        self.metrics = BusMetrics()
+        """Statistics of the traffic on the bus"""
+
+        self.memory = MemoryAccount("manager")
+        """The memory held by the frames in the queues, see common/memory.py"""
+
+        self.ready = threading.Event()
+        """Set once the manager thread accepts connections, or failed to"""
+
+        self.startup_error = None
+        """The error that prevented the manager thread from starting"""
+
         self.server = None
         self.pid = os.getpid()
 
@@ -77,12 +261,95 @@ class BusManager:
         QueueManager.register('rx_queue', callable=lambda: self.rx_queue)
         # Register the queue for sending frames to modules
         QueueManager.register('tx_queue', callable=lambda: self.tx_queue)
-        self.manager = QueueManager(
-            address=('', BUSCONFIG.ADDRESS.port), authkey=BUSCONFIG.AUTH_KEY)
-        self.server = self.manager.get_server()
+        # Register a subscriber per module, that hands out the frames it listens for
+        QueueManager.register('subscribe', callable=self._subscribe)
+        # Register the last values of the retained frame types
+        QueueManager.register('retained', callable=lambda: self.retained)
+        # Register the statistics of the bus, see manager/stats.py
+        QueueManager.register('stats', callable=self._stats)
+        config = bus_config()
+        try:
+            if config.SOCKET_PATH:
+                self._remove_socket()
+            self.manager = QueueManager(
+                address=config.listen_address(), authkey=config.AUTH_KEY)
+            # The server listens as soon as it is created,
+            # connections are accepted once it serves
+            self.server = self.manager.get_server()
+        except OSError as error:
+            self.startup_error = error
+            raise
+        finally:
+            self.ready.set()
 
         _LOGGER.info("Start serving!")
-        self.server.serve_forever()
+        try:
+            self.server.serve_forever()
+        except SystemExit:
+            # serve_forever ends with sys.exit, which only ends this thread
+            pass
+
+    def _subscribe(self, pid: int) -> Subscriber:
+        """
+        Creates the Subscriber of a Comm, its proxy lives as long as the Comm.
+
+        :param pid: the process of the comm, its own frames are not handed out
+        :return: Subscriber
+        """
+        subscriber = Subscriber(self.rx_queue, pid)
+        with self.processing_lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def _expire_subscribers(self):
+        """
+        Drops the Subscribers whose comm stopped calling them, the comm of a process
+        that was killed never releases its proxy. The server forgets the object too,
+        a comm that was only slow gets a RemoteError on its next call and reconnects.
+
+        :return:
+        """
+        now = clock.monotonic()
+        expired = [
+            subscriber for subscriber in self.subscribers
+            if subscriber.idle(now) > self.subscriber_timeout]
+        if not expired:
+            return
+        with self.processing_lock:
+            self.subscribers = [
+                subscriber for subscriber in self.subscribers if subscriber not in expired]
+        for subscriber in expired:
+            _LOGGER.info("dropping the subscriber of pid %d, idle for %.1f s",
+                         subscriber.pid, subscriber.idle(now))
+            self._forget_object(subscriber)
+
+    def _forget_object(self, obj):
+        """
+        Removes a shared object from the server, whatever its reference count.
+        id_to_obj, id_to_refcount and mutex are internals of
+        multiprocessing.managers.Server, checked against CPython 3.11.7,
+        tests/test_manager.py fails when a python version no longer has them.
+
+        :param obj:
+        :return:
+        """
+        if self.server is None:
+            return
+        ident = "%x" % id(obj)
+        with self.server.mutex:
+            self.server.id_to_refcount.pop(ident, None)
+            self.server.id_to_obj.pop(ident, None)
+
+    def _stats(self) -> dict:
+        """
+        The statistics of the bus and the memory its queues hold,
+        see manager/stats.py
+
+        :return: dict
+        """
+        stats = self.metrics.snapshot()
+        stats["memory"] = self.memory.snapshot()
+        return stats
 
     def _process_tx(self):
         """
@@ -96,16 +363,112 @@ class BusManager:
         # Get a lock (mutex) on the transmitting queue
         self.processing_lock.acquire()
 
-        to_send = copy.deepcopy(self.tx_queue)
+        self.metrics.record_queue("tx", len(self.tx_queue))
+        self.memory.set("tx", (wrapper.frame for wrapper in self.tx_queue))
+        to_send = copy.deepcopy(list(self.tx_queue))
         self.tx_queue.clear()
+        self.memory.set("tx", [])
+        self.memory.set("copies", (wrapper.frame for wrapper in to_send))
 
         self.processing_lock.release()
 
+        now = clock.time()
+        # Checked once per batch, so a disabled debug log costs nothing per frame
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
         for frame in to_send:
+            if self._answer_from_store(frame.frame, now):
+                if debug:
+                    _LOGGER.debug("answered request for %s from store", frame.frame.type)
+                self.metrics.record_answered_from_store()
+                continue
+
+            if self._coalesce(frame.frame, now):
+                if debug:
+                    _LOGGER.debug("coalesced request for %s", frame.frame.type)
+                self.metrics.record_coalesced()
+                continue
+
+            self._retain(frame)
+
             # Distribute frame internally
+            tracing.stamp(frame.trace, tracing.DISPATCH)
             self.rx_queue.append(frame)
+            self.metrics.record(frame, now)
+
+            if debug:
+                _LOGGER.debug("distributed %s", frame)
+
+        self.memory.set("copies", [])
 
-            _LOGGER.debug(frame)  # 'send'
+    def _retain(self, wrapper: FrameWrapper):
+        """
+        Stores the wrapper as the last value of its FrameType,
+        if that type is retained.
+
+        :param wrapper:
+        :return:
+        """
+        frame = wrapper.frame
+        if frame.request or frame.type not in self.retain:
+            return
+        if isinstance(frame, FrameBatch):
+            # The last frame of a batch is the last value
+            wrapper = FrameWrapper(frame.frames()[-1], wrapper.pid, wrapper.timestamp)
+
+        retained = dict(self.retained)
+        retained[frame.type] = wrapper
+        self.retained = retained
+        self.memory.set("retained", (wrapper.frame for wrapper in retained.values()))
+
+    def _answer_from_store(self, frame, now: float) -> bool:
+        """
+        Answers a request with the retained value of its FrameType.
+        The retained frame is put on the rx queue again with a new timestamp,
+        the request itself is not forwarded to the producers.
+
+        :param frame: the frame that is about to be distributed
+        :param now: the current time
+        :return: True if the request was answered
+        """
+        if not frame.request:
+            return False
+
+        wrapper = self.retained.get(frame.type)
+        if wrapper is None:
+            return False
+
+        max_age = self.retain[frame.type]
+        if max_age is not None and now - wrapper.timestamp > max_age:
+            return False
+
+        self.rx_queue.append(FrameWrapper(wrapper.frame, wrapper.pid, now))
+        return True
+
+    def _coalesce(self, frame, now: float) -> bool:
+        """
+        Request coalescing.
+        A request is swallowed when an identical request (same FrameType)
+        has already been forwarded and has not been answered yet.
+        The reply is put on the rx queue, which every module listening for
+        the FrameType reads, so it answers all coalesced requests at once.
+        This keeps the load on producers constant, no matter how many
+        modules ask for the same data.
+
+        :param frame: the frame that is about to be distributed
+        :param now: the current time
+        :return: True if the frame should not be distributed
+        """
+        if not frame.request:
+            # Any answer settles the outstanding request for this type
+            self.pending_requests.pop(frame.type, None)
+            return False
+
+        forwarded = self.pending_requests.get(frame.type)
+        if forwarded is not None and now - forwarded < self.request_timeout:
+            return True
+
+        self.pending_requests[frame.type] = now
+        return False
 
     def _process_rx(self):
         """
@@ -118,13 +481,15 @@ class BusManager:
         """
         self.processing_lock.acquire()
 
+        self.metrics.record_queue("rx", len(self.rx_queue))
         if len(self.rx_queue) <= PACKET_QUEUE_LENGTH:
             pass
             # TODO: socket
             #frame = ((self.pid, time()), FrameButtonState())
             # self.rx_queue.append(frame)
         else:
-            self.rx_queue.pop(0)
+            self.metrics.record_drop(self.rx_queue.pop(0))
+        self.memory.set("rx", (wrapper.frame for wrapper in self.rx_queue))
 
         self.processing_lock.release()
 
@@ -139,12 +504,14 @@ class BusManager:
         self.manager_thread.start()
 
         # Wait for the manager to start up...
-        time.sleep(0.5)
+        self.ready.wait()
+        if self.startup_error is not None:
+            raise self.startup_error
 
         _LOGGER.info("Starting consumer...")
 
-        pusher = QueueManager(
-            address=BUSCONFIG.ADDRESS.tuple(), authkey=BUSCONFIG.AUTH_KEY)
+        config = bus_config()
+        pusher = QueueManager(address=config.address(), authkey=config.AUTH_KEY)
         pusher.connect()
 
         _LOGGER.info("Init done, working...")
@@ -155,13 +522,28 @@ class BusManager:
         while not self.should_stop:
             self._process_tx()
             self._process_rx()
-            time.sleep(0.01)
+            self._expire_subscribers()
+            clock.sleep(0.01)
 
     def __exit__(self, *args):
         self.should_stop = True
         self.server.stop_event.set()
         self.manager_thread.join()
 
+    @staticmethod
+    def _remove_socket():
+        """
+        Removes the unix domain socket file of the bus.
+        A socket file left behind by a manager that was killed
+        would otherwise prevent the manager from starting.
+
+        :return:
+        """
+        try:
+            os.unlink(bus_config().SOCKET_PATH)
+        except FileNotFoundError:
+            pass
+
     def stop(self):
         """
         Stops the manager thread
@@ -0,0 +1,123 @@
+#! python
+"""
+this program shows live statistics of a running python bus.
+
+usage: python manager/stats.py [--interval 1] [--once]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing.managers import BaseManager
+
+from common.common import bus_config
+
+
+class StatsManager(BaseManager):
+    """client of the manager that only reads the statistics"""
+
+
+StatsManager.register('stats')
+
+
+def connect():
+    """connects to the running manager"""
+    config = bus_config()
+    manager = StatsManager(address=config.address(), authkey=config.AUTH_KEY)
+    manager.connect()
+    return manager
+
+
+def fetch(manager) -> dict:
+    """returns a snapshot of the statistics of the bus, see common/metrics.py"""
+    return manager.stats()._getvalue()
+
+
+def rates(previous: dict, current: dict, key: str) -> list:
+    """
+    calculates the frames/s and bytes/s of every entry of
+    current[key] since the previous snapshot
+
+    :return: list of (name, frames/s, bytes/s, counter) tuples, busiest first
+    """
+    elapsed = max(current["time"] - previous["time"], 1e-9)
+    result = []
+    for name, counter in current[key].items():
+        before = previous[key].get(name, {"frames": 0, "bytes": 0})
+        result.append((
+            name,
+            (counter["frames"] - before["frames"]) / elapsed,
+            (counter["bytes"] - before["bytes"]) / elapsed,
+            counter,
+        ))
+    return sorted(result, key=lambda row: row[1], reverse=True)
+
+
+def _milliseconds(seconds):
+    """formats a latency percentile"""
+    return "   n/a" if seconds is None else "{:6.1f}".format(seconds * 1000)
+
+
+def render(previous: dict, current: dict, lines: int) -> str:
+    """renders a top like view of two consecutive snapshots"""
+    output = []
+    queues = "  ".join(
+        "{} {depth} (max {max})".format(name, **queue)
+        for name, queue in sorted(current["queues"].items()))
+    percentiles = "  ".join(
+        "p{} {} ms".format(percentile, _milliseconds(value))
+        for percentile, value in current["dispatch_latency"]["percentiles"].items())
+    output.append("python bus - up {:.0f} s".format(current["uptime"]))
+    output.append("queues: " + queues)
+    output.append("dispatch latency: " + percentiles)
+    output.append("coalesced requests: {}  answered from store: {}".format(
+        current["coalesced"], current["answered_from_store"]))
+    memory = current["memory"]
+    budget = "" if memory["budget"] is None else ", budget {:.1f} kB".format(
+        memory["budget"] / 1024)
+    held = "  ".join(
+        "{} {:.1f} kB".format(name, queue["bytes"] / 1024)
+        for name, queue in sorted(memory["queues"].items()))
+    output.append("memory: {:.1f} kB (max {:.1f} kB{})  {}".format(
+        memory["total"]["bytes"] / 1024, memory["total"]["max_bytes"] / 1024, budget, held))
+
+    for title, key in (("FRAME TYPE", "types"), ("SENDER PID", "senders")):
+        output.append("")
+        output.append("{:<34} {:>9} {:>10} {:>10} {:>8}".format(
+            title, "FRAMES/S", "BYTES/S", "FRAMES", "DROPPED"))
+        for name, frames, size, counter in rates(previous, current, key)[:lines]:
+            output.append("{:<34} {:>9.1f} {:>10.1f} {:>10} {:>8}".format(
+                str(name), frames, size, counter["frames"], counter["dropped"]))
+    return "\n".join(output)
+
+
+def main():
+    """shows the statistics until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between updates")
+    parser.add_argument("--lines", type=int, default=10, help="rows per table")
+    parser.add_argument("--once", action="store_true", help="print one snapshot as json")
+    args = parser.parse_args()
+
+    manager = connect()
+    if args.once:
+        json.dump(fetch(manager), sys.stdout, indent=2)
+        return
+
+    previous = fetch(manager)
+    clear = "cls" if sys.platform == "win32" else "clear"
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = fetch(manager)
+            os.system(clear)
+            print(render(previous, current, args.lines))
+            previous = current
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
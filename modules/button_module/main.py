@@ -1,6 +1,5 @@
 """this file executes the button_module program"""
 
-from time import sleep
 from sys import platform
 from random import randint
 
@@ -24,6 +23,16 @@ class TestButton:
         return randint(0, 1) == 1
 
 
+def create_module(comm):
+    """
+    Creates the module with a TestButton,
+    used to run it in a module host, see client/host.py
+
+    :return:
+    """
+    return Module(comm, TestButton())
+
+
 def main():
     """
     Main function that starts the module
@@ -37,9 +46,7 @@ def main():
     register_signal_callback(module.stop)
 
     with module:
-        while not module.stopped:
-            module.process()
-            sleep(0.05)
+        module.run()
 
 
 if __name__ == "__main__":
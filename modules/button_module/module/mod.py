@@ -4,21 +4,17 @@ from client.comm import BaseComm
 from common.frame_enum import FrameType
 from common.frames import FrameButtonState
 from common.base_module import BaseModule
+from common.handlers import on
 
 class Module(BaseModule):
     """this Module listens for button requests and responds with the state of the button"""
     def __init__(self, comm: BaseComm, button):
-        super(Module, self).__init__(comm)
-        self.comm.listen_for([FrameType.BUTTON_STATE])
         self.button = button
+        super(Module, self).__init__(comm)
 
-    def process(self):
-        while self.comm.has_data():
-            frame = self.comm.get_data()
-
-            if not frame.request:
-                continue
-
-            frame = FrameButtonState()
-            frame["pressed"] = self.button.read()
-            self.comm.send(frame)
+    @on(FrameType.BUTTON_STATE, requests=True)
+    def answer(self, _request):
+        """answers a request with the state of the button"""
+        frame = FrameButtonState()
+        frame["pressed"] = self.button.read()
+        return frame
@@ -1,5 +1,4 @@
 """this file executes the controller_module"""
-from time import sleep
 from sys import platform
 
 from common.signals import register_signal_callback
@@ -13,9 +12,7 @@ def main():
     print("Module created...")
     register_signal_callback(module.stop)
     with module:
-        while not module.stopped:
-            module.process()
-            sleep(0.05)
+        module.run()
 
 
 
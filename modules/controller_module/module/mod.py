@@ -4,35 +4,40 @@ from client.comm import BaseComm
 from common.frame_enum import FrameType
 from common.frames import FrameActivityLedState
 from common.base_module import BaseModule
+from common.handlers import on
+
+# Seconds between two button state requests
+REQUEST_PERIOD = 0.05
+# Seconds after which an unchanged led state is sent anyway
+KEEP_ALIVE = 1.0
 
 class Module(BaseModule):
     "this module requests a button state and forwards the result as a ActivityLedState"
-    def __init__(self, comm: BaseComm):
+    def __init__(self, comm: BaseComm, period: float = REQUEST_PERIOD,
+                 keep_alive: float = KEEP_ALIVE):
         super(Module, self).__init__(comm)
-        self.comm.listen_for([FrameType.BUTTON_STATE])
+        self.keep_alive = keep_alive
+        self.schedule(self.request_state, period)
 
-    def process(self):
-        # Request the button state from the button module
+    def request_state(self):
+        """requests the button state from the button module"""
         self.comm.request(FrameType.BUTTON_STATE)
 
-        while self.comm.has_data():
-            # Get the frame from the comm module
-            frame = self.comm.get_data()
-
-            # Extract the data out of the frame,
-            # the result will be a tuple
-            data = frame.get_data()
-
-            # We only process answers
-            if frame.request:
-                continue
+    # We only process answers, requests=False is the default
+    @on(FrameType.BUTTON_STATE)
+    def forward(self, frame):
+        """forwards the button state to the led module"""
+        # Extract the data out of the frame,
+        # the result will be a tuple
+        data = frame.get_data()
 
-            # Create the frame that will be send
-            # to the led module
-            state = FrameActivityLedState()
+        # Create the frame that will be send
+        # to the led module
+        state = FrameActivityLedState()
 
-            # Set the data.
-            state.set_data(data[0])
+        # Set the data.
+        state.set_data(data[0])
 
-            # Send it off!
-            self.comm.send(state)
+        # Send it off, but only when the led has to change,
+        # or when the last state was sent keep_alive seconds ago
+        self.comm.send(state, on_change=True, keep_alive=self.keep_alive)
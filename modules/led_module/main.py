@@ -1,5 +1,3 @@
-from time import sleep
-
 from common.signals import register_signal_callback
 from client.comm import Comm
 from modules.led_module.module.mod import Module
@@ -12,9 +10,7 @@ def main():
 
     with module:
         register_signal_callback(module.stop)
-        while not module.stopped:
-            module.process()
-            sleep(0.05)
+        module.run()
 
 
 
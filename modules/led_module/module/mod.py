@@ -2,6 +2,7 @@
 from client.comm import BaseComm
 from common.frame_enum import FrameType
 from common.base_module import BaseModule
+from common.handlers import on
 
 class Module(BaseModule):
     """
@@ -10,16 +11,11 @@ class Module(BaseModule):
     """
     def __init__(self, comm: BaseComm):
         super(Module, self).__init__(comm)
-        self.comm.listen_for([FrameType.ACTIVITY_LED_STATE])
 
-    def process(self):
-        while self.comm.has_data():
-            frame = self.comm.get_data()
-
-            if frame.request:
-                continue
-
-            if frame["state"]:
-                print("The LED is ON")
-            else:
-                print("The LED is OFF")
+    @on(FrameType.ACTIVITY_LED_STATE)
+    def show(self, frame):
+        """prints the state of the led"""
+        if frame["state"]:
+            print("The LED is ON")
+        else:
+            print("The LED is OFF")
@@ -0,0 +1,30 @@
+"""this file executes the recorder_module program
+
+usage: python modules/recorder_module/main.py <recording>
+"""
+
+import sys
+
+from common.signals import register_signal_callback
+from client.comm import Comm
+from modules.recorder_module.module.mod import Module
+
+
+def main():
+    """
+    Main function that starts the module
+
+    :return:
+    """
+    print("Starting application...\n")
+    module = Module(Comm(), sys.argv[1])
+    print("Module created...")
+
+    register_signal_callback(module.stop)
+
+    with module:
+        module.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""this file defines the module class for recorder_module"""
+
+from client.comm import BaseComm
+from common.frame_enum import FrameType
+from common.base_module import BaseModule
+from common import clock
+from common.recording import RecordWriter
+
+class Module(BaseModule):
+    """this Module appends every frame on the bus to a recording, see common/recording.py"""
+    def __init__(self, comm: BaseComm, path: str):
+        super(Module, self).__init__(comm)
+        self.comm.listen_for([FrameType.ALL])
+        self.writer = RecordWriter(path)
+
+    def process(self):
+        while self.comm.has_data():
+            self.writer.write(clock.time(), self.comm.get_data())
+
+    def __exit__(self, *args):
+        super(Module, self).__exit__(*args)
+        # Record what was received before the comm stopped
+        self.process()
+        self.writer.close()
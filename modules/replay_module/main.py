@@ -0,0 +1,34 @@
+"""this file executes the replay_module program
+
+usage: python modules/replay_module/main.py <recording> [speed]
+a speed of 1 replays at the original pace, 10 ten times as fast, 0 as fast as possible
+"""
+
+import sys
+
+from common.signals import register_signal_callback
+from client.comm import Comm
+from modules.replay_module.module.mod import Module
+
+
+def main():
+    """
+    Main function that starts the module
+
+    :return:
+    """
+    print("Starting application...\n")
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    module = Module(Comm(), sys.argv[1], speed)
+    print("Module created...")
+
+    register_signal_callback(module.stop)
+
+    with module:
+        module.run()
+
+    print("Replayed {} frames".format(module.sent))
+
+
+if __name__ == "__main__":
+    main()
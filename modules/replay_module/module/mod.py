@@ -0,0 +1,47 @@
+"""this file defines the module class for replay_module"""
+
+from client.comm import BaseComm
+from common.base_module import BaseModule
+from common import clock
+from common.recording import read_records, to_frame
+
+class Module(BaseModule):
+    """
+    this Module puts the frames of a recording back on the bus, in the original order.
+    the module stops when every frame has been sent.
+    """
+    def __init__(self, comm: BaseComm, path: str, speed: float = 1.0):
+        """
+        :param path: the recording, see common/recording.py
+        :param speed: 1 replays at the original pace, 2 twice as fast, 0 as fast as possible
+        """
+        super(Module, self).__init__(comm)
+        self.records = read_records(path)
+        self.speed = speed
+        self.sent = 0
+        self.next_record = next(self.records, None)
+        self.first_timestamp = self.next_record.timestamp if self.next_record else 0
+        self.start = None
+
+    def time_to_next(self) -> float:
+        """seconds until the next frame is due"""
+        if self.next_record is None or not self.speed or self.start is None:
+            return 0
+        due = self.start + (self.next_record.timestamp - self.first_timestamp) / self.speed
+        return max(0, due - clock.monotonic())
+
+    def process(self):
+        if self.start is None:
+            self.start = clock.monotonic()
+
+        while self.next_record is not None and self.time_to_next() <= 0:
+            record = self.next_record
+            if record.request:
+                self.comm.request(record.type, record.priority)
+            else:
+                self.comm.send(to_frame(record), record.priority)
+            self.sent += 1
+            self.next_record = next(self.records, None)
+
+        if self.next_record is None:
+            self.stop()
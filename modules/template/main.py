@@ -1,6 +1,4 @@
 "this module is a template"
-import time
-
 from common.signals import register_signal_callback
 from client.comm import Comm
 from modules.template.module.mod import Module
@@ -13,9 +11,7 @@ def main():
     register_signal_callback(module.stop)
     print("Module created...")
     with module:
-        while not module.stopped:
-            module.process()
-            time.sleep(0.05)
+        module.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,85 @@
+#! python
+
+"""this module tests the run loop of common/base_module.py"""
+
+import pytest
+
+from client.loopback import LoopbackBus
+from common import clock, recording
+from common.base_module import BaseModule
+from common.frame_enum import FrameType
+from common.frames import FrameDistance
+from modules.replay_module.module.mod import Module as ReplayModule
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+class Ticker(BaseModule):
+    """module that stops after three ticks"""
+    def __init__(self, comm):
+        super().__init__(comm)
+        self.ticks = []
+        self.processed = 0
+
+    def tick(self):
+        self.ticks.append(clock.monotonic())
+        if len(self.ticks) == 3:
+            self.stop()
+
+    def process(self):
+        self.processed += 1
+
+
+class FirstFrame(BaseModule):
+    """module that stops when it receives a frame"""
+    def __init__(self, comm):
+        super().__init__(comm)
+        self.comm.listen_for([FrameType.DISTANCE])
+
+    def process(self):
+        if self.comm.has_data():
+            self.comm.get_data()
+            self.stop()
+
+
+def test_run_ticks(virtual_clock):
+    """this test asserts that run calls tick every tick seconds, and process after it"""
+    module = Ticker(LoopbackBus().connect())
+    module.run(tick=0.5)
+    assert module.ticks == [0.0, 0.5, 1.0]
+    assert module.processed == 2
+
+
+def test_run_processes_frames_without_waiting(virtual_clock):
+    """this test asserts that run does not wait when frames are available"""
+    bus = LoopbackBus()
+    module = FirstFrame(bus.connect())
+    bus.connect().send(FrameDistance())
+    module.run()
+    assert clock.monotonic() == 0.0
+
+
+def test_run_waits_for_time_to_next(virtual_clock, tmp_path):
+    """this test asserts that run calls process when time_to_next has passed"""
+    path = tmp_path / "replay.rec"
+    writer = recording.RecordWriter(str(path))
+    for timestamp in (10.0, 12.0, 15.0):
+        writer.write(timestamp, FrameDistance())
+    writer.close()
+
+    bus = LoopbackBus()
+    listener = bus.connect()
+    listener.listen_for([FrameType.DISTANCE])
+    module = ReplayModule(bus.connect(), str(path))
+    module.run()
+
+    assert module.sent == 3
+    assert len(listener.received) == 3
+    assert clock.monotonic() == 5.0
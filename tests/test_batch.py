@@ -0,0 +1,115 @@
+#! python
+
+"""this module tests the batching of DATA_STREAM frames of common/batch.py"""
+
+import pickle
+
+import pytest
+
+from common import clock
+from common.batch import Batcher, FrameBatch, frame_count, unpack
+from common.common import FrameWrapper, Priority
+from common.frame_enum import FrameType
+from common.frames import FrameDistance, FrameMicrophone
+from common.metrics import BusMetrics
+from manager.manager import BusManager
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+def distance(mm):
+    """a FrameDistance with the given distance"""
+    frame = FrameDistance()
+    frame.set_data(mm)
+    frame.priority = Priority.DATA_STREAM
+    return frame
+
+
+def test_batch_is_iterated_without_copying():
+    """this test asserts that the views and values of a batch are those of its frames"""
+    batch = FrameBatch([distance(mm) for mm in (10, 20, 30)])
+    assert batch.type == FrameType.DISTANCE
+    assert batch.count == 3
+    assert list(batch.values()) == [(10,), (20,), (30,)]
+    views = list(batch.views())
+    assert all(isinstance(view, memoryview) and view.obj is batch.data for view in views)
+    assert [bytes(view) for view in views] == [distance(mm).data for mm in (10, 20, 30)]
+    assert batch["mm"] == 30
+
+
+def test_batch_survives_pickling():
+    """this test asserts that a batch is unpacked into the frames that were sent, after crossing the bus"""
+    batch = pickle.loads(pickle.dumps(FrameBatch([distance(mm) for mm in (1, 2)])))
+    frames = unpack(batch)
+    assert [type(frame) for frame in frames] == [FrameDistance, FrameDistance]
+    assert [frame["mm"] for frame in frames] == [1, 2]
+    assert all(frame.priority is Priority.DATA_STREAM for frame in frames)
+    assert unpack(frames[0]) == [frames[0]]
+
+
+def test_batcher_sends_full_batches():
+    """this test asserts that a batch is sent as soon as the next frame would not fit"""
+    batcher = Batcher(max_bytes=8)
+    ready = [batch for mm in range(10) for batch in batcher.add(distance(mm))]
+    assert [batch.count for batch in ready] == [4, 4]
+    assert [frame["mm"] for frame in batcher.pending] == [8, 9]
+    assert [frame["mm"] for frame in batcher.flush()[0].frames()] == [8, 9]
+    assert (batcher.batches, batcher.batched) == (3, 10)
+
+
+def test_batcher_keeps_the_data_that_was_sent():
+    """this test asserts that a frame that is sent again with new data does not change the pending batch"""
+    batcher = Batcher()
+    frame = distance(1)
+    batcher.add(frame)
+    frame.set_data(2)
+    batcher.add(frame)
+    assert list(batcher.flush()[0].values()) == [(1,), (2,)]
+
+
+def test_batcher_keeps_frames_in_order():
+    """this test asserts that a frame of another type ends the pending batch"""
+    batcher = Batcher()
+    microphone = FrameMicrophone()
+    microphone.set_data(1, b"")
+    ready = batcher.add(distance(1)) + batcher.add(distance(2)) + batcher.add(microphone)
+    assert [frame_count(frame) for frame in ready] == [2]
+    assert [frame.type for frame in batcher.pending] == [FrameType.MICROPHONE]
+    # A single frame is sent by itself
+    assert [frame.data for frame in batcher.flush()] == [microphone.data]
+    assert batcher.flush() == []
+
+
+def test_batcher_is_due_after_the_delay(virtual_clock):
+    """this test asserts that the pending batch is due once its first frame waited the maximum delay"""
+    batcher = Batcher(max_delay=0.125)
+    assert not batcher.due()
+    batcher.add(distance(1))
+    virtual_clock.advance(0.0625)
+    batcher.add(distance(2))
+    assert not batcher.due()
+    virtual_clock.advance(0.0625)
+    assert batcher.due()
+
+
+def test_metrics_count_the_frames_of_a_batch():
+    """this test asserts that the statistics count the frames a batch carries"""
+    manager = BusManager(retain={FrameType.DISTANCE: None})
+    batch = FrameBatch([distance(mm) for mm in (1, 2, 3)])
+    manager.tx_queue.append(FrameWrapper(batch, 1, 0))
+    manager._process_tx()  #pylint: disable=protected-access
+    counter = manager.metrics.snapshot()["types"]["DISTANCE"]
+    assert (counter["frames"], counter["bytes"]) == (3, 6)
+    # Only the last frame is retained
+    assert manager.retained[FrameType.DISTANCE].frame["mm"] == 3
+
+    metrics = BusMetrics()
+    metrics.record_drop(FrameWrapper(batch, 1, 0))
+    assert metrics.snapshot()["types"]["DISTANCE"]["dropped"] == 3
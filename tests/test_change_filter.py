@@ -0,0 +1,60 @@
+#! python
+
+"""this module tests the change detection of send(frame, on_change=True), see client/change_filter.py"""
+
+import pytest
+
+from client.loopback import LoopbackBus
+from common import clock
+from common.frame_enum import FrameType
+from common.frames import FrameActivityLedState, FrameButtonState
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+def make_led(state):
+    """returns a led state frame"""
+    frame = FrameActivityLedState()
+    frame.set_data(state)
+    return frame
+
+
+def test_unchanged_frames_are_suppressed(virtual_clock):
+    """this test asserts that only frames with new data are sent, per frame type"""
+    bus = LoopbackBus()
+    sender, listener = bus.connect(), bus.connect()
+    listener.listen_for([FrameType.ALL])
+
+    sent = [sender.send(make_led(state), on_change=True) for state in (True, True, False, False, True)]
+    assert sent == [True, False, True, False, True]
+    # Another frame type is compared with its own last value
+    button = FrameButtonState()
+    button.set_data(True)
+    assert sender.send(button, on_change=True)
+
+    assert [frame.type for frame in listener.get_many()] == [FrameType.ACTIVITY_LED_STATE] * 3 + [
+        FrameType.BUTTON_STATE]
+    assert sender.changes.suppressed == {FrameType.ACTIVITY_LED_STATE: 2}
+
+
+def test_keep_alive_sends_unchanged_frames(virtual_clock):
+    """this test asserts that an unchanged frame is sent again after keep_alive seconds"""
+    sender = LoopbackBus().connect()
+
+    assert sender.send(make_led(True), on_change=True, keep_alive=1.0)
+    virtual_clock.advance(0.5)
+    assert not sender.send(make_led(True), on_change=True, keep_alive=1.0)
+    virtual_clock.advance(0.5)
+    assert sender.send(make_led(True), on_change=True, keep_alive=1.0)
+    assert not sender.send(make_led(True), on_change=True, keep_alive=1.0)
+    # A frame sent without on_change is always sent, and is the new last value
+    assert sender.send(make_led(True))
+    virtual_clock.advance(0.9)
+    assert not sender.send(make_led(True), on_change=True, keep_alive=1.0)
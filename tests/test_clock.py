@@ -0,0 +1,75 @@
+#! python
+
+"""this module tests the clocks of common/clock.py"""
+
+import time
+
+import pytest
+
+from client.loopback import LoopbackBus
+from common import clock, recording
+from common.frame_enum import FrameType
+from common.frames import FrameDistance
+from modules.button_module.module.mod import Module as ButtonModule
+from modules.controller_module.module.mod import KEEP_ALIVE, REQUEST_PERIOD
+from modules.controller_module.module.mod import Module as ControllerModule
+from modules.led_module.module.mod import Module as LedModule
+from modules.replay_module.module.mod import Module as ReplayModule
+
+
+class Button:
+    """button that is always pressed"""
+    def read(self):
+        return True
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock(start=1000.0)
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+def test_virtual_clock(virtual_clock):
+    """this test asserts that the virtual clock only moves when slept on"""
+    assert clock.time() == 1000.0
+    assert clock.monotonic() == 0.0
+    clock.sleep(2.5)
+    assert clock.time() == 1002.5
+    assert clock.monotonic() == 2.5
+    with pytest.raises(ValueError):
+        clock.sleep(-1)
+
+
+def test_mission_replay_runs_faster_than_real_time(virtual_clock, tmp_path, capsys):
+    """this test asserts that a 10 minute replay with other modules finishes in seconds"""
+    path = tmp_path / "mission.rec"
+    writer = recording.RecordWriter(str(path))
+    for second in range(600):
+        distance = FrameDistance()
+        distance.set_data(second)
+        writer.write(second, distance)
+    writer.close()
+
+    bus = LoopbackBus()
+    listener = bus.connect()
+    listener.listen_for([FrameType.DISTANCE])
+    modules = [
+        ReplayModule(bus.connect(), str(path)),
+        ControllerModule(bus.connect()),
+        ButtonModule(bus.connect(), Button()),
+        LedModule(bus.connect()),
+    ]
+
+    start = time.monotonic()
+    steps = bus.run_for(modules, 600.0)
+    assert time.monotonic() - start < 10
+
+    assert steps == 12000
+    assert [listener.get_data()["mm"] for _ in range(600)] == list(range(600))
+    assert modules[0].stopped
+    # The button is always pressed, so the controller only sends the led state as a keep-alive
+    shown = capsys.readouterr().out.count("The LED is ON")
+    assert 600 / (KEEP_ALIVE + REQUEST_PERIOD) <= shown <= 600 / KEEP_ALIVE + 1
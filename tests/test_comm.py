@@ -0,0 +1,159 @@
+#! python
+
+"""this module tests the connection of client/comm.py to the bus"""
+
+import multiprocessing
+import sys
+import threading
+import time
+
+import pytest
+
+from client.comm import Comm, _drop_connection, _forget_proxy
+from common.common import Priority, bus_config
+from common.frame_enum import FrameType
+from common.frames import FrameActivityLedState, FrameDistance
+from manager import stats
+from manager.manager import BusManager
+
+
+def _run_manager(socket_path):
+    """entry point of a manager process"""
+    bus_config().SOCKET_PATH = socket_path
+    with BusManager() as manager:
+        manager.process()
+
+
+def wait_until(condition, timeout=5.0):
+    """polls the condition until it holds or the timeout passed"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def frames_on_bus(frame_type):
+    """the number of frames of the type the manager distributed, None when it is not reachable"""
+    try:
+        snapshot = stats.fetch(stats.connect())
+    except (ConnectionError, FileNotFoundError):
+        return None
+    return snapshot["types"].get(frame_type.name, {"frames": 0})["frames"]
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    """makes the bus use a unix domain socket in a temporary directory"""
+    config = bus_config()
+    previous = config.SOCKET_PATH
+    config.SOCKET_PATH = str(tmp_path / "bus.sock")
+    yield config.SOCKET_PATH
+    config.SOCKET_PATH = previous
+
+
+def start_manager():
+    """starts a manager process and waits until it accepts connections"""
+    # Spawned, a forked manager would inherit the threads and signal handlers of this process
+    process = multiprocessing.get_context("spawn").Process(
+        target=_run_manager, args=(bus_config().SOCKET_PATH,), daemon=True)
+    process.start()
+    assert wait_until(lambda: frames_on_bus(FrameType.ALL) is not None)
+    return process
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the bus uses a unix domain socket")
+def test_frames_sent_while_the_bus_restarts_arrive(socket_path):
+    """this test asserts that a comm reconnects to a restarted manager and sends the frames kept in the meantime"""
+    manager = start_manager()
+    comm = Comm()
+    try:
+        # The manager goes away without closing the connections, like a crash
+        manager.kill()
+        manager.join()
+        for state in (1, 0, 1):
+            frame = FrameActivityLedState()
+            frame.set_data(state)
+            comm.send(frame)
+        # Fails on the connection of this thread to the stopped manager, which is dropped
+        comm.subscribe([FrameType.BUTTON_STATE])
+
+        # The worker can not hand out its new proxies yet,
+        # this thread opens a new connection to the new manager with the old subscriber
+        with comm.connection_lock:
+            manager = start_manager()
+            comm.subscribe([FrameType.BUTTON_STATE])
+
+        assert wait_until(lambda: frames_on_bus(FrameType.ACTIVITY_LED_STATE) == 3)
+        assert not comm.unsent
+    finally:
+        comm.stop()
+        manager.kill()
+        manager.join()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the bus uses a unix domain socket")
+def test_proxies_have_the_private_attributes_comm_uses(socket_path):
+    """
+    this test asserts that the manager proxies still have the private _tls and _close
+    attributes that _drop_connection and _forget_proxy rely on
+    """
+    manager = start_manager()
+    comm = Comm()
+    try:
+        proxy = comm.subscriber
+        # pylint: disable=protected-access
+        # The subscriber was handed the subscription from this thread when the comm connected
+        assert hasattr(proxy._tls, "connection")
+        _drop_connection(proxy)
+        assert not hasattr(proxy._tls, "connection")
+
+        assert proxy._close.still_active()
+        _forget_proxy(proxy)
+        assert not proxy._close.still_active()
+    finally:
+        comm.stop()
+        manager.kill()
+        manager.join()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the bus uses a unix domain socket")
+def test_stop_ends_a_wait_for_without_timeout(socket_path):
+    """this test asserts that stopping a comm returns a wait_for without a timeout in another thread"""
+    manager = start_manager()
+    comm = Comm()
+    comm.listen_for([FrameType.BUTTON_STATE])
+    found = []
+    waiter = threading.Thread(
+        target=lambda: found.append(comm.wait_for(FrameType.BUTTON_STATE)), daemon=True)
+    try:
+        waiter.start()
+        time.sleep(0.05)
+        comm.stop()
+        waiter.join(5)
+        assert not waiter.is_alive()
+        assert found == [None]
+    finally:
+        comm.stop()
+        manager.kill()
+        manager.join()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the bus uses a unix domain socket")
+def test_stream_frames_are_not_batched_by_default(socket_path):
+    """this test asserts that a comm sends DATA_STREAM frames right away unless it is asked to batch"""
+    manager = start_manager()
+    comm = Comm()
+    try:
+        for mm in range(3):
+            frame = FrameDistance()
+            frame.set_data(mm)
+            comm.send(frame, Priority.DATA_STREAM)
+            assert not comm.batcher.pending
+        assert wait_until(lambda: frames_on_bus(FrameType.DISTANCE) == 3)
+        assert comm.batcher.batches == 0
+    finally:
+        comm.stop()
+        manager.kill()
+        manager.join()
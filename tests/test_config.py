@@ -0,0 +1,70 @@
+#! python
+
+"""this module tests the logging pipeline of common/config.py"""
+
+import logging
+
+from common import config
+
+
+def make_record(msg="hello %s", args=("world",)):
+    """returns a record as a logger would create it"""
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_repeat_filter_suppresses_repeats():
+    """this test asserts that repeated messages are suppressed and counted"""
+    repeat_filter = config.RepeatFilter(limit=2, interval=60.0)
+
+    passed = [repeat_filter.filter(make_record()) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    # A different message is not affected
+    assert repeat_filter.filter(make_record("other"))
+
+
+def test_repeat_filter_reports_suppressed():
+    """this test asserts that the first record after the interval is preceded by a summary of the suppressed ones"""
+    summaries = []
+    repeat_filter = config.RepeatFilter(limit=1, interval=0.0, report=summaries.append)
+    repeat_filter.filter(make_record())
+    key = ("test", logging.INFO, "hello %s")
+    start, count, _ = repeat_filter.seen[key]
+    repeat_filter.seen[key] = (start, count, 3)
+
+    record = make_record()
+    assert repeat_filter.filter(record)
+    assert record.getMessage() == "hello world"
+    assert [summary.getMessage() for summary in summaries] == [
+        "hello %s (3 repeated messages suppressed)"]
+    assert summaries[0].name == "test"
+    assert summaries[0].levelno == logging.INFO
+
+
+def test_background_handler_drops_when_full():
+    """this test asserts that logging never blocks on a full queue, and records are not formatted"""
+    handler = config.BackgroundHandler(length=2)
+    for _ in range(5):
+        handler.handle(make_record())
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    record = handler.queue.get_nowait()
+    assert record.msg == "hello %s"
+    assert record.args == ("world",)
+
+
+def test_background_handler_reports_dropped():
+    """this test asserts that the first record that fits after records were dropped is preceded by a warning"""
+    handler = config.BackgroundHandler(length=2)
+    for _ in range(5):
+        handler.handle(make_record())
+    handler.queue.get_nowait()
+    handler.queue.get_nowait()
+
+    handler.handle(make_record())
+    warning = handler.queue.get_nowait()
+    assert warning.levelno == logging.WARNING
+    assert warning.getMessage() == "3 log records dropped, the log queue was full"
+    assert handler.queue.get_nowait().getMessage() == "hello world"
+    assert handler.unreported == 0
+    assert handler.dropped == 3
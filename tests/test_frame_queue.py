@@ -0,0 +1,127 @@
+#! python
+
+"""this module tests the received frame queue of client/frame_queue.py and the receive APIs of the comms"""
+
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+from client.frame_queue import FrameQueue
+from client.loopback import LoopbackBus
+from common import clock
+from common.frame_enum import FrameType
+from common.frames import FrameButtonState, FrameDistance
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+def make_distance(mm):
+    """returns a distance frame"""
+    frame = FrameDistance()
+    frame.set_data(mm)
+    return frame
+
+
+def test_get_many_takes_frames_in_order():
+    """this test asserts that get_many takes at most max_n of the oldest frames"""
+    frames = FrameQueue()
+    frames.extend([make_distance(mm) for mm in range(5)])
+
+    assert [frame["mm"] for frame in frames.get_many(3)] == [0, 1, 2]
+    assert [frame["mm"] for frame in frames.get_many()] == [3, 4]
+    assert frames.get_many() == []
+
+
+def test_get_waits_for_a_frame():
+    """this test asserts that get blocks until a frame is added, and raises Empty on a timeout"""
+    frames = FrameQueue()
+    with pytest.raises(Empty):
+        frames.get()
+    with pytest.raises(Empty):
+        frames.get(timeout=0.01)
+
+    threading.Timer(0.02, frames.append, [make_distance(7)]).start()
+    start = time.monotonic()
+    assert frames.get(timeout=5)["mm"] == 7
+    assert time.monotonic() - start < 5
+
+
+def test_find_leaves_other_frames_in_order():
+    """this test asserts that find takes the first accepted frame and keeps the others"""
+    frames = FrameQueue()
+    frames.extend([make_distance(1), FrameButtonState(), make_distance(2), make_distance(3)])
+
+    found = frames.find(lambda frame: frame.type == FrameType.DISTANCE and frame["mm"] > 1)
+    assert found["mm"] == 2
+    assert [frame.type for frame in frames.get_many()] == [
+        FrameType.DISTANCE, FrameType.BUTTON_STATE, FrameType.DISTANCE]
+    assert frames.find(lambda frame: True, timeout=0.01) is None
+
+
+def test_find_waits_for_the_frame():
+    """this test asserts that find wakes when the frame it waits for is added"""
+    frames = FrameQueue()
+
+    def add():
+        frames.append(make_distance(1))
+        frames.append(FrameButtonState())
+    threading.Timer(0.02, add).start()
+
+    found = frames.find(lambda frame: frame.type == FrameType.BUTTON_STATE, timeout=5)
+    assert found.type == FrameType.BUTTON_STATE
+    assert len(frames) == 1
+
+
+def test_find_returns_when_woken_or_stopped():
+    """this test asserts that find without a timeout returns None when the queue is woken or stopped"""
+    frames = FrameQueue()
+    threading.Timer(0.02, frames.wake).start()
+    assert frames.find(lambda frame: True) is None
+
+    frames.stop()
+    assert frames.find(lambda frame: True) is None
+    frames.append(make_distance(1))
+    assert frames.find(lambda frame: True)["mm"] == 1
+
+
+def test_loopback_wait_for(virtual_clock):
+    """this test asserts that wait_for on a loopback comm takes the frame or sleeps the timeout"""
+    bus = LoopbackBus()
+    sender, listener = bus.connect(), bus.connect()
+    listener.listen_for([FrameType.ALL])
+
+    assert listener.wait_for(FrameType.DISTANCE, timeout=2) is None
+    assert virtual_clock.monotonic() == 2
+
+    for mm in range(3):
+        sender.send(make_distance(mm))
+    assert listener.wait_for(FrameType.DISTANCE, lambda frame: frame["mm"] == 1)["mm"] == 1
+    assert [frame["mm"] for frame in listener.get_many()] == [0, 2]
+
+
+def test_loopback_never_waits_forever(virtual_clock):
+    """this test asserts that a loopback comm waits without a timeout only for frames that are there"""
+    bus = LoopbackBus()
+    sender, listener = bus.connect(), bus.connect()
+    listener.listen_for([FrameType.ALL])
+
+    with pytest.raises(Empty):
+        listener.get_data()
+    with pytest.raises(RuntimeError):
+        listener.get_data(timeout=None)
+    with pytest.raises(RuntimeError):
+        listener.wait_for(FrameType.DISTANCE)
+
+    sender.send(make_distance(1))
+    assert listener.wait_for_data(None)
+    assert listener.get_data(timeout=None)["mm"] == 1
+    assert virtual_clock.monotonic() == 0
@@ -0,0 +1,164 @@
+#! python
+
+"""this module tests the frame handlers of common/handlers.py"""
+
+import threading
+import time
+
+import pytest
+
+from common.base_module import BaseModule
+from common.frame_enum import FrameType
+from common.frames import FrameActivityLedState, FrameButtonState, FrameDistance
+from common.handlers import on, Handler, PROCESS, THREAD
+from tests.mock_client_comm import MockComm
+
+
+def make_frame(frame_class, request=False):
+    """returns an empty frame of the class"""
+    frame = frame_class()
+    frame.request = request
+    return frame
+
+
+class Indexed(BaseModule):
+    """module that records which handler got which frame"""
+    def __init__(self, comm):
+        self.calls = []
+        super().__init__(comm)
+
+    @on(FrameType.BUTTON_STATE, requests=True)
+    def answer(self, frame):
+        self.calls.append(("answer", frame.type))
+        state = FrameButtonState()
+        state.set_data(True)
+        return state
+
+    @on(FrameType.BUTTON_STATE, FrameType.DISTANCE)
+    def data(self, frame):
+        self.calls.append(("data", frame.type))
+
+    @on(FrameType.ALL)
+    def everything(self, frame):
+        self.calls.append(("everything", frame.type))
+
+
+class Pooled(BaseModule):
+    """module with handlers on pools"""
+    def __init__(self, comm):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.most_running = {}
+        self.order = []
+        super().__init__(comm)
+
+    @on(FrameType.DISTANCE, FrameType.BUTTON_STATE, pool=THREAD, concurrency=2)
+    def slow(self, frame):
+        with self.lock:
+            running = self.running.get(frame.type, 0) + 1
+            self.running[frame.type] = running
+            self.most_running[frame.type] = max(self.most_running.get(frame.type, 0), running)
+            self.most_running["all"] = max(
+                self.most_running.get("all", 0), sum(self.running.values()))
+        time.sleep(0.02)
+        with self.lock:
+            self.running[frame.type] -= 1
+            self.order.append(frame.get_data()[0])
+
+    @on(FrameType.ACTIVITY_LED_STATE, pool=PROCESS)
+    @staticmethod
+    def invert(frame):
+        state = FrameActivityLedState()
+        state.set_data(not frame["state"])
+        return state
+
+
+def wait_until(condition, timeout=5.0):
+    """waits for the condition to become true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_handlers_are_indexed_by_type_and_request():
+    """this test asserts that frames reach the handlers of their type and request flag"""
+    comm = MockComm([
+        make_frame(FrameButtonState, request=True),
+        make_frame(FrameDistance),
+    ])
+    module = Indexed(comm)
+    assert set(comm.comm_listen_for) == {FrameType.ALL}
+
+    module.process()
+
+    assert module.calls == [
+        ("answer", FrameType.BUTTON_STATE),
+        ("data", FrameType.DISTANCE),
+        ("everything", FrameType.DISTANCE),
+    ]
+    assert [frame["pressed"] for frame in comm.sent] == [True]
+
+
+def test_thread_pool_keeps_order_per_frame_type():
+    """this test asserts that frames of one type are handled in order, types in parallel"""
+    frames = []
+    for index in range(4):
+        distance = FrameDistance()
+        distance.set_data(index)
+        frames.append(distance)
+        button = FrameButtonState()
+        button.set_data(True)
+        frames.append(button)
+    module = Pooled(MockComm(frames))
+    with module:
+        module.process()
+        wait_until(lambda: len(module.order) == len(frames))
+
+    assert [value for value in module.order if value is not True] == [0, 1, 2, 3]
+    assert module.most_running == {FrameType.DISTANCE: 1, FrameType.BUTTON_STATE: 1, "all": 2}
+
+
+def test_process_pool_result_is_sent():
+    """this test asserts that the frame a process pool handler returns is sent"""
+    state = FrameActivityLedState()
+    state.set_data(True)
+    comm = MockComm([state])
+    module = Pooled(comm)
+    with module:
+        module.process()
+        wait_until(lambda: module._results)  #pylint: disable=protected-access
+        module.process()
+
+    assert [frame["state"] for frame in comm.sent] == [False]
+
+
+def test_process_pool_needs_a_staticmethod():
+    """this test asserts that a method that needs self can not run in another process"""
+    with pytest.raises(TypeError):
+        on(FrameType.DISTANCE, pool=PROCESS)(lambda self, frame: None)
+
+
+def test_no_frames_are_submitted_after_shutdown():
+    """this test asserts that a call that finishes while the handler shuts down does not start the next frame"""
+    started = threading.Event()
+    release = threading.Event()
+    handled = []
+
+    def slow(frame):
+        started.set()
+        release.wait(5)
+        handled.append(frame)
+
+    handler = Handler(slow, THREAD, 1, True, lambda result: None)
+    first, second = make_frame(FrameDistance), make_frame(FrameDistance)
+    handler(first)
+    started.wait(5)
+    handler(second)
+    # The second frame is taken from the queue by the finishing call, as shutdown begins
+    handler.closed = True
+    release.set()
+    handler.shutdown()
+    handler(make_frame(FrameDistance))
+
+    assert handled == [first]
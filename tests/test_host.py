@@ -0,0 +1,159 @@
+#! python
+
+"""this module tests the module host of client/host.py"""
+
+import threading
+import time
+
+import pytest
+
+from client.comm import Comm
+from client.host import ModuleHost
+from client.loopback import LoopbackBus
+from common.base_module import BaseModule
+from common.common import FrameWrapper, bus_config
+from common.frame_enum import FrameType
+from common.frames import FrameActivityLedState, FrameButtonState
+from common.handlers import on
+from manager.manager import BusManager
+from modules.button_module.module.mod import Module as ButtonModule
+from modules.controller_module.module.mod import Module as ControllerModule
+from modules.led_module.module.mod import Module as LedModule
+
+
+class Button:
+    """button that is always pressed"""
+    def read(self):
+        return True
+
+
+class Recorder(BaseModule):
+    """module that keeps the led states it receives"""
+    def __init__(self, comm):
+        self.states = []
+        super().__init__(comm)
+
+    @on(FrameType.ACTIVITY_LED_STATE)
+    def record(self, frame):
+        """keeps the state"""
+        self.states.append(frame["state"])
+
+
+@pytest.fixture
+def bus_manager(tmp_path):
+    """runs a BusManager on a unix domain socket in this process for the duration of the test"""
+    config = bus_config()
+    previous = config.SOCKET_PATH
+    config.SOCKET_PATH = str(tmp_path / "bus.sock")
+    try:
+        with BusManager() as manager:
+            worker = threading.Thread(target=manager.process)
+            worker.start()
+            yield manager
+            manager.stop()
+            worker.join()
+    finally:
+        config.SOCKET_PATH = previous
+
+
+def wait_until(condition, timeout=5.0):
+    """polls the condition until it holds or the timeout passed"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def step(host, modules):
+    """routes the frames from the bus and runs the tick, tasks and process of the hosted modules once"""
+    host.dispatch()
+    for module in modules:
+        module.tick()
+        module.run_scheduled()
+        module.process()
+
+
+def test_hosted_modules_talk_in_process(capsys):
+    """this test asserts that hosted modules receive each others frames without the bus"""
+    bus = LoopbackBus()
+    outside = bus.connect()
+    outside.listen_for([FrameType.ALL])
+    host = ModuleHost(bus.connect())
+    modules = [
+        ControllerModule(host.connect()),
+        ButtonModule(host.connect(), Button()),
+        LedModule(host.connect()),
+    ]
+    step(host, modules)
+    step(host, modules)
+
+    assert capsys.readouterr().out == "The LED is ON\n"
+    # The other processes still see every frame, the controller requested once in this period
+    sent = [outside.get_data() for _ in range(len(outside.received))]
+    assert [frame.type for frame in sent] == [
+        FrameType.BUTTON_STATE, FrameType.BUTTON_STATE, FrameType.ACTIVITY_LED_STATE]
+
+
+def test_frames_from_the_bus_are_routed_by_subscription():
+    """this test asserts that frames from other processes reach only the hosted modules that listen for them"""
+    bus = LoopbackBus()
+    outside = bus.connect()
+    host = ModuleHost(bus.connect())
+    led, button = host.connect(), host.connect()
+    led.listen_for([FrameType.ACTIVITY_LED_STATE])
+    button.listen_for([FrameType.BUTTON_STATE])
+
+    outside.send(FrameActivityLedState())
+    host.dispatch()
+
+    assert led.has_data()
+    assert not button.has_data()
+
+    button.stop()
+    assert host.comm.comm_listen_for == [FrameType.ACTIVITY_LED_STATE]
+    outside.send(FrameButtonState())
+    assert not host.comm.has_data()
+
+
+def test_retained_frames_are_not_handed_back_to_their_sender():
+    """this test asserts that a hosted module gets the retained frames of the others, not its own"""
+    bus = LoopbackBus(retain=[FrameType.ACTIVITY_LED_STATE])
+    host = ModuleHost(bus.connect())
+    sender, other = host.connect(), host.connect()
+    sender.listen_for([FrameType.ACTIVITY_LED_STATE])
+    sender.send(FrameActivityLedState())
+
+    other.listen_for([FrameType.ACTIVITY_LED_STATE])
+    assert other.get_data().type == FrameType.ACTIVITY_LED_STATE
+    # Listening again hands out the retained frames once more
+    sender.listen_for([FrameType.ACTIVITY_LED_STATE])
+    assert not sender.has_data()
+
+
+def test_modules_are_hosted_on_the_bus(bus_manager):
+    """this test asserts that hosted modules on a real Comm are routed frames and exit cleanly"""
+    with ModuleHost(Comm()) as host:
+        recorder = host.add(Recorder(host.connect()))
+        host.add(ControllerModule(host.connect()))
+        host.add(ButtonModule(host.connect(), Button()))
+        host.start()
+
+        # The led state the controller sends reaches the bus and the recorder in this process
+        assert wait_until(lambda: any(
+            wrapper.frame.type == FrameType.ACTIVITY_LED_STATE for wrapper in bus_manager.rx_queue))
+        assert wait_until(lambda: 1 in recorder.states)
+
+        # A frame of another process is routed to the recorder
+        state = FrameActivityLedState()
+        state.set_data(0)
+        bus_manager.tx_queue.append(FrameWrapper(state, 0, time.time()))
+        assert wait_until(lambda: 0 in recorder.states)
+
+    assert not any(thread.is_alive() for thread in host.threads + [host.dispatcher])
+    assert not host.comm.channel_worker.is_alive()
+    # Every module exited, which shut down its handlers and disconnected its hosted comm
+    handlers = recorder._handlers  #pylint: disable=protected-access
+    assert all(handler.closed for group in handlers.values() for handler in group)
+    assert host.comms == []
@@ -0,0 +1,79 @@
+#! python
+
+"""
+this module tests that importing the bus has no side effects, and times the imports with -X importtime.
+
+every import runs in a fresh interpreter, as short-lived tools and module processes do.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The modules that modules, the manager and tools start with
+IMPORTS = [
+    "common.base_module",
+    "client.comm",
+    "manager.manager",
+    "common.frames",
+]
+
+# Seconds importing one of the IMPORTS may take, generous for slow machines
+IMPORT_BUDGET = 1.0
+
+# Imports the module with a socket that records name lookups,
+# and prints whether anything was set up
+CHECK = """
+import socket
+resolved = []
+socket.gethostbyname = lambda host: resolved.append(host) or "127.0.0.1"
+
+import {module}
+
+import logging
+import signal
+import threading
+import common.common
+print(signal.getsignal(signal.SIGINT) is signal.default_int_handler)
+print(common.common._BUSCONFIG is None and not resolved)
+print(not logging.getLogger().handlers)
+print(threading.active_count() == 1)
+"""
+
+
+def import_times(stderr: str) -> dict:
+    """the cumulative import time in seconds per module, from the -X importtime output"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("module", IMPORTS)
+def test_import_has_no_side_effects(module, tmp_path):
+    """this test asserts that an import does not configure the bus, logging or signals, and is fast"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), AM_I_IN_A_DOCKER_CONTAINER="1")
+    env.pop("PYTHON_BUS_SOCKET", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK.format(module=module)],
+        cwd=str(tmp_path), env=env, capture_output=True, text=True, check=True)
+
+    signals, bus_config, logging_, threads = result.stdout.split()
+    assert signals == "True", "signal handlers were installed"
+    assert bus_config == "True", "the bus config was created"
+    assert logging_ == "True", "logging was configured"
+    assert threads == "True", "a thread was started"
+    assert not (tmp_path / "python_build.log").exists()
+
+    times = import_times(result.stderr)
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert times[module] < IMPORT_BUDGET, "importing {} took {:.3f} s, slowest: {}".format(
+        module, times[module], slowest)
@@ -0,0 +1,60 @@
+#! python
+
+"""this module tests the process supervision of client/launcher.py"""
+
+import sys
+
+import pytest
+
+from client import launcher
+from common.memory import process_memory
+
+
+def _exit_when_ready(code, ready):
+    """a process that is ready and exits with the code right away"""
+    ready.set()
+    sys.exit(code)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the launcher forks")
+def test_failed_process_is_restarted_with_backoff():
+    """this test asserts that a process that fails is started again after a growing delay"""
+    process = launcher.Supervised("test", _exit_when_ready, (1,))
+    process.start()
+    process.process.join()
+
+    process.check(100.0)
+    assert process.ready_at == 100.0
+    assert process.restart_at == 100.0 + launcher.RESTART_BACKOFF_INITIAL
+    assert process.backoff == 2 * launcher.RESTART_BACKOFF_INITIAL
+
+    process.check(100.0)
+    assert process.restarts == 0
+    process.check(process.restart_at)
+    assert process.restarts == 1
+    assert process.ready.wait(5)
+    process.process.join()
+    process.stop()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the launcher forks")
+def test_finished_process_is_not_restarted():
+    """this test asserts that a process that exits with 0 is not started again"""
+    process = launcher.Supervised("test", _exit_when_ready, (0,))
+    process.start()
+    process.process.join()
+
+    process.check(100.0)
+    assert process.finished
+    assert process.restart_at is None
+    process.check(100.0 + launcher.RESTART_BACKOFF_MAX)
+    assert process.restarts == 0
+    assert not process.process.is_alive()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="read from /proc")
+def test_process_memory():
+    """this test asserts that the rss and pss of this process are read"""
+    usage = process_memory()
+    assert usage["rss"] > 0
+    assert 0 < usage["pss"] <= usage["rss"]
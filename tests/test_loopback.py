@@ -0,0 +1,75 @@
+#! python
+
+"""this module tests the in-process bus of client/loopback.py"""
+
+from client.loopback import LoopbackBus
+from common.frame_enum import FrameType
+from common.frames import FrameActivityLedState, FrameButtonState
+from modules.button_module.module.mod import Module as ButtonModule
+from modules.controller_module.module.mod import Module as ControllerModule
+from modules.led_module.module.mod import Module as LedModule
+from tests.mock_client_comm import MockComm
+
+
+class Button:
+    """button that is always pressed"""
+    def read(self):
+        return True
+
+
+def test_loopback_delivers_to_listeners_only():
+    """this test asserts that frames reach the comms that listen for them, except the sender"""
+    bus = LoopbackBus()
+    sender, listener, other = bus.connect(), bus.connect(), bus.connect()
+    sender.listen_for([FrameType.ALL])
+    listener.listen_for([FrameType.BUTTON_STATE])
+    other.listen_for([FrameType.ACTIVITY_LED_STATE])
+
+    frame = FrameButtonState()
+    frame.set_data(True)
+    sender.send(frame)
+
+    assert not sender.has_data()
+    assert not other.has_data()
+    received = listener.get_data()
+    assert received is not frame
+    assert received["pressed"]
+
+
+def test_loopback_retained():
+    """this test asserts that a comm that listens late receives the retained value"""
+    bus = LoopbackBus(retain=[FrameType.ACTIVITY_LED_STATE])
+    sender, late = bus.connect(), bus.connect()
+    frame = FrameActivityLedState()
+    frame.set_data(True)
+    sender.send(frame)
+
+    late.listen_for([FrameType.ACTIVITY_LED_STATE])
+    assert late.get_data()["state"]
+
+
+def test_loopback_modules(capsys):
+    """this test asserts that the example modules work together on a loopback bus"""
+    bus = LoopbackBus()
+    modules = [
+        ControllerModule(bus.connect()),
+        ButtonModule(bus.connect(), Button()),
+        LedModule(bus.connect()),
+    ]
+    # The controller requests once per REQUEST_PERIOD, so the bus settles after one exchange
+    assert bus.run(modules, max_steps=10) < 10
+    assert capsys.readouterr().out.splitlines() == ["The LED is ON"]
+
+
+def test_mock_comm():
+    """this test asserts that the mock comm hands out its frames and keeps what is sent"""
+    request = FrameButtonState()
+    request.request = True
+    comm = MockComm([request])
+    module = ButtonModule(comm, Button())
+
+    module.process()
+
+    assert not comm.has_data()
+    assert len(comm.sent) == 1
+    assert comm.sent[0]["pressed"]
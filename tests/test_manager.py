@@ -0,0 +1,221 @@
+#! python
+
+"""this module tests the frame distribution of manager/manager.py"""
+
+import multiprocessing
+import sys
+import threading
+import time
+
+import pytest
+
+from client.comm import Comm
+from common.common import Frame, FrameWrapper, bus_config
+from common.frame_enum import FrameType
+from common import tracing
+from manager.manager import BusManager, PACKET_QUEUE_LENGTH
+
+
+def make_wrapper(frame_type, request, pid=1, timestamp=0):
+    """wraps a bare frame of the given type, as if it was sent by a module"""
+    frame = Frame()
+    frame.type = frame_type
+    frame.request = request
+    return FrameWrapper(frame, pid, timestamp)
+
+
+def distribute(manager, *wrappers):
+    """puts the wrappers on the tx queue and lets the manager process them"""
+    manager.tx_queue.extend(wrappers)
+    manager._process_tx()  #pylint: disable=protected-access
+    return [wrapper.frame for wrapper in manager.rx_queue]
+
+
+def test_identical_requests_are_coalesced():
+    """this test asserts that only one of several identical requests is forwarded"""
+    manager = BusManager()
+    frames = distribute(
+        manager,
+        *[make_wrapper(FrameType.BUTTON_STATE, True, pid) for pid in range(1, 6)])
+    assert len(frames) == 1
+    assert frames[0].request
+
+
+def test_different_requests_are_forwarded():
+    """this test asserts that requests for different frame types are not coalesced"""
+    manager = BusManager()
+    frames = distribute(
+        manager,
+        make_wrapper(FrameType.BUTTON_STATE, True),
+        make_wrapper(FrameType.DISTANCE, True))
+    assert [frame.type for frame in frames] == [
+        FrameType.BUTTON_STATE, FrameType.DISTANCE]
+
+
+def test_reply_settles_pending_request():
+    """this test asserts that a request is forwarded again once the previous one got an answer"""
+    manager = BusManager()
+    frames = distribute(
+        manager,
+        make_wrapper(FrameType.BUTTON_STATE, True, pid=1),
+        make_wrapper(FrameType.BUTTON_STATE, True, pid=2),
+        make_wrapper(FrameType.BUTTON_STATE, False, pid=3),
+        make_wrapper(FrameType.BUTTON_STATE, True, pid=1))
+    assert [frame.request for frame in frames] == [True, False, True]
+
+
+def test_unanswered_request_expires():
+    """this test asserts that an unanswered request stops absorbing new requests"""
+    manager = BusManager(request_timeout=0)
+    frames = distribute(
+        manager,
+        make_wrapper(FrameType.BUTTON_STATE, True, pid=1),
+        make_wrapper(FrameType.BUTTON_STATE, True, pid=2))
+    assert len(frames) == 2
+
+
+def test_state_frames_are_retained():
+    """this test asserts that the last value of a retained frame type is stored"""
+    manager = BusManager(retain={FrameType.ACTIVITY_LED_STATE: None})
+    first = make_wrapper(FrameType.ACTIVITY_LED_STATE, False, timestamp=1)
+    last = make_wrapper(FrameType.ACTIVITY_LED_STATE, False, timestamp=2)
+    distribute(manager, first, last, make_wrapper(FrameType.DISTANCE, False))
+    assert list(manager.retained) == [FrameType.ACTIVITY_LED_STATE]
+    assert manager.retained[FrameType.ACTIVITY_LED_STATE].timestamp == last.timestamp
+
+
+def test_request_answered_from_store():
+    """this test asserts that a request for a retained frame type is not forwarded"""
+    manager = BusManager(retain={FrameType.ACTIVITY_LED_STATE: None})
+    distribute(manager, make_wrapper(FrameType.ACTIVITY_LED_STATE, False, pid=1))
+    manager.rx_queue.clear()
+    distribute(manager, make_wrapper(FrameType.ACTIVITY_LED_STATE, True, pid=2))
+    assert [wrapper.pid for wrapper in manager.rx_queue] == [1]
+    assert not manager.rx_queue[0].frame.request
+    assert not manager.pending_requests
+
+
+def test_stale_value_is_not_used():
+    """this test asserts that a retained value older than its maximum age does not answer requests"""
+    manager = BusManager(retain={FrameType.BATTERY_LEVEL: 1.0})
+    distribute(manager, make_wrapper(FrameType.BATTERY_LEVEL, False, timestamp=0))
+    manager.rx_queue.clear()
+    frames = distribute(manager, make_wrapper(FrameType.BATTERY_LEVEL, True))
+    assert [frame.request for frame in frames] == [True]
+
+
+def test_metrics_count_distributed_frames():
+    """this test asserts that the manager counts the frames it distributes per type and sender"""
+    manager = BusManager()
+    frame = make_wrapper(FrameType.DISTANCE, False, pid=7)
+    frame.frame.data = b"\x01\x02"
+    distribute(manager, frame, make_wrapper(FrameType.BUTTON_STATE, True, pid=8))
+    snapshot = manager.metrics.snapshot()
+    assert snapshot["types"]["DISTANCE"] == {"frames": 1, "bytes": 2, "dropped": 0}
+    assert snapshot["senders"][8]["frames"] == 1
+    assert sum(snapshot["dispatch_latency"]["histogram"]) == 2
+
+
+def test_metrics_count_dropped_frames():
+    """this test asserts that frames pushed out of the full rx queue are counted"""
+    manager = BusManager()
+    manager.rx_queue.extend(
+        make_wrapper(FrameType.DISTANCE, False) for _ in range(PACKET_QUEUE_LENGTH + 1))
+    manager._process_rx()  #pylint: disable=protected-access
+    snapshot = manager.metrics.snapshot()
+    assert snapshot["types"]["DISTANCE"]["dropped"] == 1
+    assert snapshot["queues"]["rx"] == {"depth": PACKET_QUEUE_LENGTH + 1, "max": PACKET_QUEUE_LENGTH + 1}
+
+
+def test_traced_frames_are_stamped():
+    """this test asserts that the manager stamps traced frames on arrival and dispatch"""
+    manager = BusManager()
+    wrapper = make_wrapper(FrameType.DISTANCE, False)
+    wrapper.trace = tracing.start()
+    manager.tx_queue.append(wrapper)
+    manager._process_tx()  #pylint: disable=protected-access
+    hops = [hop for hop, _ in manager.rx_queue[0].trace]
+    assert hops == [tracing.SEND, tracing.ENQUEUE, tracing.DISPATCH]
+
+
+def test_memory_of_queues_is_accounted():
+    """this test asserts that the manager accounts the frames its queues hold, with high-water marks"""
+    manager = BusManager()
+    distribute(manager, *[make_wrapper(FrameType.DISTANCE, False) for _ in range(3)])
+    manager._process_rx()  #pylint: disable=protected-access
+    snapshot = manager._stats()["memory"]  #pylint: disable=protected-access
+    assert snapshot["queues"]["rx"]["types"]["DISTANCE"]["frames"] == 3
+    assert snapshot["queues"]["tx"]["frames"] == 0
+    assert snapshot["queues"]["tx"]["max_frames"] == 3
+    assert snapshot["queues"]["copies"]["frames"] == 0
+
+
+def test_subscriber_hands_out_new_frames_of_others():
+    """this test asserts that the manager hands a comm only the new frames of other senders it listens for"""
+    manager = BusManager()
+    manager.rx_queue.append(make_wrapper(FrameType.DISTANCE, False, pid=2))
+    subscriber = manager._subscribe(1)  #pylint: disable=protected-access
+    subscriber.update([FrameType.DISTANCE])
+    manager.rx_queue.extend([
+        make_wrapper(FrameType.DISTANCE, False, pid=2, timestamp=1),
+        make_wrapper(FrameType.DISTANCE, False, pid=1),
+        make_wrapper(FrameType.BUTTON_STATE, False, pid=2),
+    ])
+    assert [wrapper.timestamp for wrapper in subscriber.receive()] == [1]
+    assert subscriber.receive() == []
+
+    # Frames that were dropped before the comm received them are counted
+    manager.rx_queue.extend(make_wrapper(FrameType.DISTANCE, False, pid=2) for _ in range(4))
+    manager.rx_queue.clear()
+    manager.rx_queue.append(make_wrapper(FrameType.DISTANCE, False, pid=2, timestamp=2))
+    assert [wrapper.timestamp for wrapper in subscriber.receive()] == [2]
+    assert subscriber.missed == 4
+
+
+def _run_client(socket_path):
+    """entry point of a client process, that listens until it is killed"""
+    bus_config().SOCKET_PATH = socket_path
+    comm = Comm()
+    comm.listen_for([FrameType.DISTANCE])
+    while True:
+        time.sleep(1)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the bus uses a unix domain socket")
+def test_subscriber_of_a_killed_client_is_dropped(tmp_path):
+    """this test asserts that the manager drops the subscriber of a client that was killed without stopping"""
+    config = bus_config()
+    previous = config.SOCKET_PATH
+    config.SOCKET_PATH = str(tmp_path / "bus.sock")
+    client = multiprocessing.get_context("spawn").Process(
+        target=_run_client, args=(config.SOCKET_PATH,), daemon=True)
+    try:
+        with BusManager(subscriber_timeout=0.2) as manager:
+            worker = threading.Thread(target=manager.process)
+            worker.start()
+            try:
+                client.start()
+                deadline = time.monotonic() + 10
+                while not manager.subscribers and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                # The subscriber of a client that is alive is kept
+                time.sleep(0.5)
+                assert len(manager.subscribers) == 1
+                ident = "%x" % id(manager.subscribers[0])
+                assert ident in manager.server.id_to_obj
+
+                client.kill()
+                client.join()
+                deadline = time.monotonic() + 5
+                while manager.subscribers and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                assert not manager.subscribers
+                assert ident not in manager.server.id_to_obj
+                assert ident not in manager.server.id_to_refcount
+            finally:
+                manager.stop()
+                worker.join()
+    finally:
+        if client.is_alive():
+            client.kill()
+        config.SOCKET_PATH = previous
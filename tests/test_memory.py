@@ -0,0 +1,57 @@
+#! python
+
+"""this module tests the memory accounting of common/memory.py"""
+
+import logging
+
+from common import memory
+from common.common import Frame
+from common.frame_enum import FrameType
+
+
+def make_frame(size):
+    """returns a frame with size bytes of data"""
+    frame = Frame()
+    frame.type = FrameType.DISTANCE
+    frame.data = bytes(size)
+    return frame
+
+
+def test_add_remove_and_high_water_mark():
+    """this test asserts that frames are counted per queue and type, and the maximum is kept"""
+    account = memory.MemoryAccount("test", budget=None)
+    frames = [make_frame(100) for _ in range(3)]
+    for frame in frames:
+        account.add("received", frame)
+    for frame in frames:
+        account.remove("received", frame)
+
+    usage = account.snapshot()["queues"]["received"]
+    assert usage["frames"] == 0
+    assert usage["bytes"] == 0
+    assert usage["max_frames"] == 3
+    assert usage["max_bytes"] == 3 * (memory.FRAME_OVERHEAD + 100)
+    assert usage["types"]["DISTANCE"]["max_frames"] == 3
+
+
+def test_set_replaces_the_queue():
+    """this test asserts that set accounts only the frames passed to it"""
+    account = memory.MemoryAccount("test", budget=None)
+    account.set("rx", [make_frame(10), make_frame(10)])
+    account.set("rx", [make_frame(10)])
+    assert account.snapshot()["total"]["frames"] == 1
+
+
+def test_budget_warns_once(caplog):
+    """this test asserts that crossing the budget is logged once, until the usage drops again"""
+    account = memory.MemoryAccount("test", budget=memory.FRAME_OVERHEAD + 150)
+    with caplog.at_level(logging.INFO, logger="python_build.memory"):
+        account.add("received", make_frame(100))
+        account.add("received", make_frame(100))
+        account.add("received", make_frame(100))
+        account.set("received", [])
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert "budget" in messages[0]
+    assert "back under" in messages[1]
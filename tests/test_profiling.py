@@ -0,0 +1,126 @@
+#! python
+
+"""this module tests the process() loop profiling of common/profiling.py"""
+
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from client.host import ModuleHost
+from client.loopback import LoopbackBus
+from common import profiling
+from common.base_module import BaseModule
+
+
+class FakeComm:
+    """comm that hands out a fixed number of frames"""
+    def __init__(self, frames):
+        self.frames = frames
+
+    def has_data(self):
+        return self.frames > 0
+
+    def get_data(self):
+        self.frames -= 1
+        return self.frames
+
+
+def test_loop_profiler_counts_drained_frames():
+    """this test asserts that every process() call is recorded with the frames it took"""
+    comm = FakeComm(3)
+
+    def process():
+        while comm.has_data():
+            comm.get_data()
+
+    profiler = profiling.LoopProfiler("test", comm, budget=1.0)
+    process = profiler.wrap(process)
+    process()
+    process()
+
+    assert list(profiler.drained) == [3, 0]
+    assert len(profiler.durations) == 2
+    assert len(profiler.idle) == 1
+    assert profiler.percentiles()["frames"][50] == 3
+
+
+class FakeBatchComm(FakeComm):
+    """comm whose get_many takes its frames with get_data, like BaseComm"""
+    def get_many(self):
+        frames = []
+        while self.has_data():
+            frames.append(self.get_data())
+        return frames
+
+
+def test_loop_profiler_counts_frames_of_get_many_once():
+    """this test asserts that frames get_many takes with get_data are counted once"""
+    comm = FakeBatchComm(3)
+    profiler = profiling.LoopProfiler("test", comm, budget=1.0)
+    profiler.wrap(comm.get_many)()
+    assert list(profiler.drained) == [3]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="there is no SIGUSR1")
+def test_profiler_created_off_the_main_thread(monkeypatch):
+    """this test asserts that a profiler created in another thread leaves SIGUSR1 to the main thread"""
+    monkeypatch.setattr(profiling, "_SIGNAL_REGISTERED", False)
+    errors = []
+
+    def create():
+        try:
+            profiling.LoopProfiler("thread", FakeComm(0), budget=1.0)
+        except ValueError as error:
+            errors.append(error)
+    thread = threading.Thread(target=create)
+    thread.start()
+    thread.join()
+    assert not errors
+    assert not profiling._SIGNAL_REGISTERED  #pylint: disable=protected-access
+
+    profiling.LoopProfiler("main", FakeComm(0), budget=1.0)
+    assert profiling._SIGNAL_REGISTERED  #pylint: disable=protected-access
+
+
+def test_loop_profiler_logs_calls_over_budget(caplog):
+    """this test asserts that a process() call that exceeds the budget is logged"""
+    profiler = profiling.LoopProfiler("test", FakeComm(0), budget=-1.0)
+    profiler.wrap(lambda: None)()
+    assert "budget" in caplog.text
+
+
+class Idle(BaseModule):
+    """module that only waits"""
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="there is no SIGUSR1")
+def test_sigusr1_profiles_every_module():
+    """this test asserts that SIGUSR1 requests a cProfile run from every profiler in the process"""
+    profilers = [profiling.LoopProfiler(name, FakeComm(0), budget=1.0) for name in ("a", "b")]
+    assert profiling._handle_signal(signal.SIGUSR1, None)  #pylint: disable=protected-access
+    assert all(profiler.profile_requested for profiler in profilers)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="there is no SIGUSR1")
+def test_profile_stops_when_no_frames_arrive(monkeypatch, tmp_path):
+    """this test asserts that the run loop of an idle module stops cProfile when its time is up"""
+    monkeypatch.setattr(profiling, "PROFILE_BUDGET", "1000")
+    monkeypatch.setattr(profiling, "PROFILE_SECONDS", 0.05)
+    monkeypatch.chdir(tmp_path)
+    module = Idle(ModuleHost(LoopbackBus().connect()).connect())
+    thread = threading.Thread(target=module.run)
+    thread.start()
+    try:
+        profiling._handle_signal(signal.SIGUSR1, None)  #pylint: disable=protected-access
+        # The profile starts with the next process() call
+        module.comm.wake()
+        deadline = time.monotonic() + 5
+        while not list(tmp_path.glob("profile-*.prof")) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert list(tmp_path.glob("profile-*.prof"))
+    finally:
+        module.stop()
+        thread.join()
@@ -0,0 +1,48 @@
+#! python
+
+"""this module tests the bus recordings of common/recording.py"""
+
+from common import recording
+from common.common import Priority
+from common.frame_enum import FrameType
+from common.frames import FrameDistance
+
+
+def write_recording(path, frames):
+    """writes (timestamp, frame) tuples to a recording at path"""
+    writer = recording.RecordWriter(str(path))
+    for timestamp, frame in frames:
+        writer.write(timestamp, frame)
+    writer.close()
+
+
+def test_recording_round_trip(tmp_path):
+    """this test asserts that recorded frames are read back in order and unchanged"""
+    distance = FrameDistance()
+    distance.set_data(1234)
+    distance.priority = Priority.DATA_STREAM
+    request = FrameDistance()
+    request.request = True
+    path = tmp_path / "bus.rec"
+    write_recording(path, [(1.0, distance), (2.5, request)])
+
+    records = list(recording.read_records(str(path)))
+    assert [record.timestamp for record in records] == [1.0, 2.5]
+    assert [record.request for record in records] == [False, True]
+
+    frame = recording.to_frame(records[0])
+    assert isinstance(frame, FrameDistance)
+    assert frame["mm"] == 1234
+    assert frame.priority == Priority.DATA_STREAM
+    assert recording.to_frame(records[1]).type == FrameType.DISTANCE
+
+
+def test_cut_off_record_is_ignored(tmp_path):
+    """this test asserts that a record that was only partly written is skipped"""
+    distance = FrameDistance()
+    distance.set_data(1)
+    path = tmp_path / "bus.rec"
+    write_recording(path, [(1.0, distance), (2.0, distance)])
+    path.write_bytes(path.read_bytes()[:-1])
+
+    assert len(list(recording.read_records(str(path)))) == 1
@@ -0,0 +1,92 @@
+#! python
+
+"""this module tests the periodic task scheduler of common/scheduler.py"""
+
+import pytest
+
+from client.loopback import LoopbackBus
+from common import clock
+from common.base_module import BaseModule
+from common.scheduler import Scheduler, every
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+class Poller(BaseModule):
+    """module that polls twice as often as it reports, and stops after ten polls.
+    the periods are exact in binary, so the tasks are due at exactly the same times"""
+    def __init__(self, comm):
+        super().__init__(comm)
+        self.polls = []
+        self.reports = []
+
+    @every(0.125)
+    def poll(self):
+        self.polls.append(clock.monotonic())
+        # Polling takes time, the next poll is still due on the grid
+        clock.sleep(0.03125)
+        if len(self.polls) == 10:
+            self.stop()
+
+    @every(0.25)
+    def report(self):
+        self.reports.append(clock.monotonic())
+
+
+def test_tasks_run_on_a_fixed_grid(virtual_clock):
+    """this test asserts that the time a task takes does not make it drift"""
+    module = Poller(LoopbackBus().connect())
+    module.run()
+
+    assert module.polls == pytest.approx([index * 0.125 for index in range(10)])
+    # Tasks that are due at the same time run in the order they were put back on the grid,
+    # the first report waits for the first poll
+    assert module.reports == pytest.approx([0.03125, 0.25, 0.5, 0.75, 1.0])
+    stats = module.task_stats()
+    assert stats["poll"]["runs"] == 10
+    assert stats["poll"]["missed"] == 0
+    assert stats["report"]["jitter"][99] == pytest.approx(0.03125)
+
+
+def test_missed_runs_are_skipped_and_counted(virtual_clock):
+    """this test asserts that a task that overruns its period skips runs and misses deadlines"""
+    scheduler = Scheduler()
+    starts = []
+
+    def slow():
+        starts.append(clock.monotonic())
+        clock.sleep(0.25)
+    task = scheduler.add(slow, 0.1)
+
+    scheduler.run_due()
+    assert task.due == pytest.approx(0.3)
+    assert task.missed == 2
+    virtual_clock.advance(scheduler.time_to_next())
+    scheduler.run_due()
+
+    assert starts == pytest.approx([0.0, 0.3])
+    assert task.runs == 2
+
+
+def test_late_start_misses_the_deadline(virtual_clock):
+    """this test asserts that a run that starts later than its deadline is counted as missed"""
+    scheduler = Scheduler()
+    task = scheduler.add(lambda: None, 1.0, deadline=0.1)
+    scheduler.run_due()
+    virtual_clock.advance(1.05)
+    scheduler.run_due()
+    assert task.missed == 0
+    virtual_clock.advance(1.1)
+    scheduler.run_due()
+    assert task.missed == 1
+
+    scheduler.remove(task)
+    assert scheduler.time_to_next() is None
+    assert "missed" not in scheduler.report()
@@ -0,0 +1,117 @@
+#! python
+
+"""this module tests the rate limited and decimated subscriptions of common/subscription.py"""
+
+import pytest
+
+from client.host import ModuleHost
+from client.loopback import LoopbackBus
+from common import clock
+from common.batch import FrameBatch
+from common.common import FrameWrapper
+from common.frame_enum import FrameType
+from common.frames import FrameButtonState, FrameDistance
+from common.subscription import Subscription
+from manager.manager import BusManager, Subscriber
+
+
+@pytest.fixture
+def virtual_clock():
+    """installs a VirtualClock for the duration of the test"""
+    virtual = clock.VirtualClock()
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
+
+
+def distance(mm):
+    """a FrameDistance with the given distance"""
+    frame = FrameDistance()
+    frame.set_data(mm)
+    return frame
+
+
+def test_max_rate_delivers_the_latest_frame():
+    """this test asserts that frames that come too soon are held back, and the latest one is delivered later"""
+    subscription = Subscription([FrameType.DISTANCE], max_rate={FrameType.DISTANCE: 4})
+    assert subscription.offer(1, FrameType.DISTANCE, 0.0) == [1]
+    assert subscription.offer(2, FrameType.DISTANCE, 0.0625) == []
+    assert subscription.offer(3, FrameType.DISTANCE, 0.125) == []
+    assert subscription.time_to_next(0.125) == 0.125
+    assert subscription.release(0.125) == []
+    assert subscription.release(0.25) == [3]
+    assert subscription.release(0.5) == []
+    assert subscription.time_to_next(0.5) is None
+    # A frame after the interval is delivered right away
+    assert subscription.offer(4, FrameType.DISTANCE, 0.5) == [4]
+    assert subscription.dropped == 1
+
+
+def test_decimate_delivers_every_nth_frame():
+    """this test asserts that decimate N delivers the first frame and every Nth one after it"""
+    subscription = Subscription([FrameType.ALL], decimate={FrameType.DISTANCE: 3})
+    delivered = []
+    for item in range(7):
+        delivered += subscription.offer(item, FrameType.DISTANCE, 0.0)
+    assert delivered == [0, 3, 6]
+    # Other types are not limited
+    assert subscription.accepts(FrameType.BUTTON_STATE)
+    assert subscription.offer(7, FrameType.BUTTON_STATE, 0.0) == [7]
+    assert subscription.dropped == 4
+
+
+def test_invalid_limits_are_rejected():
+    """this test asserts that a rate or decimation that can not be met raises a ValueError"""
+    with pytest.raises(ValueError):
+        Subscription([FrameType.DISTANCE], max_rate={FrameType.DISTANCE: 0})
+    with pytest.raises(ValueError):
+        Subscription([FrameType.DISTANCE], decimate={FrameType.DISTANCE: 0})
+
+
+def test_subscriber_limits_the_frames_of_a_batch(virtual_clock):
+    """this test asserts that the manager limits the frames a batch carries, not the batch"""
+    manager = BusManager()
+    subscriber = Subscriber(manager.rx_queue, 1)
+    subscriber.update([FrameType.DISTANCE], max_rate={FrameType.DISTANCE: 4})
+    batch = FrameBatch([distance(mm) for mm in range(5)])
+    manager.rx_queue.append(FrameWrapper(batch, 2, 0))
+
+    assert [wrapper.frame["mm"] for wrapper in subscriber.receive()] == [0]
+    assert subscriber.receive() == []
+    # The latest held frame is handed out once the interval passed
+    virtual_clock.advance(0.25)
+    assert [wrapper.frame["mm"] for wrapper in subscriber.receive()] == [4]
+
+
+def test_loopback_comm_gets_a_live_feed(virtual_clock):
+    """this test asserts that a rate limited comm on a loopback bus keeps up with the latest value"""
+    bus = LoopbackBus()
+    sensor, display = bus.connect(), bus.connect()
+    display.listen_for([FrameType.DISTANCE], max_rate={FrameType.DISTANCE: 2})
+
+    for mm in range(100):
+        sensor.send(distance(mm))
+        bus.step([])
+        virtual_clock.advance(1 / 64)
+    virtual_clock.advance(0.5)
+    bus.step([])
+
+    # Every half second, and the last value once the interval passed
+    assert [frame["mm"] for frame in display.get_many()] == [0, 32, 64, 96, 99]
+
+
+def test_hosted_comm_applies_its_own_limits(virtual_clock):
+    """this test asserts that hosted comms are limited by the host, the shared comm gets every frame"""
+    bus = LoopbackBus()
+    sensor = bus.connect()
+    host = ModuleHost(bus.connect())
+    full, decimated = host.connect(), host.connect()
+    full.listen_for([FrameType.DISTANCE])
+    decimated.listen_for([FrameType.DISTANCE], decimate={FrameType.DISTANCE: 4})
+
+    for mm in range(8):
+        sensor.send(distance(mm))
+    host.dispatch()
+
+    assert len(full.get_many()) == 8
+    assert [frame["mm"] for frame in decimated.get_many()] == [0, 4]
@@ -266,6 +266,33 @@ class FrameUiCommand(Frame):
         self.data = struct.pack(self.format, command, params, destination)
 
 
+"""
+    output = tooling.frame_generator.generate_frame_class(input_frame)
+    assert expected_output == remove_leading_line(output)
+
+def test_fixed_length_array():
+    """this test makes sure arrays of other types than char are packed as raw bytes"""
+    input_frame = [tooling.frame_generator.Class(
+        name="frame_microphone_s",
+        members=[
+            "uint8_t length",
+            "int16_t microphone_data[64]"],
+        doc_string=[])]
+    expected_output = """
+class FrameMicrophone(Frame):
+    MEMBERS = ['length', 'microphone_data']
+    DESCRIPTION = ""
+
+    def __init__(self):
+        super(FrameMicrophone, self).__init__()
+        self.type = FrameType.MICROPHONE
+        self.format = 'B 128s'
+        self.length = 129
+
+    def set_data(self, length: int, microphone_data: bytes):
+        self.data = struct.pack(self.format, length, microphone_data)
+
+
 """
     output = tooling.frame_generator.generate_frame_class(input_frame)
     assert expected_output == remove_leading_line(output)
@@ -0,0 +1,27 @@
+#! python
+
+"""this module tests the trace files of common/tracing.py"""
+
+import json
+from common import tracing
+
+
+def test_trace_writer_writes_chrome_events(tmp_path):
+    """this test asserts that every hop of a trace becomes a complete event"""
+    path = tmp_path / "trace.json"
+    writer = tracing.TraceWriter(str(path))
+    trace = [(tracing.SEND, 1.0), (tracing.ENQUEUE, 1.5), (tracing.DISPATCH, 3.0)]
+    writer.write("DISTANCE", 42, trace)
+
+    # The array is never closed, trace viewers accept that
+    events = json.loads(path.read_text().rstrip().rstrip(",") + "]")
+    hops = [event for event in events if event["ph"] == "X"]
+    assert [event["name"] for event in hops] == ["send -> enqueue", "enqueue -> dispatch"]
+    assert [event["dur"] for event in hops] == [0.5e6, 1.5e6]
+    assert all(event["tid"] == "DISTANCE" for event in hops)
+    assert all(event["args"]["sender"] == 42 for event in hops)
+
+
+def test_stamp_ignores_untraced_frames():
+    """this test asserts that stamping a frame that is not traced does nothing"""
+    tracing.stamp(None, tracing.DISPATCH)
@@ -159,11 +159,17 @@ def generate_frame_class(frames):
         typed_list = []
         for data_member in frame.members:
             match = re.match(r"(char) (\w+)\[(\d*)\]", data_member)
+            array_match = re.match(r"(.+) (\w+)\[(\d+)\]", data_member)
             if match:
                 member_type, member_name, member_size = match.groups()
                 if not member_size:
                     member_size = "255"
                 member_type = CppType(str(int(member_size))+"s", int(member_size), str)
+            elif array_match:
+                # Other arrays are passed as raw bytes
+                member_type, member_name, member_size = array_match.groups()
+                member_size = TYPE_TABLE[member_type].size * int(member_size)
+                member_type = CppType(str(member_size)+"s", member_size, bytes)
             else:
                 member_type, member_name = data_member.split(' ')
                 member_type = TYPE_TABLE[member_type]